@@ -1,2 +1,26 @@
-from .components import *
+from types import ModuleType as _ModuleType
+
+from . import components, core
+from .components.stdlib import *
+from .components import ComponentRegistry, registry
 from .core import *
+
+# `from Chemingon import *` binds the core names, the standard components and JupyterUI, but not the contrib drivers:
+# they and their SDKs are only imported when first used, e.g. `from Chemingon import ViciValve`
+__all__ = [i for i in dir(core) if not i.startswith('_') and not isinstance(getattr(core, i), _ModuleType)] + \
+    components.__all__ + ['JupyterUI']
+
+
+def __getattr__(name):
+    # the notebook interface and the drivers of contrib devices are only imported when used; JupyterUI only imports
+    # ipywidgets and bqplot when it is created
+    if name == 'JupyterUI':
+        from .core.jupyter import JupyterUI
+        return JupyterUI
+    if name in components.contrib.DRIVERS:
+        return getattr(components.contrib, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | set(components.contrib.DRIVERS) | {'JupyterUI'})
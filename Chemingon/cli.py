@@ -0,0 +1,136 @@
+"""
+Command line runner, for experiments scheduled from cron or systemd without Jupyter:
+
+    python -m Chemingon run my_experiment.py --dry-run
+
+The definition is either a protocol file (.json, .jsonl, .yaml, see ProtocolFile) or a Python file creating an
+Experiment: the variable given by --experiment, else `exp` or `experiment`, else a function `build_experiment()`
+returning one, else the only Experiment in the file.
+Exit status: 0 if the run finished without error, 1 if an error was raised, 2 if the definition could not be
+loaded, 130 if interrupted.
+"""
+import argparse
+import contextlib
+import os
+import runpy
+import sys
+import time
+from threading import Thread
+from typing import Union
+
+from .core.errors import ExperimentError, ErrorInfo
+from .core.definition import ProtocolFile
+from .core.experiment import Experiment
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_DEFINITION = 2
+EXIT_INTERRUPTED = 130
+
+
+def load_experiment(path: str, name: str = None) -> Experiment:
+    """
+    :param path: Python file defining the experiment
+    :param name: variable or function of the file giving the experiment
+    """
+    if os.path.splitext(path)[1].lower() in ('.json', '.jsonl', '.yaml', '.yml'):
+        return ProtocolFile(path, pause_gc=True).experiment()  # nothing else runs yet
+    namespace = runpy.run_path(path, run_name='__chemingon__')
+    candidates = [name] if name is not None else ['exp', 'experiment', 'build_experiment']
+    for i in candidates:
+        value = namespace.get(i)
+        if callable(value) and not isinstance(value, Experiment):
+            value = value()
+        if isinstance(value, Experiment):
+            return value
+    if name is not None:
+        raise ValueError(f'{path}: {name} is not an Experiment')
+    found = [i for i in namespace.values() if isinstance(i, Experiment)]
+    if len(found) != 1:
+        raise ValueError(f'{path}: {len(found)} Experiment objects found; choose one with --experiment')
+    return found[0]
+
+
+def progress_line(exp: Experiment, total: int = None) -> str:
+    """
+    One line summary of the run: time, protocols done, running protocols and their step
+    :param total: number of protocols to run, if known
+    """
+    version, snapshot = exp.state.snapshot()
+    st = snapshot[('experiment', None)]
+    elapsed = '--:--:--' if st['timer_start'] is None else exp.time_difference(st['timer_start'], time.time())
+    running = []
+    for (kind, key), i in snapshot.items():
+        if kind == 'protocol' and i.get('top') and not i['finished'] and i['progress'] > 0:
+            running.append(f"{i['channel']}:{i['name']} {i['progress']}/{i['total']}")
+    status = 'paused' if st['paused'] else 'running' if st['running'] else 'finished' if st['finished'] else 'ready'
+    line = f"[{elapsed}] {status} done {st['protocols_done']}{'' if total is None else f'/{total}'}"
+    if running:
+        line += ' | ' + ', '.join(sorted(running))
+    if st['error'] is not None:
+        line += f" | error: {st['error']}"
+    return line
+
+
+def run(exp: Experiment, dry_run: bool = False, stop_all: bool = False, interval: float = 5.0,
+        out=None) -> int:
+    """
+    Run the experiment in this thread, printing a progress line when something changed, at most every `interval`
+    seconds
+    :return: exit status
+    """
+    out = sys.stdout if out is None else out
+    errors = []
+    exp.hooks.register('error', lambda error_info: errors.append(error_info))
+    exp.stop_all_upon_error = stop_all or dry_run
+
+    total = None if exp._protocol_sources else len(exp.protocol_list)  # unknown with protocol sources
+    supervisor = Thread(target=exp.start_master_operators, args=(dry_run,), name='Supervisor', daemon=True)
+    supervisor.start()
+    last, version = None, 0
+    try:
+        while supervisor.is_alive():
+            exp.state.wait(version, timeout=interval)
+            version = exp.state.version
+            line = progress_line(exp, total)
+            if line != last:
+                print(line, file=out, flush=True)
+                last = line
+            supervisor.join(interval)
+    except KeyboardInterrupt:
+        print('Interrupted; stopping all devices', file=out, flush=True)
+        exp.stop_all_upon_error = True
+        exp.error_queue.put(ErrorInfo(ExperimentError('Interrupted'), None, True))
+        supervisor.join()
+        return EXIT_INTERRUPTED
+    print(progress_line(exp, total), file=out, flush=True)
+    if exp.directory is not None:
+        print(f'Results in {exp.directory}', file=out, flush=True)
+    return EXIT_ERROR if errors or exp.error_quit else EXIT_OK
+
+
+def main(argv: Union[None, list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m Chemingon', description='Run Chemingon experiments headless')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='run an experiment definition')
+    run_parser.add_argument('definition', help='protocol file or Python file creating the Experiment')
+    run_parser.add_argument('--experiment', default=None, help='variable or function giving the Experiment')
+    run_parser.add_argument('--dry-run', action='store_true', help='run without connecting to the devices')
+    run_parser.add_argument('--stop-all', action='store_true', help='stop all channels upon any error')
+    run_parser.add_argument('--interval', type=float, default=5.0, help='seconds between progress lines')
+    run_parser.add_argument('--quiet', action='store_true', help='only print the progress lines')
+    run_parser.add_argument('--dashboard', type=int, default=None, metavar='PORT',
+                            help='also serve the web dashboard on this port')
+    args = parser.parse_args(argv)
+
+    out = sys.stdout
+    try:
+        exp = load_experiment(args.definition, args.experiment)
+    except Exception as e:
+        print(f'Cannot load {args.definition}: {e}', file=sys.stderr)
+        return EXIT_DEFINITION
+    if args.dashboard is not None:
+        exp.start_dashboard(port=args.dashboard)
+    with open(os.devnull, 'w') as devnull, \
+            (contextlib.redirect_stdout(devnull) if args.quiet else contextlib.nullcontext()):
+        return run(exp, dry_run=args.dry_run, stop_all=args.stop_all, interval=args.interval, out=out)
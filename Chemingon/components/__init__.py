@@ -1,2 +1,17 @@
-from .contrib import *
+from . import contrib, stdlib
 from .stdlib import *
+from .registry import ComponentRegistry, registry
+
+# the contrib drivers are left out of `from Chemingon.components import *`, which would import them and their SDKs
+__all__ = [i for i in dir(stdlib) if not i.startswith('_')] + ['ComponentRegistry', 'registry']
+
+
+def __getattr__(name):
+    # contrib drivers are imported on first use
+    if name in contrib.DRIVERS:
+        return getattr(contrib, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | set(contrib.DRIVERS))
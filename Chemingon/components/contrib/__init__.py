@@ -1,9 +1,32 @@
-from .alicatPressureController import AlicatPressure
-from .cavroXCaliburPump import CavroXCaliburPump
-from .diySampler import DiySampler
-from .dropletSystemStem import DropletSystemStem
-from .omronE5CC import OmronE5CC
-from .runzeStepperMotor import RunzeStepperMotor
-from .viciValve import ViciValve
-from .oceanInsightLightSource import OceanInsightLightSource
-from .seemanSpectrometer import SeemanSpectrometer
+import importlib
+
+# class name -> module of the driver; a driver and its SDK (pyvisa, serial, alicat, ...) are imported when the class
+# is first used, so that a missing SDK only affects the devices that need it
+DRIVERS = {
+    'AlicatPressure': 'alicatPressureController',
+    'CavroXCaliburPump': 'cavroXCaliburPump',
+    'DiySampler': 'diySampler',
+    'DropletSystemStem': 'dropletSystemStem',
+    'OmronE5CC': 'omronE5CC',
+    'RunzeStepperMotor': 'runzeStepperMotor',
+    'ViciValve': 'viciValve',
+    'OceanInsightLightSource': 'oceanInsightLightSource',
+    'SeemanSpectrometer': 'seemanSpectrometer',
+}
+__all__ = list(DRIVERS)  # `from ... import *` imports every driver
+
+
+def __getattr__(name):
+    module = DRIVERS.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    try:
+        value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    except ImportError as e:
+        raise ImportError(f'{name} cannot be imported: {e}; install the package it needs to use this device') from e
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(DRIVERS))
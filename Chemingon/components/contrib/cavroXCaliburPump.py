@@ -27,11 +27,11 @@ class CavroXCaliburPump(Component):
 
     def _send_command(self, command: str) -> tuple:
         send_command = f'/{str(self.pump_address + 1)}{command}\r'
-        # self.log(f'Message sent: {send_command}')
+        # self.log('Message sent: {}', send_command)
         with self.lock:
             result = self.visa_instrument.query(send_command, delay=0.01)
         status, err_code, data = self._parse_response(result)
-        # self.log(f'Received: status = {status}, error code = {err_code}, data = {data}')
+        # self.log('Received: status = {}, error code = {}, data = {}', status, err_code, data)
         if not err_code == 0:
             raise RuntimeError(f'Error when executing [{send_command}]: Error Code {err_code}')
         return status, err_code, data
@@ -58,7 +58,8 @@ class CavroXCaliburPump(Component):
     def initialise(self, polarity: str = 'CW', force: int = 0, input_port: int = 0, output_port: int = 0, wait: bool = True):
         # initialise plunger and valve
         self.current_op = 'Initialising'
-        self.log(f'Initialising: polarity = {polarity}, force = {force}, input_port = {input_port}, output_port = {output_port}')
+        self.log('Initialising: polarity = {}, force = {}, input_port = {}, output_port = {}', polarity, force,
+                 input_port, output_port)
         cmd_code = 'Z'
         n1 = str(force)
         n2 = str(input_port)
@@ -78,7 +79,7 @@ class CavroXCaliburPump(Component):
         :return: the absolute position of the plunger in increments [0..3000], [0..24000 in fine positioning mode].
         """
         status, error_code, data = self._send_command("?")
-        self.log(f'Current absolute plunger position is {data}')
+        self.log('Current absolute plunger position is {}', data)
         return int(data)
 
     def query_valve_pos(self) -> str:
@@ -89,7 +90,7 @@ class CavroXCaliburPump(Component):
                     where X is the number of distribution valve ports.
         """
         status, error_code, data = self._send_command("?6")
-        self.log(f'Current valve position is {data}')
+        self.log('Current valve position is {}', data)
         return data
 
     @staticmethod
@@ -119,7 +120,7 @@ class CavroXCaliburPump(Component):
         :param top_speed: The [V] command sets the top speed in pulses/second 5-6000. 1400 by default
         :return: current position
         """
-        self.log(f'Move to position {str(abs_pos)}; valve: {valve_pos}')
+        self.log('Move to position {}; valve: {}', abs_pos, valve_pos)
         self.current_op = f'Move to position {str(abs_pos)}; valve: {valve_pos}'
         valve_cmd = self._convert_val_pos(valve_pos)
         self._send_command(f"V{str(top_speed)}{valve_cmd}A{str(abs_pos)}R")
@@ -138,7 +139,7 @@ class CavroXCaliburPump(Component):
         :param top_speed: top speed in ul/s
         :return: current position in ul
         """
-        self.log(f'Move to {abs_pos}ul')
+        self.log('Move to {}ul', abs_pos)
         abs_pos_converted = int(abs_pos * 3000 / self.syringe_size)
 
         if top_speed is None:
@@ -160,7 +161,7 @@ class CavroXCaliburPump(Component):
         :param top_speed: The [V] command sets the top speed in pulses/second 5-6000. 1400 by default
         :return: current position
         """
-        self.log(f'Relative picup {rel_pos}; valve: {valve_pos}')
+        self.log('Relative picup {}; valve: {}', rel_pos, valve_pos)
         self.current_op = f'Relative picup {rel_pos}; valve: {valve_pos}'
         valve_cmd = self._convert_val_pos(valve_pos)
 
@@ -181,7 +182,7 @@ class CavroXCaliburPump(Component):
         :param top_speed: top speed in ul/s
         :return: current position in ul
         """
-        self.log(f'Pickup {rel_pos}ul')
+        self.log('Pickup {}ul', rel_pos)
         rel_pos_converted = int(rel_pos * 3000 / self.syringe_size)
         if top_speed is None:
             result = self.rel_pickup_increments(valve_pos, rel_pos_converted, wait=wait)
@@ -201,7 +202,7 @@ class CavroXCaliburPump(Component):
         :param top_speed: The [V] command sets the top speed in pulses/second 5-6000. 1400 by default
         :return: current position
         """
-        self.log(f'Relative dispense {rel_pos}; valve: {valve_pos}')
+        self.log('Relative dispense {}; valve: {}', rel_pos, valve_pos)
         self.current_op = f'Relative dispense {rel_pos}; valve: {valve_pos}'
         valve_cmd = self._convert_val_pos(valve_pos)
 
@@ -222,7 +223,7 @@ class CavroXCaliburPump(Component):
         :param top_speed: top speed in ul/s
         :return: current position in ul
         """
-        self.log(f'Dispense {rel_pos}ul')
+        self.log('Dispense {}ul', rel_pos)
         rel_pos_converted = int(rel_pos * 3000 / self.syringe_size)
         if top_speed is None:
             result = self.rel_dispense_increments(valve_pos, rel_pos_converted, wait=wait)
@@ -240,7 +241,7 @@ class CavroXCaliburPump(Component):
         :param valve_pos: 'input' or 'output' or 'bypass'
         :return: i, o, b for non-distribution valves OR 1-x for distribution valve ports
         """
-        self.log(f'Switch valve to position {valve_pos}')
+        self.log('Switch valve to position {}', valve_pos)
         self.current_op = f'Switch valve to position {valve_pos}'
         valve_cmd = self._convert_val_pos(valve_pos)
         self._send_command(f"{valve_cmd}R")
@@ -249,10 +250,14 @@ class CavroXCaliburPump(Component):
         self.current_op = None
         return current_valve_pos
 
+    def setup_state(self, command: str, kwargs: dict):
+        # all movement commands take the valve position
+        return kwargs.get('valve_pos')
+
     def terminate(self):
         self._send_command("TR")
         self.current_op = 'Terminated'
-        self.log(f'Terminated')
+        self.log('Terminated')
 
     def open(self, init: bool = True):
         if not self.is_connected:
@@ -25,7 +25,7 @@ class DiySampler(Component):
         self.byte_size = 8
 
     def base_state(self):
-        self.log(f'Home')
+        self.log('Home')
         self.terminate('x')
         time.sleep(0.1)
         self.terminate('y')
@@ -50,7 +50,7 @@ class DiySampler(Component):
             self.base_state()
             self.master.close()
             self.is_connected = False
-            self.log(f'Closed')
+            self.log('Closed')
 
     def _get_address(self, axis: str) -> int:
         assert axis in 'xyz' and len(axis) == 1, f'axis must be x, y, or z, but got {axis} instead'
@@ -70,7 +70,7 @@ class DiySampler(Component):
         if velocity is None:
             velocity = self.default_v[axis]
 
-        self.log(f'Set velocity = {velocity}, acceleration = {acceleration}, deceleration = {deceleration}')
+        self.log('Set velocity = {}, acceleration = {}, deceleration = {}', velocity, acceleration, deceleration)
         with self.lock:
             self.master.execute(addr, cst.WRITE_SINGLE_REGISTER, 0x4600, output_value=velocity)
             self.master.execute(addr, cst.WRITE_SINGLE_REGISTER, 0x4610, output_value=acceleration)
@@ -178,7 +178,7 @@ class DiySampler(Component):
 
     def terminate(self, axis: str):
         addr = self._get_address(axis)
-        self.log(f'Terminate {axis} axis')
+        self.log('Terminate {} axis', axis)
         self.current_op = f'Terminating {axis} axis'
 
         self.master.execute(addr, cst.WRITE_MULTIPLE_COILS, 0x120, output_value=[0, 0, 0, 1, 0])
@@ -200,8 +200,23 @@ class DiySampler(Component):
             is_moving = x_mov or y_mov or z_mov
             self._sleep(0.1)
 
+    def setup_state(self, command: str, kwargs: dict):
+        if command == 'moveto':
+            return kwargs.get('x_pos'), kwargs.get('y_pos'), kwargs.get('z_pos')
+        return None
+
+    def setup_cost(self, state_from, state_to) -> float:
+        if state_from is None:
+            return 1.0
+        # travel distance in mm over the axes known in both states
+        dist = 0.0
+        for pos_from, pos_to in zip(state_from, state_to):
+            if pos_from is not None and pos_to is not None:
+                dist += abs(pos_to - pos_from)
+        return dist
+
     def moveto(self, x_pos: int = None, y_pos: int = None, z_pos: int = None):
-        self.log(f'Moving to x {x_pos}mm, y {y_pos}mm, z {z_pos}mm')
+        self.log('Moving to x {}mm, y {}mm, z {}mm', x_pos, y_pos, z_pos)
         self.current_op = f'Moving to x {x_pos}mm, y {y_pos}mm, z {z_pos}mm'
         if x_pos is not None:
             self._start_movement_abs_single('x', x_pos)
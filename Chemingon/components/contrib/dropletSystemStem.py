@@ -106,13 +106,13 @@ class DropletSystemStem(CombinedComponent):
         if a_pos != b_pos:
             warnings.warn('Channel selection valves not at the same position!')
         self.current_op = tmp_op
-        self.log(f'Channel {channel} selected')
+        self.log('Channel {} selected', channel)
         return a_pos
 
     def rinse(self, channel: int):
         tmp_op = self.current_op
         self.current_op = f'Rinsing channel {channel}'
-        self.log(f'Rinsing channel {channel}')
+        self.log('Rinsing channel {}', channel)
 
         self.select_channel(channel)
         self.pump_rinse.rel_dispense(valve_pos='output', rel_pos=50, top_speed=10)
@@ -128,7 +128,7 @@ class DropletSystemStem(CombinedComponent):
     def blow_gas(self, duration: int = 3, channel: int = None):
         tmp_op = self.current_op
         self.current_op = f'Blowing gas in channel {channel}: {duration} seconds'
-        self.log(f'Blowing gas in channel {channel}: {duration} seconds')
+        self.log('Blowing gas in channel {}: {} seconds', channel, duration)
         if channel is not None:
             self.select_channel(channel)
 
@@ -143,7 +143,7 @@ class DropletSystemStem(CombinedComponent):
     def propel_gas(self, volume: int, channel: int = None, speed: int = 8):
         tmp_op = self.current_op
         self.current_op = f'Propelling gas in channel {channel}: {volume}ul'
-        self.log(f'Propelling gas in channel {channel}: {volume}ul')
+        self.log('Propelling gas in channel {}: {}ul', channel, volume)
 
         if channel is not None:
             self.select_channel(channel)
@@ -163,7 +163,7 @@ class DropletSystemStem(CombinedComponent):
 
     def prep_droplet(self, channel: int, drop1_vol: int = 15, drop2_vol: int = 15, gas_volume: int = 200, gas_speed = 5):
         self.current_op = f'Preparing droplet in channel {channel}'
-        self.log(f'Preparing droplet in channel {channel}')
+        self.log('Preparing droplet in channel {}', channel)
 
         self.select_channel(channel)
         self.current_op = f'Preparing droplet in channel {channel}'
@@ -196,6 +196,25 @@ class DropletSystemStem(CombinedComponent):
         self.propel_gas(volume=100)
         # todo not completed
 
+    def setup_state(self, command: str, kwargs: dict):
+        if command in ('fill_tubes_init', 'finishing'):
+            return '10'
+        if kwargs.get('channel') is None:
+            return None
+        return str(kwargs['channel'])
+
+    def state_after(self, command: str, kwargs: dict):
+        if command in ('select_channel', 'analysis'):
+            return self.setup_state(command, kwargs)
+        if command in ('fill_tubes_init', 'finishing', 'rinse', 'prep_droplet') or kwargs.get('channel') is not None:
+            # switched back to channel 10 when done
+            return '10'
+        return None
+
+    def setup_cost(self, state_from, state_to) -> float:
+        # both channel selection valves move
+        return self.valveA.setup_cost(state_from, state_to) + self.valveB.setup_cost(state_from, state_to)
+
     def open(self, init: bool = True):
         if not self.is_connected:
             self.current_op = 'Connecting'
@@ -125,7 +125,7 @@ class OceanInsightLightSource(Component):
         self.daq.port1.line0 = True
         self.base_state()
 
-        self.log(f'Device info: {self.daq}')
+        self.log('Device info: {}', self.daq)
         self.is_connected = True
         self.current_op = None
 
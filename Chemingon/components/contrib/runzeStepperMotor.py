@@ -34,7 +34,7 @@ class RunzeStepperMotor(Component):
 
     def open(self):
         if not self.is_connected:
-            self.log(f'Establish connection')
+            self.log('Establish connection')
             self.current_op = 'Establishing connection'
             self.serial = serial.Serial(port=self.port)
             self.serial.read_all()
@@ -130,7 +130,7 @@ class RunzeStepperMotor(Component):
         assert io_spacing == 'None' or io_spacing == 'IO1' or io_spacing == 'IO2', "io_spacing must be 'None', 'IO1' or 'IO2'"
 
         if log:
-            self.log(f"Moving direction: {direction}, steps: {steps}, speed: {speed}, spacing: {io_spacing}")
+            self.log("Moving direction: {}, steps: {}, speed: {}, spacing: {}", direction, steps, speed, io_spacing)
         self.set_speed(speed)
         self.current_op = f"Moving direction: {direction}, steps: {steps}, spacing: {io_spacing}"
 
@@ -159,7 +159,7 @@ class RunzeStepperMotor(Component):
 
     def oscillate(self, duration: float, step_size: int, speed: int = 20):
         self.current_op = 'Oscillating'
-        self.log(f'Oscillate for {duration} seconds')
+        self.log('Oscillate for {} seconds', duration)
         start_time = time.time()
         time_delta = 0
         while time_delta < duration and not self._force_terminated:
@@ -175,7 +175,7 @@ class RunzeStepperMotor(Component):
         self.current_op = None
 
     def set_speed(self, rpm: int):
-        self.log(f'Set speed to {rpm}')
+        self.log('Set speed to {}', rpm)
         self._send_message(0x4B, rpm)
         self._wait_until_ready()
 
@@ -185,7 +185,7 @@ class RunzeStepperMotor(Component):
 
     def query_address(self) -> int:
         status, param = self._send_message(0x20, 0x0000)
-        self.log(f'Address is {param}')
+        self.log('Address is {}', param)
         return param
 
     def query_current(self) -> int:
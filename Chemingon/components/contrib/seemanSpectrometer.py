@@ -39,7 +39,7 @@ class SeemanSpectrometer(Sensor):
         self._get_wavelengths_array()
 
         self.is_connected = True
-        self.log(f'Opened, recording {self.record_wavelength_actual}, device serial {self.SN}')
+        self.log('Opened, recording {}, device serial {}', self.record_wavelength_actual, self.SN)
 
     def _get_pixel_number(self):
         rtn = self.dev.write(self._WRITE_ENDPOINT, b'\x30', 1000)
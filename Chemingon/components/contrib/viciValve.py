@@ -45,11 +45,11 @@ class ViciValve(Component):
         with self.lock:
             self.serial.read_all()
             self.serial.write(send_command.encode('utf-8'))
-            # self.log(f"Message sent: {send_command}")
+            # self.log("Message sent: {}", send_command)
             time.sleep(0.5)
             result = self.serial.read_all().decode('utf-8')
 
-            # self.log(f'Received: {result}')
+            # self.log('Received: {}', result)
 
         return result
 
@@ -79,7 +79,7 @@ class ViciValve(Component):
         else:
             assert 0 <= int(pos) <= 41
 
-        self.log(f'Go to position {pos}')
+        self.log('Go to position {}', pos)
         self.current_op = pos
         self._send_command(f'GO{pos}')
         self._sleep(0.5)
@@ -89,7 +89,7 @@ class ViciValve(Component):
         self._send_command('TO')
         self._sleep(0.5)
         current_pos = self.get_pos()
-        self.log(f'Switched to {current_pos}')
+        self.log('Switched to {}', current_pos)
         return current_pos
 
     def set_id(self, set_id: str):
@@ -110,5 +110,14 @@ class ViciValve(Component):
         else:
             return int(result[0][1:].strip('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
 
+    def setup_state(self, command: str, kwargs: dict):
+        if command == 'goto':
+            return str(kwargs.get('pos'))
+        return None
+
+    def setup_cost(self, state_from, state_to) -> float:
+        # goto: command, 0.5s settle and position query
+        return 0.0 if state_from == state_to else 1.5
+
     def terminate(self):
         pass
@@ -0,0 +1,127 @@
+import importlib
+import json
+import os
+from importlib import metadata
+from threading import Lock
+from typing import Union
+
+from .contrib import DRIVERS
+from .stdlib.component import Component
+
+ENTRY_POINT_GROUP = 'chemingon.components'
+MANIFEST_ENV = 'CHEMINGON_COMPONENTS'  # manifest files, separated by os.pathsep
+
+
+class ComponentRegistry:
+    """
+    Component classes by type name, e.g. 'ViciValve', so that devices can be created from a definition file.
+    A type is registered as a class or as a 'module:Class' reference; the module is only imported when a device of that
+    type is created. Besides the drivers of Chemingon, types come from:
+        - the entry points of installed packages in the group 'chemingon.components', e.g. in pyproject.toml:
+              [project.entry-points."chemingon.components"]
+              MyPump = "mylab.drivers.pump:MyPump"
+        - manifest files: JSON objects {"MyPump": "mylab.drivers.pump:MyPump"}, given to load_manifest() or listed in
+          the environment variable CHEMINGON_COMPONENTS
+    Entry points and the manifests of the environment variable are read once, the first time a type is looked up.
+    """
+
+    def __init__(self, discover: bool = True):
+        self._lock = Lock()
+        self._targets: dict[str, Union[str, type, metadata.EntryPoint]] = dict()
+        self._classes: dict[str, type] = dict()
+        self._discovered = not discover
+
+    def register(self, name: str, target: Union[str, type]):
+        """
+        :param name: type name used in definition files
+        :param target: Component subclass or 'module:Class'
+        """
+        if isinstance(target, str) and ':' not in target:
+            raise ValueError(f'Component type {name}: {target} must be given as "module:Class"')
+        with self._lock:
+            self._targets[name] = target
+            self._classes.pop(name, None)
+
+    def load_manifest(self, path: str):
+        with open(path) as f:
+            manifest = json.load(f)
+        if not isinstance(manifest, dict):
+            raise ValueError(f'Component manifest {path} must be a JSON object of type name: "module:Class"')
+        for name, target in manifest.items():
+            self.register(name, target)
+
+    def discover(self):
+        """Read the entry points of the installed packages and the manifests of CHEMINGON_COMPONENTS"""
+        with self._lock:
+            if self._discovered:
+                return
+            self._discovered = True
+            for entry_point in metadata.entry_points(group=ENTRY_POINT_GROUP):
+                self._targets.setdefault(entry_point.name, entry_point)
+        for path in os.environ.get(MANIFEST_ENV, '').split(os.pathsep):
+            if path:
+                self.load_manifest(path)
+
+    def names(self) -> list[str]:
+        self.discover()
+        return sorted(self._targets)
+
+    def __contains__(self, name: str) -> bool:
+        self.discover()
+        return name in self._targets
+
+    def get(self, name: str) -> type:
+        """:return: class of the type, importing its module if needed"""
+        cls = self._classes.get(name)
+        if cls is not None:
+            return cls
+        self.discover()
+        target = self._targets.get(name)
+        if target is None:
+            raise ValueError(f'Unknown component type {name}; registered types: {", ".join(self.names())}')
+        try:
+            if isinstance(target, metadata.EntryPoint):
+                cls = target.load()
+            elif isinstance(target, str):
+                module, _, attribute = target.partition(':')
+                cls = importlib.import_module(module)
+                for i in attribute.split('.'):
+                    cls = getattr(cls, i)
+            else:
+                cls = target
+        except ImportError as e:
+            raise ImportError(f'Component type {name} cannot be imported: {e}') from e
+        except AttributeError as e:
+            raise ValueError(f'Component type {name} ({target}) not found: {e}') from e
+        if not (isinstance(cls, type) and issubclass(cls, Component)):
+            raise ValueError(f'Component type {name} ({target}) is not a Component class')
+        self._classes[name] = cls
+        return cls
+
+    def create(self, type_name: str, *args, **kwargs) -> Component:
+        """Create a device of the type, e.g. create('ViciValve', 'valve 1', port='COM3', valve_id='1')"""
+        return self.get(type_name)(*args, **kwargs)
+
+    def build(self, spec: dict) -> Component:
+        """
+        Create a device from its entry in a definition file
+        :param spec: {'type': registered type name, 'name': name of the device, other arguments of the class}
+        """
+        kwargs = dict(spec)
+        try:
+            type_name = kwargs.pop('type')
+        except KeyError:
+            raise ValueError(f'Component {spec.get("name")}: the type of the component is missing') from None
+        return self.create(type_name, **kwargs)
+
+
+def _default_registry() -> ComponentRegistry:
+    default = ComponentRegistry()
+    for name in ('Component', 'Sensor', 'CombinedComponent', 'DummyComponent', 'DummySensor', 'DummyCombinedDevice'):
+        default.register(name, f'Chemingon.components.stdlib:{name}')
+    for name, module in DRIVERS.items():
+        default.register(name, f'Chemingon.components.contrib.{module}:{name}')
+    return default
+
+
+registry = _default_registry()  # used by the definition files
@@ -4,3 +4,4 @@ from .dummyComponent import DummyComponent
 from .dummyCombinedDevice import DummyCombinedDevice
 from .dummySensor import DummySensor
 from .sensor import Sensor
+from .portLock import PortLock, DeviceLock
@@ -6,6 +6,8 @@ import importlib
 
 from loguru import logger
 
+from .portLock import PortLock, DeviceLock
+
 
 class Component:
     """
@@ -13,6 +15,11 @@ class Component:
     All devices should inherit Component.
     """
 
+    # published to the StateStore of the experiment running the device whenever they are assigned
+    STATE_FIELDS = ('current_op', 'is_connected', 'description_display')
+    state_store = None
+    event_log = None  # EventLog of the experiment running the device, see Experiment.enable_event_log()
+
     def __init__(self, name: str, is_public: bool = False, description: str = None, keep_log=True):
         self.name = name
         self._isPublic = is_public
@@ -25,11 +32,17 @@ class Component:
         self.description_display = description  # display in UI
         self.current_op = None
 
-        self.lock: Lock = Lock()  # prevent error when using serial
+        self.lock: Union[Lock, DeviceLock] = Lock()  # prevent error when using serial; see update_lock()
+        self.last_setup_state = None  # state left by the last operation, see setup_state()
 
         if self._isPublic:
             self.taskQueue = Queue()
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in Component.STATE_FIELDS and self.state_store is not None:
+            self.state_store.publish('device', self.name, {name: value})
+
     def __repr__(self):
         return f"<{self.__class__.__name__} {self.name}>"
 
@@ -67,8 +80,18 @@ class Component:
     def is_public(self):
         return self._isPublic
 
-    def log(self, message: str):
-        if self.keep_log:
+    def log(self, message: str, *args):
+        """
+        :param message: message, or template formatted with args ({} placeholders) only if it is logged, e.g.
+            self.log('Flow set to {} mL/min', flow)
+        """
+        if not self.keep_log:
+            return
+        if self.event_log is not None:
+            self.event_log.debug(message, *args, device=self.name)
+        elif args:
+            logger.debug("Log from {}device {}: " + message, 'public ' if self.is_public else '', self.name, *args)
+        else:
             logger.debug(f"Log from {'public ' if self.is_public else ''}device {self.name}: {message}")
 
     def force_terminate_operation(self):
@@ -79,7 +102,7 @@ class Component:
             logger.error(f"Terminate method not implemented for device {self.name}: {e}")
         except Exception as e:
             logger.error(f"Log from {'public ' if self.is_public else ''}device {self.name}: Error when terminating: {e}")
-        self.log(f'device {self.name} force terminated')
+        self.log('device {} force terminated', self.name)
 
     def _sleep(self, seconds: float):
         """
@@ -95,13 +118,39 @@ class Component:
         return time.time() - start_time
 
     def update_lock(self, lock_dict: dict) -> dict:
+        """
+        Components using the same port share a PortLock, each through its own DeviceLock handle;
+        :param lock_dict: port -> PortLock of the apparatus
+        """
         if self.port is not None:
-            if self.port in lock_dict:
-                self.lock = lock_dict[self.port]
-            else:
-                lock_dict[self.port] = self.lock
+            if self.port not in lock_dict:
+                if isinstance(self.lock, DeviceLock):  # already shared in a combined component
+                    lock_dict[self.port] = self.lock.port_lock
+                else:
+                    lock_dict[self.port] = PortLock(self.port)
+            self.lock = lock_dict[self.port].device_lock(self.name)
         return lock_dict
 
+    def setup_state(self, command: str, kwargs: dict):
+        """
+        State the device must be in before executing the command, e.g. a valve position;
+        used by SetupAwarePolicy to group operations on public devices.
+        :return: a hashable state, or None if the command does not depend on the state of the device
+        """
+        return None
+
+    def state_after(self, command: str, kwargs: dict):
+        """
+        State the device is left in after executing the command; same as setup_state() by default
+        """
+        return self.setup_state(command, kwargs)
+
+    def setup_cost(self, state_from, state_to) -> float:
+        """
+        Cost (e.g. seconds) of switching from one state to another; state_from is None if unknown
+        """
+        return 0.0 if state_from == state_to else 1.0
+
     def _raise_error(self, err_name: str, fatality: bool = False, pause: bool = True):
         ExperimentError = importlib.import_module('.errors', 'core').ExperimentError
         raise ExperimentError(err_name, fatality=fatality, pause=pause)
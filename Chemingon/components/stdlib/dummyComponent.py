@@ -13,25 +13,25 @@ class DummyComponent(Component):
                 self.current_op = f'do_something: now at {i}'
                 self._sleep(random.uniform(1.0, 3.0))
                 # print(f"device {self.name} is doing something {i}: {output}\n")
-                self.log(f"doing {output}: i = {i}")
+                self.log("doing {}: i = {}", output, i)
 
             self.current_op = 'Inactive'
         else:
             raise RuntimeError(f'{self.name} not connected')
 
         # print(f"device {self.name} done!")
-        self.log(f"device {self.name} done!")
+        self.log("device {} done!", self.name)
 
     def base_state(self):
-        self.log(f"device {self.name} is set to base_state")
+        self.log("device {} is set to base_state", self.name)
 
     def open(self):
         # print(f'{self.name} connected')
-        self.log(f'{self.name} connected')
+        self.log('{} connected', self.name)
         self.is_connected = True
 
     def close(self):
-        self.log(f'{self.name} disconnected')
+        self.log('{} disconnected', self.name)
         # print(f'{self.name} disconnected')
         self.is_connected = False
 
@@ -0,0 +1,113 @@
+import time
+from collections import Counter
+from threading import Lock
+from typing import Union
+
+
+class PortLock:
+    """
+    Lock shared by the devices using the same port, recording how long devices wait for it and hold it, and which
+    device was holding it when another one had to wait.
+    Devices get their own handle with device_lock(); the statistics are only updated while the lock is held.
+    """
+
+    def __init__(self, port: str):
+        self.port = port
+        self._lock = Lock()
+        self.holder: Union[None, str] = None
+        self.last_holder: Union[None, str] = None
+        self._hold_start = 0.0
+        self.devices: set[str] = set()
+        self.reset()
+
+    def reset(self):
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.hold_time = 0.0
+        self.max_hold = 0.0
+        self.device_wait: Counter = Counter()
+        self.device_hold: Counter = Counter()
+        self.device_acquisitions: Counter = Counter()
+        self.pairs: Counter = Counter()  # (waiting device, holding device) -> number of waits
+        self.pair_wait: Counter = Counter()  # (waiting device, holding device) -> time waited
+
+    def device_lock(self, device: str) -> 'DeviceLock':
+        self.devices.add(device)
+        return DeviceLock(self, device)
+
+    def acquire(self, device: str, blocking: bool = True, timeout: float = -1) -> bool:
+        contended = False
+        if not self._lock.acquire(blocking=False):
+            if not blocking:
+                return False
+            holder = self.holder
+            start = time.perf_counter()
+            if not self._lock.acquire(timeout=timeout):
+                return False
+            wait = time.perf_counter() - start
+            contended = True
+        # held from here on
+        self.acquisitions += 1
+        self.device_acquisitions[device] += 1
+        if contended:
+            self.contended += 1
+            self.wait_time += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.device_wait[device] += wait
+            if holder is None:  # handed over when the wait started; the last holder is the one waited for
+                holder = self.last_holder
+            if holder is not None:
+                self.pairs[(device, holder)] += 1
+                self.pair_wait[(device, holder)] += wait
+        self.holder = device
+        self._hold_start = time.perf_counter()
+        return True
+
+    def release(self):
+        hold = time.perf_counter() - self._hold_start
+        self.hold_time += hold
+        self.max_hold = max(self.max_hold, hold)
+        self.device_hold[self.holder] += hold
+        self.last_holder = self.holder
+        self.holder = None
+        self._lock.release()
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    def report(self) -> str:
+        lines = [f'Port {self.port} ({", ".join(sorted(self.devices))}): {self.acquisitions} acquisitions, '
+                 f'{self.contended} contended, wait {self.wait_time:.3f} s (max {self.max_wait * 1e3:.1f} ms), '
+                 f'hold {self.hold_time:.3f} s (max {self.max_hold * 1e3:.1f} ms)']
+        for device in sorted(self.device_acquisitions):
+            lines.append(f'    {device}: {self.device_acquisitions[device]} acquisitions, '
+                         f'wait {self.device_wait[device]:.3f} s, hold {self.device_hold[device]:.3f} s')
+        for (waiter, holder), count in self.pairs.most_common():
+            lines.append(f'    {waiter} waited for {holder} {count} times, {self.pair_wait[(waiter, holder)]:.3f} s')
+        return '\n'.join(lines)
+
+
+class DeviceLock:
+    """Handle of a PortLock used as Component.lock, so that the PortLock knows which device takes it"""
+
+    def __init__(self, port_lock: PortLock, device: str):
+        self.port_lock = port_lock
+        self.device = device
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        return self.port_lock.acquire(self.device, blocking, timeout)
+
+    def release(self):
+        self.port_lock.release()
+
+    def locked(self) -> bool:
+        return self.port_lock.locked()
+
+    def __enter__(self):
+        self.port_lock.acquire(self.device)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.port_lock.release()
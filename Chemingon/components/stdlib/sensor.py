@@ -33,7 +33,7 @@ class Sensor(Component):
         self.directory = directory
         self.time_str = time.strftime('%d%h%y_%H%M%S', time.localtime(self.start_time))
         self.filename = f"{self.directory}/{self.name}_{self.time_str}.csv"
-        self.log(f"Sensor {self.name}: data will be saved as {self.filename}")
+        self.log("Sensor {}: data will be saved as {}", self.name, self.filename)
 
     def base_state(self):
         raise NotImplementedError(f'Base state undefined for device {self}!')
@@ -66,6 +66,9 @@ class Sensor(Component):
         data['time'] = timedelta
         with self.pandas_lock:
             self.data.loc[len(self.data)] = data
+            samples = len(self.data)
+        if self.state_store is not None:
+            self.state_store.publish('sensor', self.name, {'samples': samples, 'time': timedelta})
 
     @property
     def data(self):
@@ -1,11 +1,33 @@
 from loguru import logger
 from .apparatus import Apparatus
 from .errors import ExperimentError, ErrorInfo, ErrorHandler
-from .experiment import Experiment, JupyterUI
+from .experiment import Experiment
 from .operation import Operation, VirtualOperation, VirtualDevice, PublicBlocker
-from .protocol import Protocol
+from .protocol import Protocol, ParallelBlock
+from .reservation import ResourceManager, Reservation
+from .scheduling import QueuePolicy, SetupAwarePolicy
+from .template import ProtocolTemplate, ParameterSweep, Param
+from .campaign import Campaign
+from .tracing import Tracer
+from .hooks import HookRegistry
+from .metrics import Metrics, ExperimentMetrics
+from .memory import MemoryWatchdog
+from .profiler import SamplingProfiler
+from .cputime import CpuTimeAccount
+from .state import StateStore
+from .dashboard import Dashboard
+from .definition import ProtocolFile
+from .eventlog import EventLog
 
 logger.remove()
 logger.level("SUCCESS", icon="✅")
 logger.level("ERROR", icon="❌")
 logger.level("TRACE", icon="🔍")
+
+
+def __getattr__(name):
+    # the notebook interface imports ipywidgets, bqplot and IPython; only loaded when asked for
+    if name == 'JupyterUI':
+        from .jupyter import JupyterUI
+        return JupyterUI
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
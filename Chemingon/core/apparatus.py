@@ -1,6 +1,6 @@
 from ..components.stdlib import component
 from ..components.stdlib.sensor import Sensor
-# from operation import Operation, VirtualOperation
+from .operation import VirtualDevice
 
 
 class Apparatus:
@@ -14,7 +14,7 @@ class Apparatus:
         self.components: set[component.Component] = set()
         self.publicComponents: set[component.Component] = set()
         self.sensors: set[Sensor] = set()
-        self.virtual_devices = set()
+        self.virtual_device = VirtualDevice()  # runs the virtual operations of all protocols
 
         self._lock_dict = dict()
 
@@ -39,6 +39,11 @@ class Apparatus:
         # components using the same port use the same lock
         self._lock_dict = comp.update_lock(self._lock_dict)
 
+    @property
+    def port_locks(self) -> list:
+        """PortLock of every port used by the components"""
+        return list(self._lock_dict.values())
+
     def add_component_list(self, component_list: list[component.Component]):
         for i in component_list:
             self.add_component(i)
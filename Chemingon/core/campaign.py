@@ -0,0 +1,165 @@
+import time
+from queue import Queue, Empty
+from threading import Thread, Event, Lock
+from typing import Union, Callable, Iterator
+
+import pandas as pd
+from loguru import logger
+
+from ..components.stdlib.sensor import Sensor
+from .protocol import Protocol
+from .template import ProtocolTemplate
+
+
+class Campaign:
+    """
+    Closed-loop campaign: protocols are built from the parameters suggested by an optimiser, and the results,
+    extracted from the sensor data recorded while each protocol ran, are fed back to it.
+    The optimiser runs in a background thread and suggestions are prefetched, so channels never wait for it;
+    add the campaign to an Experiment with add_protocol_source().
+
+    suggest() -> dict of parameters, or None when the campaign is over
+    observe(params, result) -> None
+    extract(params, window) -> result; window is {sensor name: DataFrame of the data recorded during the protocol}.
+        The window itself is passed to observe() if extract is None.
+    """
+
+    def __init__(self, template: Union[ProtocolTemplate, Callable[[dict], Protocol]],
+                 suggest: Callable[[], Union[dict, None]], observe: Callable[[dict, object], None],
+                 extract: Callable[[dict, dict[str, pd.DataFrame]], object] = None, sensors: list[Sensor] = None,
+                 budget: int = None, prefetch: int = 2):
+        assert prefetch >= 1
+        if isinstance(template, ProtocolTemplate):
+            self._build: Callable[[dict], Protocol] = lambda params: template.instantiate(**params)
+        else:
+            self._build = template
+        self.suggest = suggest
+        self.observe = observe
+        self.extract = extract
+        self.sensors: list[Sensor] = [] if sensors is None else sensors
+        self.budget = budget
+        self.prefetch = prefetch
+
+        self.results: list[tuple[dict, object]] = []  # (params, result) in the order observed
+        self.issued = 0
+        self.suggest_time = 0.0  # time spent in suggest() and observe(), s
+        self.observe_time = 0.0
+
+        self._ready: Queue[dict] = Queue()  # prefetched parameters
+        self._running: list[tuple[Protocol, dict]] = []
+        self._building = 0  # parameters taken from the queue, protocol not built yet
+        self._running_lock = Lock()  # also counts the parameters issued, see _top_up()
+        self._exhausted = False  # no more suggestions
+        self._stop = Event()
+        self._worker: Union[None, Thread] = None
+
+    @property
+    def finished(self) -> bool:
+        with self._running_lock:
+            running = len(self._running) + self._building
+        return self._exhausted and self._ready.empty() and running == 0
+
+    def start(self):
+        if self._worker is None:
+            self._worker = Thread(target=self._work, name='Campaign optimiser')
+            self._worker.daemon = True
+            self._worker.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait until all suggestions are executed and observed"""
+        if self._worker is None:
+            return True
+        self._worker.join(timeout)
+        return not self._worker.is_alive()
+
+    def window_data(self, protocol: Protocol) -> dict[str, pd.DataFrame]:
+        """
+        :return: {sensor name: data recorded between the start and the end of the protocol}
+        """
+        window = dict()
+        for sensor in self.sensors:
+            if sensor.start_time is None:
+                continue
+            t_start = protocol.start_time - sensor.start_time
+            t_end = protocol.end_time - sensor.start_time
+            with sensor.pandas_lock:
+                data = sensor.data
+                window[sensor.name] = data[(data['time'] >= t_start) & (data['time'] <= t_end)].copy()
+        return window
+
+    def _observe_done(self):
+        with self._running_lock:
+            done = [i for i in self._running if i[0].end_time is not None]
+            for i in done:
+                self._running.remove(i)
+        for protocol, params in done:
+            if not protocol.finished:
+                logger.warning(f'Campaign: protocol {protocol.name} not finished; not observed')
+                continue
+            t = time.time()
+            window = self.window_data(protocol)
+            result = window if self.extract is None else self.extract(params, window)
+            self.observe(params, result)
+            self.observe_time += time.time() - t
+            self.results.append((params, result))
+
+    def _top_up(self):
+        while (not self._exhausted) and self._ready.qsize() < self.prefetch:
+            with self._running_lock:  # parameters leave the queue and are counted as issued at once
+                over_budget = self.budget is not None and self.issued + self._ready.qsize() >= self.budget
+            if over_budget:
+                self._exhausted = True
+                break
+            t = time.time()
+            params = self.suggest()
+            self.suggest_time += time.time() - t
+            if params is None:
+                self._exhausted = True
+            else:
+                self._ready.put(params)
+
+    @logger.catch()
+    def _work(self):
+        try:
+            while not self._stop.is_set():
+                self._observe_done()
+                self._top_up()
+                if self.finished:
+                    break
+                time.sleep(0.05)
+        except Exception as e:
+            logger.error(f'Campaign stopped by error in the optimiser: {e}')
+            self._exhausted = True
+            raise e
+        finally:
+            if self._stop.is_set():
+                self._exhausted = True
+
+    def __iter__(self) -> Iterator[Union[Protocol, None]]:
+        self.start()
+        while not self._stop.is_set():
+            with self._running_lock:
+                try:
+                    params = self._ready.get_nowait()
+                    self.issued += 1
+                    self._building += 1
+                except Empty:
+                    params = None
+            if params is None:
+                if self._exhausted and self._ready.empty():
+                    return
+                yield None  # nothing suggested yet; the channel checks again later
+                continue
+            try:
+                protocol = self._build(params)
+            except Exception:
+                with self._running_lock:
+                    self._building -= 1
+                raise
+            with self._running_lock:
+                self._building -= 1
+                self._running.append((protocol, params))
+            yield protocol
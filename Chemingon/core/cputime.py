@@ -0,0 +1,59 @@
+import time
+from collections import Counter
+from threading import Lock
+
+
+class CpuTimeAccount:
+    """
+    CPU time (time.thread_time) used by the threads of an experiment, accumulated by category:
+        channel: operations of the protocols of each channel, on whichever thread they ran
+        device: operations executed by each device
+        sensor: updates of each sensor
+        thread: whole lifetime of each channel, public device, sensor, supervisor and UI thread, including the time
+                spent polling queues between operations
+    """
+
+    CATEGORIES = ('channel', 'device', 'sensor', 'thread')
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.seconds: dict[str, Counter] = {i: Counter() for i in self.CATEGORIES}
+            self.counts: dict[str, Counter] = {i: Counter() for i in self.CATEGORIES}
+
+    @staticmethod
+    def now() -> float:
+        return time.thread_time()
+
+    def add(self, category: str, key, seconds: float):
+        with self._lock:
+            self.seconds[category][key] += seconds
+            self.counts[category][key] += 1
+
+    def report(self) -> dict[str, dict]:
+        """:return: {category: {key: CPU seconds}}"""
+        with self._lock:
+            return {category: dict(values) for category, values in self.seconds.items()}
+
+    def summary(self, wall_time: float = None, top: int = None) -> str:
+        """
+        :param wall_time: duration of the run, to give the CPU usage of each entry
+        :param top: number of entries shown per category; all if None
+        """
+        lines = []
+        with self._lock:
+            for category in self.CATEGORIES:
+                values = self.seconds[category]
+                if not values:
+                    continue
+                lines.append(f'CPU time by {category}: total {sum(values.values()):.3f}s')
+                for key, seconds in values.most_common(top):
+                    usage = f', {seconds / wall_time * 100:.1f}% of one core' if wall_time else ''
+                    lines.append(f'    {key}: {seconds:.3f}s over {self.counts[category][key]} '
+                                 f'measurement(s){usage}')
+                if top is not None and len(values) > top:
+                    lines.append(f'    ... {len(values) - top} more')
+        return '\n'.join(lines)
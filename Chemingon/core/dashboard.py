@@ -0,0 +1,515 @@
+import base64
+import hashlib
+import json
+import ipaddress
+import math
+import secrets
+import select
+import socket
+import struct
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, Event
+from typing import Union
+
+from loguru import logger
+
+from .errors import ExperimentError, ErrorInfo
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+def _encode_frame(payload: bytes, opcode: int = 0x1) -> bytes:
+    """Unmasked WebSocket frame sent by the server"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+
+def _read_frame(rfile) -> tuple[int, bytes]:
+    """:return: opcode and unmasked payload of a frame sent by the client; opcode 0x8 (close) if the socket closed"""
+    head = rfile.read(2)
+    if len(head) < 2:
+        return 0x8, b''
+    opcode, length = head[0] & 0x0F, head[1] & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', rfile.read(2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', rfile.read(8))[0]
+    mask = rfile.read(4) if head[1] & 0x80 else b'\x00\x00\x00\x00'
+    payload = rfile.read(length)
+    return opcode, bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+
+def _floats(values) -> list:
+    return [None if math.isnan(i) else i for i in values.tolist()]
+
+
+class Dashboard:
+    """
+    Browser dashboard of an Experiment for rigs running without Jupyter, served on http://127.0.0.1:<port>/ by a
+    local HTTP server in the experiment process.
+    The page receives the content of exp.state over a WebSocket (/ws): a snapshot when it connects, then the changed
+    fields only, at most every `interval` seconds, together with the new sensor samples thinned out to at most
+    `max_points` per `window` seconds. Start, pause, resume and force stop are sent as POST /control;
+    GET /state returns the whole state as JSON for scripts.
+    Requests whose Host is not the address of the server, or whose Origin is another site, are refused with 403, and
+    /control and /ws also require `token`, random per server and embedded in the page: in the X-Dashboard-Token
+    header of POST /control, in the token parameter of /ws.
+    """
+
+    def __init__(self, exp, port: int = 8765, host: str = '127.0.0.1', interval: float = 0.5,
+                 window: float = 60.0, max_points: int = 500):
+        self.exp = exp
+        self.port = port
+        self.host = host
+        self.interval = interval
+        self.window = window
+        self.max_points = max_points
+        self.token = secrets.token_urlsafe(16)
+        self._server: Union[None, ThreadingHTTPServer] = None
+        self._stop = Event()
+        self.supervisor: Union[None, Thread] = None
+
+    @property
+    def server_port(self) -> Union[None, int]:
+        return None if self._server is None else self._server.server_address[1]
+
+    @property
+    def url(self) -> Union[None, str]:
+        return None if self._server is None else f'http://{self.host}:{self.server_port}/'
+
+    def start(self) -> bool:
+        """:return: False if the server could not be started"""
+        if self._server is not None:
+            return True
+        self._stop.clear()
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        except OSError as e:
+            logger.error(f'Dashboard not started on port {self.port}: {e}')
+            return False
+        self._server.daemon_threads = True
+        Thread(target=self._server.serve_forever, name='UI dashboard', daemon=True).start()
+        logger.info(f'Dashboard served on {self.url}')
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Block until the experiment has finished, e.g. to keep a headless process serving the page
+        :return: False if timed out
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        version = 0
+        while not self.exp.finished:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            self.exp.state.wait(version, timeout=1.0 if remaining is None else min(1.0, remaining))
+            version = self.exp.state.version
+        return True
+
+    def allowed_host(self, host: str) -> bool:
+        """
+        :param host: Host header of a request; on a server bound to all interfaces, an IP address or the name of this
+            machine, else the bound address or localhost for a loopback server, and the port of the server
+        """
+        name, _, port = host.rpartition(':')
+        if port != str(self.server_port):
+            return False
+        name = name.strip('[]').lower()
+        if name == self.host.lower():
+            return True
+        try:
+            address = ipaddress.ip_address(name)
+        except ValueError:
+            address = None
+        if self.host in ('', '0.0.0.0', '::'):
+            return address is not None or name in (socket.gethostname().lower(), socket.getfqdn().lower(), 'localhost')
+        if self.host == 'localhost' or self.host.startswith('127.') or self.host == '::1':
+            return name == 'localhost' or (address is not None and address.is_loopback)
+        return False
+
+    # controls, as the buttons of JupyterUI
+
+    def start_experiment(self, dry_run: bool = False, stop_all: bool = False) -> bool:
+        """:return: False if the experiment was already started"""
+        if self.exp.is_running or self.exp.finished or self.supervisor is not None:
+            return False
+        self.exp.stop_all_upon_error = stop_all or dry_run
+        self.supervisor = Thread(target=self.exp.start_master_operators, args=(dry_run,), name='Supervisor')
+        self.supervisor.start()
+        return True
+
+    def control(self, action: str, dry_run: bool = False, stop_all: bool = False) -> bool:
+        """
+        :param action: 'start', 'pause', 'resume' or 'stop'
+        :return: False if the action does not apply in the current state of the experiment
+        """
+        exp = self.exp
+        logger.debug(f'Dashboard: {action}')
+        if action == 'start':
+            return self.start_experiment(dry_run=dry_run, stop_all=stop_all)
+        if action == 'pause':
+            if not exp.is_running:
+                return False
+            exp.pause = True
+        elif action == 'resume':
+            if exp.error_detail is not None:
+                return False
+            exp.pause = False
+        elif action == 'stop':
+            if not exp.is_running:
+                return False
+            exp.error_queue.put(ErrorInfo(ExperimentError('Force stop from dashboard'), None, True))
+        else:
+            raise ValueError(f'Unknown dashboard action {action}')
+        return True
+
+    # messages
+
+    @staticmethod
+    def _entries(changes: dict) -> list[dict]:
+        return [{'kind': kind, 'key': key, 'fields': fields} for (kind, key), fields in changes.items()]
+
+    def _stride(self, sensor) -> int:
+        return max(1, math.ceil(self.window * sensor.freq / self.max_points))
+
+    def _series(self, rows: dict, first: bool = False) -> dict:
+        """
+        New samples of every sensor since rows[sensor], keeping the samples whose index is a multiple of the stride so
+        that consecutive updates thin out the same way; the last `window` seconds on the first call
+        :param rows: samples already sent by sensor, updated
+        """
+        series = dict()
+        for sensor in self.exp.apparatus.sensors:
+            stride = self._stride(sensor)
+            with sensor.pandas_lock:
+                total = len(sensor.data)
+                start = max(0, total - int(self.window * sensor.freq)) if first else rows.get(sensor, 0)
+                start = -(-start // stride) * stride
+                if start >= total:
+                    rows[sensor] = total
+                    continue
+                tail = sensor.data.iloc[start:total:stride]
+                values = {channel: _floats(tail[channel].to_numpy(dtype=float)) for channel in sensor.channels}
+                values['time'] = _floats(tail['time'].to_numpy(dtype=float))
+            rows[sensor] = total
+            series[sensor.name] = values
+        return series
+
+    def snapshot_message(self, rows: dict) -> tuple[int, str]:
+        version, state = self.exp.state.snapshot()
+        sensors = {i.name: {'channels': list(i.channels), 'window': self.window} for i in self.exp.apparatus.sensors}
+        message = {'type': 'snapshot', 'version': version, 'entries': self._entries(state), 'sensors': sensors,
+                   'series': self._series(rows, first=True)}
+        return version, json.dumps(message, default=str)
+
+    def update_message(self, version: int, rows: dict) -> tuple[int, Union[None, str]]:
+        """:return: new version, message or None if nothing changed"""
+        version, changes, replace = self.exp.state.changes_since(version)
+        if replace:
+            rows.clear()
+            return self.snapshot_message(rows)
+        series = self._series(rows) if any(kind == 'sensor' for kind, key in changes) else dict()
+        if not changes and not series:
+            return version, None
+        message = {'type': 'update', 'version': version, 'entries': self._entries(changes), 'series': series}
+        return version, json.dumps(message, default=str)
+
+    # server
+
+    def _stream(self, handler: BaseHTTPRequestHandler):
+        """Push updates to one WebSocket client until it disconnects or the dashboard stops"""
+        threading.current_thread().name = 'UI dashboard client'
+        sock, rows = handler.connection, dict()
+        version, message = self.snapshot_message(rows)
+        try:
+            handler.wfile.write(_encode_frame(message.encode('utf-8')))
+            while not self._stop.is_set():
+                # the client only sends ping and close frames
+                if select.select([sock], [], [], 0)[0]:
+                    opcode, payload = _read_frame(handler.rfile)
+                    if opcode == 0x8:
+                        handler.wfile.write(_encode_frame(b'', 0x8))
+                        return
+                    if opcode == 0x9:
+                        handler.wfile.write(_encode_frame(payload, 0xA))
+                self._stop.wait(self.interval)
+                if not self.exp.state.wait(version, timeout=5.0):
+                    handler.wfile.write(_encode_frame(b'', 0x9))  # keeps idle connections alive
+                    continue
+                version, message = self.update_message(version, rows)
+                if message is not None:
+                    handler.wfile.write(_encode_frame(message.encode('utf-8')))
+        except (ConnectionError, OSError):
+            pass
+
+    def _handler(self):
+        dashboard = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, code: int, body: Union[str, bytes], content_type: str = 'application/json'):
+                if isinstance(body, str):
+                    body = body.encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-store')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _allowed(self, token: bool = False) -> bool:
+                """Send 403 to requests from other sites (DNS rebinding, cross-origin forms and scripts)"""
+                host = self.headers.get('Host', '')
+                origin = self.headers.get('Origin')
+                allowed = dashboard.allowed_host(host) and (origin is None or origin == f'http://{host}')
+                if allowed and token:
+                    sent = self.headers.get('X-Dashboard-Token') or parse_qs(urlsplit(self.path).query).get(
+                        'token', [''])[0]
+                    allowed = secrets.compare_digest(sent, dashboard.token)
+                if not allowed:
+                    self.send_error(403)
+                return allowed
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                if not self._allowed(token=path == '/ws'):
+                    return
+                if path == '/':
+                    self._send(200, DASHBOARD_PAGE.replace('__DASHBOARD_TOKEN__', dashboard.token), 'text/html')
+                elif path == '/state':
+                    version, message = dashboard.snapshot_message(dict())
+                    self._send(200, message)
+                elif path == '/ws' and self.headers.get('Upgrade', '').lower() == 'websocket':
+                    key = self.headers.get('Sec-WebSocket-Key', '')
+                    accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+                    self.send_response(101, 'Switching Protocols')
+                    self.send_header('Upgrade', 'websocket')
+                    self.send_header('Connection', 'Upgrade')
+                    self.send_header('Sec-WebSocket-Accept', accept)
+                    self.end_headers()
+                    self.wfile.flush()
+                    dashboard._stream(self)
+                    self.close_connection = True
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                if self.path.split('?')[0] != '/control':
+                    self.send_error(404)
+                    return
+                if not self._allowed(token=True):
+                    return
+                if self.headers.get('Content-Type', '').split(';')[0].strip() != 'application/json':
+                    self.send_error(415)
+                    return
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                    done = dashboard.control(request.get('action', ''), dry_run=bool(request.get('dry_run')),
+                                             stop_all=bool(request.get('stop_all')))
+                except (ValueError, AttributeError) as e:
+                    self._send(400, json.dumps({'ok': False, 'error': str(e)}))
+                    return
+                self._send(200 if done else 409, json.dumps({'ok': done}))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+DASHBOARD_PAGE = r"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Chemingon</title>
+<style>
+body { font-family: sans-serif; font-size: 13px; margin: 16px; }
+table { border-collapse: collapse; margin-bottom: 12px; }
+td, th { padding: 2px 8px; text-align: left; border-bottom: 1px solid #ddd; }
+progress { width: 120px; }
+.error { color: #c00; }
+.plots canvas { border: 1px solid #ccc; margin: 4px; }
+#controls button { margin-right: 4px; }
+</style>
+</head>
+<body>
+<h3 id="title">Chemingon</h3>
+<div id="controls">
+  <button onclick="control('start')">Start</button>
+  <button onclick="control('pause')">Pause</button>
+  <button onclick="control('resume')">Resume</button>
+  <button onclick="if (confirm('Force stop the experiment?')) control('stop')">Force stop</button>
+  <label><input type="checkbox" id="dry_run"> Dry run</label>
+  <label><input type="checkbox" id="stop_all"> Stop all upon error</label>
+  <span id="status"></span>
+</div>
+<h4>Protocols</h4><div id="protocol_summary"></div><table id="protocols"></table>
+<h4>Instruments</h4><div id="device_summary"></div><table id="devices"></table>
+<h4>Sensors</h4><div class="plots" id="plots"></div>
+<script>
+const MAX_ROWS = 50;
+const TOKEN = '__DASHBOARD_TOKEN__';
+let state = {experiment: {}, protocol: {}, device: {}, sensor: {}};
+let sensors = {}, series = {}, dirty = false, connection = 'connecting';
+
+function control(action) {
+  fetch('/control', {method: 'POST', headers: {'Content-Type': 'application/json', 'X-Dashboard-Token': TOKEN},
+    body: JSON.stringify({action: action,
+    dry_run: document.getElementById('dry_run').checked, stop_all: document.getElementById('stop_all').checked})})
+    .then(r => { if (!r.ok) alert(action + ' not possible now'); });
+}
+
+function apply(entries) {
+  for (const e of entries) {
+    const kind = state[e.kind] || (state[e.kind] = {});
+    const key = e.key === null ? '' : e.key;
+    if (e.fields === null) delete kind[key];
+    else kind[key] = Object.assign(kind[key] || {}, e.fields);
+  }
+}
+
+function append(newSeries) {
+  for (const [name, values] of Object.entries(newSeries)) {
+    const s = series[name] || (series[name] = {time: []});
+    for (const [channel, points] of Object.entries(values)) {
+      s[channel] = (s[channel] || []).concat(points);
+    }
+    const window = sensors[name] ? sensors[name].window : 60;
+    const last = s.time.length ? s.time[s.time.length - 1] : 0;
+    let drop = 0;
+    while (drop < s.time.length && s.time[drop] < last - window) drop++;
+    if (drop) for (const channel in s) s[channel] = s[channel].slice(drop);
+  }
+}
+
+function connect() {
+  const ws = new WebSocket('ws://' + location.host + '/ws?token=' + TOKEN);
+  ws.onmessage = (event) => {
+    const msg = JSON.parse(event.data);
+    if (msg.type === 'snapshot') {
+      state = {experiment: {}, protocol: {}, device: {}, sensor: {}};
+      sensors = msg.sensors; series = {};
+    }
+    apply(msg.entries);
+    append(msg.series);
+    connection = 'connected';
+    if (!dirty) { dirty = true; requestAnimationFrame(render); }
+  };
+  ws.onclose = () => { connection = 'disconnected'; render(); setTimeout(connect, 2000); };
+}
+
+function status(p) {
+  const exp = state.experiment[''] || {};
+  if (p.finished) return 'finished';
+  if (exp.error_protocol != null && String(exp.error_protocol) === String(p.uid)) return 'error';
+  if (p.progress > 0) return 'running';
+  return 'waiting';
+}
+
+function cell(text) { const td = document.createElement('td'); td.textContent = text; return td; }
+
+function render() {
+  dirty = false;
+  const exp = state.experiment[''] || {};
+  document.getElementById('title').textContent = exp.name || 'Chemingon';
+  let text = exp.finished ? 'Finished' : exp.paused ? 'Paused' : exp.running ? 'Running' : 'Ready';
+  if (exp.error) text += ' - error: ' + exp.error;
+  document.getElementById('status').textContent = text + ' (' + connection + ')';
+
+  const protocols = [], counts = {running: 0, finished: 0, error: 0, waiting: 0};
+  for (const [uid, p] of Object.entries(state.protocol)) {
+    if (!p.top) continue;
+    p.uid = uid; p.status = status(p); counts[p.status]++;
+    protocols.push(p);
+  }
+  const order = {error: 0, running: 1, waiting: 2, finished: 3};
+  protocols.sort((a, b) => order[a.status] - order[b.status] || a.uid - b.uid);
+  document.getElementById('protocol_summary').textContent = protocols.length + ' protocols: ' + counts.running +
+    ' running, ' + counts.finished + ' finished, ' + counts.error + ' stopped by error, ' + counts.waiting + ' waiting';
+  const table = document.getElementById('protocols');
+  table.replaceChildren();
+  for (const p of protocols.slice(0, MAX_ROWS)) {
+    const tr = document.createElement('tr');
+    if (p.status === 'error') tr.className = 'error';
+    const bar = document.createElement('progress');
+    bar.max = Math.max(1, p.total); bar.value = p.progress;
+    const td = document.createElement('td'); td.appendChild(bar);
+    tr.append(cell(p.channel), cell(p.name), td, cell(p.progress + '/' + p.total),
+              cell(p.current_description || ''), cell(p.current_op || ''));
+    table.appendChild(tr);
+  }
+
+  const devices = document.getElementById('devices');
+  devices.replaceChildren();
+  let connected = 0, busy = 0, n = 0;
+  for (const [name, d] of Object.entries(state.device)) {
+    n++; connected += d.is_connected ? 1 : 0;
+    const active = d.current_op && d.current_op !== 'Inactive';
+    busy += active ? 1 : 0;
+    if (n > MAX_ROWS) continue;
+    const tr = document.createElement('tr');
+    tr.append(cell(name + (d.public ? ' (public)' : '')), cell(d.port || ''),
+              cell(d.is_connected ? 'connected' : 'disconnected'), cell(d.current_op || ''),
+              cell(d.description_display || ''));
+    devices.appendChild(tr);
+  }
+  document.getElementById('device_summary').textContent =
+    n + ' devices: ' + connected + ' connected, ' + busy + ' busy';
+
+  const plots = document.getElementById('plots');
+  for (const [name, info] of Object.entries(sensors)) {
+    for (const channel of info.channels) {
+      const id = 'plot:' + name + ':' + channel;
+      let canvas = document.getElementById(id);
+      if (!canvas) {
+        canvas = document.createElement('canvas');
+        canvas.id = id; canvas.width = 300; canvas.height = 160;
+        plots.appendChild(canvas);
+      }
+      draw(canvas, name + ': ' + channel, (series[name] || {}).time || [], (series[name] || {})[channel] || []);
+    }
+  }
+}
+
+function draw(canvas, title, x, y) {
+  const ctx = canvas.getContext('2d'), w = canvas.width, h = canvas.height, pad = 24;
+  ctx.clearRect(0, 0, w, h);
+  ctx.fillStyle = '#000'; ctx.fillText(title, 4, 12);
+  const points = [];
+  for (let i = 0; i < x.length; i++) if (y[i] !== null) points.push([x[i], y[i]]);
+  if (!points.length) return;
+  let x0 = points[0][0], x1 = points[points.length - 1][0], y0 = Infinity, y1 = -Infinity;
+  for (const p of points) { y0 = Math.min(y0, p[1]); y1 = Math.max(y1, p[1]); }
+  if (x1 === x0) x1 = x0 + 1;
+  if (y1 === y0) { y0 -= 1; y1 += 1; }
+  ctx.fillText(y1.toPrecision(4), 4, pad); ctx.fillText(y0.toPrecision(4), 4, h - 4);
+  ctx.fillText(x1.toFixed(1) + ' s', w - 50, h - 4);
+  ctx.strokeStyle = '#1f77b4'; ctx.beginPath();
+  points.forEach((p, i) => {
+    const px = pad + (p[0] - x0) / (x1 - x0) * (w - 2 * pad), py = h - pad - (p[1] - y0) / (y1 - y0) * (h - 2 * pad);
+    if (i) ctx.lineTo(px, py); else ctx.moveTo(px, py);
+  });
+  ctx.stroke();
+}
+
+connect();
+</script>
+</body>
+</html>
+"""
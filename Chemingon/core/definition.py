@@ -0,0 +1,410 @@
+import gc
+import hashlib
+import inspect
+import json
+import os
+import pickle
+from typing import Union, Iterator
+
+from loguru import logger
+
+from ..components.registry import ComponentRegistry, registry as default_registry
+from ..components.stdlib import component
+from .apparatus import Apparatus
+from .operation import VirtualOperation
+from .protocol import Protocol
+
+FORMAT_VERSION = 2  # changes the cache key; increment when the compiled format changes
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'chemingon')
+
+
+class _Ref:
+    """Reference to the operation with the given id, in the kwargs of a compiled step"""
+    __slots__ = ('id',)
+
+    def __init__(self, op_id: str):
+        self.id = op_id
+
+    def __getstate__(self):
+        return self.id
+
+    def __setstate__(self, state):
+        self.id = state
+
+
+class ProtocolFile:
+    """
+    Protocols defined in a JSON, JSON lines or YAML file:
+
+        {"apparatus": "rig 1",
+         "experiment": {"channels": 2},
+         "components": [{"type": "ViciValve", "name": "valve", "port": "COM3", "valve_id": "1"}],
+         "definitions": {"wash": {"steps": [{"device": "valve", "command": "goto", "kwargs": {"pos": "A"}}]}},
+         "protocols": [
+             {"name": "run 1", "channel": 1, "steps": [
+                 {"device": "pump", "command": "infuse", "kwargs": {"volume": 1}, "wait": false, "id": "fill"},
+                 {"virtual": "wait_for_operation", "kwargs": {"op": {"$ref": "fill"}}},
+                 {"virtual": "delay", "kwargs": {"seconds": 10}, "description": "react"},
+                 {"use": "wash"},
+                 {"protocol": {"name": "sample", "block_public": true, "steps": [...]}},
+                 {"parallel": [{"name": "heat", "steps": [...]}, {"name": "stir", "steps": [...]}], "wait": "all"}
+             ]}]}
+
+    Devices are referred to by their name in the apparatus. "components" creates the devices missing from the
+    apparatus from their registered type name (see ComponentRegistry). "use" inserts a copy of a protocol of
+    "definitions" as a sub protocol. "$ref" refers to an operation with that "id" defined earlier in the same protocol
+    or in a protocol containing it. Protocols without "channel" are run by any free channel.
+    In a .jsonl file, the first line holds the other sections, and every following line is one protocol. Lines are
+    parsed one at a time.
+
+    The file is checked against the apparatus when loaded: devices, commands and their arguments. The result is a
+    compact list of steps, saved in cache_dir under the hash of the content of the file. Loading an unchanged file
+    reads this cache and skips parsing and validation, unless the devices or the signatures of the commands used
+    changed. Protocol objects are only built when they are asked for.
+    """
+
+    def __init__(self, path: str, apparatus: Apparatus = None, cache_dir: Union[None, str] = DEFAULT_CACHE_DIR,
+                 registry: ComponentRegistry = None, pause_gc: bool = False):
+        """
+        :param apparatus: apparatus of the devices; created from the "apparatus" name of the file if None
+        :param cache_dir: directory of the compiled files; no cache if None
+        :param registry: types of the "components"; the default registry if None
+        :param pause_gc: disable the garbage collector during the load, several times faster for large files; it is
+            disabled for the whole process, so only use it when no experiment, sensor or UI thread is running
+        """
+        self.path = path
+        self.apparatus = apparatus
+        self.cache_dir = cache_dir
+        self.registry = default_registry if registry is None else registry
+        self.header: dict = dict()
+        self.compiled: list[tuple] = []
+        self.cache_hit = False
+        self._devices: dict[str, component.Component] = dict()
+        self._signatures: dict[tuple, inspect.Signature] = dict()
+        self._checked: set[tuple] = set()  # (class, command, argument names) already validated
+        gc_enabled = pause_gc and gc.isenabled()
+        if gc_enabled:
+            gc.disable()
+        try:
+            self._load()
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    # reading
+
+    def _digest(self) -> str:
+        digest = hashlib.sha256(f'Chemingon protocol file {FORMAT_VERSION}\n'.encode())
+        with open(self.path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _read(self) -> tuple[dict, Iterator[dict]]:
+        """:return: the sections other than "protocols", and an iterator over the protocols"""
+        extension = os.path.splitext(self.path)[1].lower()
+        if extension == '.jsonl':
+            return self._read_lines()
+        with open(self.path) as f:
+            if extension in ('.yaml', '.yml'):
+                try:
+                    import yaml
+                except ImportError:
+                    raise ImportError(f'{self.path}: PyYAML is needed to read YAML files') from None
+                document = yaml.safe_load(f)
+            else:
+                document = json.load(f)
+        if not isinstance(document, dict):
+            raise ValueError(f'{self.path}: the file must contain an object with a "protocols" list')
+        protocols = document.pop('protocols', [])
+        return document, iter(protocols)
+
+    def _read_lines(self) -> tuple[dict, Iterator[dict]]:
+        f = open(self.path)
+        header = dict()
+        first = None
+        for line in f:
+            if line.strip():
+                first = json.loads(line)
+                break
+        if first is not None and 'steps' not in first:
+            header, first = first, None
+
+        def protocols():
+            with f:
+                if first is not None:
+                    yield first
+                for number, text in enumerate(f):
+                    if text.strip():
+                        try:
+                            yield json.loads(text)
+                        except ValueError as e:
+                            raise ValueError(f'{self.path}: line {number + 2}: {e}') from None
+        return header, protocols()
+
+    def _load(self):
+        digest = self._digest()
+        cache_file = None if self.cache_dir is None else os.path.join(self.cache_dir, f'{digest}.pickle')
+        cached = None
+        if cache_file is not None and os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'rb') as f:
+                    cached = pickle.load(f)
+            except Exception as e:
+                logger.debug(f'Compiled protocol file {cache_file} ignored: {e}')
+
+        if cached is not None:
+            self.header = cached['header']
+            self._set_up_apparatus()
+            if cached['signature'] == self._apparatus_signature() and \
+                    cached['commands'] == self._command_signatures(cached['commands']):
+                self.compiled = cached['protocols']
+                self.cache_hit = True
+                return
+
+        header, protocols = self._read()
+        if cached is None:
+            self.header = header
+            self._set_up_apparatus()
+        definitions = self.header.get('definitions', dict())
+        self.compiled = [self._compile_protocol(i, definitions, [dict()], f'protocol {idx + 1}', top=True)
+                         for idx, i in enumerate(protocols)]
+        if cache_file is not None:
+            self._save_cache(cache_file)
+
+    def _save_cache(self, cache_file: str):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_name = f'{cache_file}.{os.getpid()}.tmp'
+            with open(tmp_name, 'wb') as f:
+                pickle.dump({'header': self.header, 'signature': self._apparatus_signature(),
+                             'commands': self._command_signatures(self._signatures),
+                             'protocols': self.compiled}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_name, cache_file)
+        except (OSError, pickle.PicklingError) as e:
+            logger.warning(f'Compiled protocol file not saved in {self.cache_dir}: {e}')
+
+    # apparatus
+
+    def _set_up_apparatus(self):
+        if self.apparatus is None:
+            self.apparatus = Apparatus(self.header.get('apparatus', os.path.basename(self.path)))
+        self._devices = {i.name: i for i in self.apparatus.components}
+        for spec in self.header.get('components', []):
+            if spec.get('name') in self._devices:
+                continue
+            device = self.registry.build(spec)
+            self.apparatus.add_component(device)
+            self._devices[device.name] = device
+
+    def _apparatus_signature(self) -> tuple:
+        """Devices the compiled steps were checked against"""
+        return tuple(sorted((name, f'{type(device).__module__}.{type(device).__qualname__}')
+                            for name, device in self._devices.items()))
+
+    def _command_signatures(self, commands) -> dict[tuple[str, str], Union[None, str]]:
+        """
+        Signatures of the commands the compiled steps were checked against, so that a changed driver invalidates them
+        :param commands: (class or class name, command) pairs
+        :return: {(class name, command): signature, None if the class or the command no longer exists}
+        """
+        classes = {f'{i.__module__}.{i.__qualname__}': i
+                   for i in [type(j) for j in self._devices.values()] + [VirtualOperation]}
+        result = dict()
+        for cls, cmd in commands:
+            name = cls if isinstance(cls, str) else f'{cls.__module__}.{cls.__qualname__}'
+            try:
+                result[(name, cmd)] = str(inspect.signature(getattr(classes[name], cmd)))
+            except (KeyError, AttributeError, TypeError, ValueError):
+                result[(name, cmd)] = None
+        return result
+
+    # validation
+
+    def _check_arguments(self, cls: type, cmd: str, kwargs: dict, where: str):
+        if (cls, cmd, tuple(kwargs)) in self._checked:
+            return
+        key = (cls, cmd)
+        signature = self._signatures.get(key)
+        if signature is None:
+            try:
+                signature = self._signatures[key] = inspect.signature(getattr(cls, cmd))
+            except (TypeError, ValueError):
+                return
+        try:
+            # bound to the class, so self is the first parameter
+            signature.bind(None, **kwargs)
+        except TypeError as e:
+            raise ValueError(f'{where}: wrong arguments for {cmd}: {e}') from None
+        self._checked.add((cls, cmd, tuple(kwargs)))
+
+    @staticmethod
+    def _compile_kwargs(kwargs: dict, scopes: list[dict], where: str) -> dict:
+        if not isinstance(kwargs, dict):
+            raise ValueError(f'{where}: kwargs must be an object')
+        compiled = dict()
+        for name, value in kwargs.items():
+            if isinstance(value, dict) and set(value) == {'$ref'}:
+                if not any(value['$ref'] in i for i in scopes):
+                    raise ValueError(f'{where}: no operation with id {value["$ref"]} before this step')
+                value = _Ref(value['$ref'])
+            compiled[name] = value
+        return compiled
+
+    def _compile_protocol(self, spec: dict, definitions: dict, scopes: list[dict], where: str, top: bool = False,
+                          using: tuple = ()) -> tuple:
+        """
+        :return: (name, description, block_public, channel, steps), with the steps
+            ('op', device name, command, wait, description, kwargs, id)
+            ('virtual', command, description, kwargs, id)
+            ('sub', protocol)
+            ('parallel', wait, description, [protocol, ...])
+        """
+        if not isinstance(spec, dict) or 'name' not in spec:
+            raise ValueError(f'{where}: a protocol must be an object with a "name"')
+        where = f'{where} ({spec["name"]})'
+        channel = spec.get('channel')
+        if channel is not None and not top:
+            raise ValueError(f'{where}: only top level protocols have a channel')
+        scope = dict()
+        scopes = scopes + [scope]
+        steps = []
+        for idx, step in enumerate(spec.get('steps', [])):
+            step_where = f'{where} step {idx + 1}'
+            if not isinstance(step, dict):
+                raise ValueError(f'{step_where}: a step must be an object')
+            op_id = step.get('id')
+            if op_id is not None and op_id in scope:
+                raise ValueError(f'{step_where}: id {op_id} already used in this protocol')
+
+            if 'device' in step:
+                device = self._devices.get(step['device'])
+                if device is None:
+                    raise ValueError(f'{step_where}: no device {step["device"]} in {self.apparatus}')
+                cmd = step.get('command')
+                if not isinstance(cmd, str) or not callable(getattr(device, cmd, None)):
+                    raise ValueError(f'{step_where}: device {device} does not have command {cmd}')
+                kwargs = self._compile_kwargs(step.get('kwargs', dict()), scopes, step_where)
+                self._check_arguments(type(device), cmd, kwargs, step_where)
+                steps.append(('op', device.name, cmd, bool(step.get('wait', True)), step.get('description'),
+                              kwargs, op_id))
+            elif 'virtual' in step:
+                cmd = step['virtual']
+                if not isinstance(cmd, str) or cmd.startswith('_') or not callable(getattr(VirtualOperation, cmd,
+                                                                                            None)):
+                    raise ValueError(f'{step_where}: virtual operation {cmd} does not exist')
+                kwargs = self._compile_kwargs(step.get('kwargs', dict()), scopes, step_where)
+                self._check_arguments(VirtualOperation, cmd, kwargs, step_where)
+                steps.append(('virtual', cmd, step.get('description'), kwargs, op_id))
+            elif 'protocol' in step:
+                steps.append(('sub', self._compile_protocol(step['protocol'], definitions, scopes, step_where,
+                                                            using=using)))
+            elif 'use' in step:
+                name = step['use']
+                if name not in definitions:
+                    raise ValueError(f'{step_where}: no protocol {name} in "definitions"')
+                if name in using:
+                    raise ValueError(f'{step_where}: protocol {name} uses itself')
+                sub = dict(definitions[name])
+                sub.setdefault('name', name)
+                steps.append(('sub', self._compile_protocol(sub, definitions, [], f'definition {name}',
+                                                            using=using + (name,))))
+            elif 'parallel' in step:
+                wait = step.get('wait', 'all')
+                if wait not in ('all', 'any'):
+                    raise ValueError(f"{step_where}: wait must be 'all' or 'any', got {wait}")
+                branches = step['parallel']
+                if not isinstance(branches, list) or len(branches) == 0:
+                    raise ValueError(f'{step_where}: a parallel step needs a list of branches')
+                steps.append(('parallel', wait, step.get('description'),
+                              [self._compile_protocol(i, definitions, scopes, f'{step_where} branch {n + 1}',
+                                                      using=using)
+                               for n, i in enumerate(branches)]))
+            else:
+                raise ValueError(f'{step_where}: a step must have one of "device", "virtual", "protocol", "use" or '
+                                 f'"parallel"')
+            if op_id is not None:
+                if steps[-1][0] not in ('op', 'virtual'):
+                    raise ValueError(f'{step_where}: only operations can have an id')
+                scope[op_id] = True
+        return spec['name'], spec.get('description'), bool(spec.get('block_public', False)), channel, steps
+
+    # building
+
+    def _build(self, compiled: tuple, scopes: list[dict]) -> Protocol:
+        name, description, block_public, channel, steps = compiled
+        protocol = Protocol(self.apparatus, name, description=description, block_public=block_public)
+        scope = dict()
+        scopes = scopes + [scope]
+        for step in steps:
+            kind = step[0]
+            if kind == 'op':
+                _, device, cmd, wait, step_description, kwargs, op_id = step
+                op = protocol.quick_add(self._devices[device], cmd, wait=wait, description=step_description,
+                                        kwargs=self._resolve(kwargs, scopes))
+            elif kind == 'virtual':
+                _, cmd, step_description, kwargs, op_id = step
+                op = protocol.add_single_operation(VirtualOperation(cmd, kwargs=self._resolve(kwargs, scopes)),
+                                                   description=step_description)
+            elif kind == 'sub':
+                protocol.add_sub_protocol(self._build(step[1], scopes))
+                continue
+            else:
+                _, wait, step_description, branches = step
+                protocol.add_parallel([self._build(i, scopes) for i in branches], wait=wait,
+                                      description=step_description)
+                continue
+            if op_id is not None:
+                scope[op_id] = op
+        return protocol
+
+    @staticmethod
+    def _resolve(kwargs: dict, scopes: list[dict]) -> dict:
+        if not any(isinstance(i, _Ref) for i in kwargs.values()):
+            return kwargs
+        resolved = dict(kwargs)
+        for name, value in kwargs.items():
+            if isinstance(value, _Ref):
+                resolved[name] = next(i[value.id] for i in reversed(scopes) if value.id in i)
+        return resolved
+
+    def __len__(self):
+        return len(self.compiled)
+
+    def protocols(self, channel: Union[None, int, str] = 'all') -> Iterator[Protocol]:
+        """
+        Build the protocols one at a time
+        :param channel: only the protocols of this channel; None for those without channel, 'all' for all protocols
+        """
+        for compiled in self.compiled:
+            if channel == 'all' or compiled[3] == channel:
+                protocol = self._build(compiled, [])
+                protocol.channel = compiled[3]
+                yield protocol
+
+    def load(self) -> list[Protocol]:
+        return list(self.protocols())
+
+    def add_to(self, exp):
+        """
+        Add the protocols to an experiment: those with a channel to its queue, the others as a protocol source for any
+        free channel, so they are only built when a channel is ready to run them
+        """
+        for compiled in self.compiled:
+            if compiled[3] is not None:
+                protocol = self._build(compiled, [])
+                exp.add_protocol(protocol, compiled[3])
+        if any(i[3] is None for i in self.compiled):
+            exp.add_protocol_source(self.protocols(channel=None))
+
+    def experiment(self, **kwargs):
+        """
+        Experiment with the settings of the "experiment" section of the file, and the protocols of the file
+        :param kwargs: settings overriding those of the file, e.g. channels=4
+        """
+        from .experiment import Experiment
+        settings = dict(self.header.get('experiment', dict()))
+        settings.update(kwargs)
+        exp = Experiment(self.apparatus, **settings)
+        self.add_to(exp)
+        return exp
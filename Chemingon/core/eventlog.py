@@ -0,0 +1,159 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from threading import Thread, Event
+from typing import Union
+
+from loguru import logger
+
+LEVELS = {'TRACE': 5, 'DEBUG': 10, 'INFO': 20, 'SUCCESS': 25, 'WARNING': 30, 'ERROR': 40, 'CRITICAL': 50}
+LEVEL_NAMES = {no: name for name, no in LEVELS.items()}
+
+
+class EventLog:
+    """
+    Structured log of a run, written as JSON lines to events.jsonl in the experiment directory, one object per event:
+        {"time": ..., "level": "DEBUG", "experiment": ..., "channel": 1, "protocol": ..., "device": ..., "thread": ...,
+         "message": ...}
+    The calling thread only checks the level and appends the event to a queue: the message template ({} placeholders)
+    is formatted with its arguments, serialised and written by a background thread, at most `batch_size` events per
+    write, every `flush_interval` seconds or as soon as a batch is full. Device logs and the steps of the protocols
+    are logged here instead of the .log file; the other messages of loguru are copied here as well.
+    Events are dropped, and counted in `dropped`, when more than `max_pending` are waiting to be written.
+    """
+
+    def __init__(self, experiment: str = None, level: str = 'DEBUG', batch_size: int = 512,
+                 flush_interval: float = 0.5, max_pending: int = 100000):
+        self.experiment = experiment
+        self.levelno = LEVELS[level]
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.path: Union[None, str] = None
+        self._pending = deque()  # appended by any thread, consumed by the writer only
+        self._context = threading.local()  # channel and protocol of the operation executed by the thread
+        self._wake = Event()
+        self._stop = Event()
+        self._thread: Union[None, Thread] = None
+        self._file = None
+        self._sink_id: Union[None, int] = None
+
+    @property
+    def level(self) -> str:
+        return LEVEL_NAMES[self.levelno]
+
+    @level.setter
+    def level(self, value: str):
+        self.levelno = LEVELS[value]
+
+    def enabled(self, level: str) -> bool:
+        return LEVELS[level] >= self.levelno
+
+    def bind(self, channel: Union[None, int] = None, protocol: str = None):
+        """Set the channel and protocol of the events logged by this thread without them, e.g. by its devices"""
+        self._context.channel = channel
+        self._context.protocol = protocol
+
+    def log(self, level: str, message: str, *args, **fields):
+        """
+        :param message: template formatted with args by the writer thread, e.g. log('INFO', 'Set to {} bar', 2.5)
+        :param fields: other fields of the event: channel, protocol, device, ...
+        """
+        if LEVELS[level] >= self.levelno:
+            self._put(level, message, args, fields)
+
+    def debug(self, message: str, *args, **fields):
+        if self.levelno <= 10:
+            self._put('DEBUG', message, args, fields)
+
+    def info(self, message: str, *args, **fields):
+        if self.levelno <= 20:
+            self._put('INFO', message, args, fields)
+
+    def warning(self, message: str, *args, **fields):
+        if self.levelno <= 30:
+            self._put('WARNING', message, args, fields)
+
+    def error(self, message: str, *args, **fields):
+        if self.levelno <= 40:
+            self._put('ERROR', message, args, fields)
+
+    def _put(self, level: str, message: str, args: tuple, fields: dict, thread: str = None, t: float = None):
+        pending = self._pending
+        if len(pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        context = self._context
+        pending.append((time.time() if t is None else t, level, message, args, fields,
+                        threading.current_thread().name if thread is None else thread,
+                        getattr(context, 'channel', None), getattr(context, 'protocol', None)))
+        if len(pending) >= self.batch_size and not self._wake.is_set():
+            self._wake.set()
+
+    def _loguru_sink(self, message):
+        record = message.record
+        fields = {} if record['exception'] is None else {'exception': repr(record['exception'].value)}
+        self._put(record['level'].name, record['message'], (), fields, record['thread'].name,
+                  record['time'].timestamp())
+
+    def _format(self, event: tuple) -> str:
+        t, level, message, args, fields, thread, channel, protocol = event
+        if args:
+            try:
+                message = message.format(*args)
+            except (IndexError, KeyError, ValueError):
+                message = f'{message} {args}'
+        record = {'time': t, 'level': level, 'experiment': self.experiment,
+                  'channel': channel, 'protocol': protocol, 'device': None, 'thread': thread, 'message': message}
+        record.update(fields)
+        return json.dumps(record, default=str) + '\n'
+
+    def start(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = f'{directory}/events.jsonl'
+        self._file = open(self.path, 'a')
+        self._stop.clear()
+        self._thread = Thread(target=self._write_loop, name='Event log', daemon=True)
+        self._thread.start()
+        self._sink_id = logger.add(self._loguru_sink, level=self.levelno, format='{message}')
+
+    def stop(self):
+        """Write the pending events and close the file"""
+        if self._sink_id is not None:
+            logger.remove(self._sink_id)
+            self._sink_id = None
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.dropped:
+            logger.warning(f'Event log: {self.dropped} events dropped')
+
+    @logger.catch()
+    def _write_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        pending = self._pending
+        while pending:
+            lines = []
+            for _ in range(min(len(pending), self.batch_size)):
+                lines.append(self._format(pending.popleft()))
+            self._file.write(''.join(lines))
+            self.written += len(lines)
+            self.batches += 1
+        self._file.flush()
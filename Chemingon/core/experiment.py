@@ -2,33 +2,47 @@ import math
 import threading
 import time
 import warnings
-from queue import Queue
-from threading import Thread
-from typing import Union
-
-import bqplot.figure
-import bqplot.pyplot as plt
-# import sys
-import ipywidgets as widgets
-import numpy as np
-import pandas as pd
-from IPython.display import display
+from queue import Queue, Empty
+from threading import Thread, Event, Lock
+from typing import Union, Iterable, Iterator
+
 from loguru import logger
 
 from ..components.stdlib.component import Component
 from ..components.stdlib.sensor import Sensor
 from .apparatus import Apparatus
-from .operation import Operation, VirtualOperation, PublicBlocker, VirtualDevice
-from .protocol import Protocol
+from .operation import Operation, VirtualOperation, PublicBlocker
+from .protocol import Protocol, ParallelBlock
 from .errors import ExperimentError, ErrorInfo, ErrorHandler
-
-
-# from IPython import get_ipython
+from .reservation import ResourceManager
+from .scheduling import QueuePolicy, PendingTask
+from .tracing import Tracer
+from .hooks import HookRegistry
+from .metrics import ExperimentMetrics
+from .memory import MemoryWatchdog
+from .profiler import SamplingProfiler
+from .cputime import CpuTimeAccount
+from .state import StateStore
+from .dashboard import Dashboard
+from .eventlog import EventLog
+
+
+def __getattr__(name):
+    if name == 'JupyterUI':
+        from .jupyter import JupyterUI
+        return JupyterUI
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 class Experiment:
+    # published to the state store whenever they are assigned
+    STATE_FIELDS = ('is_running', 'finished', 'error_quit', 'error_detail', '_pause', 'timer_start')
+
     def __init__(self, apparatus: Apparatus, channels: int = 1, keep_running: bool = False, name: str = 'Experiment',
                  save_interval: int = 1, err_handler: ErrorHandler = ErrorHandler()):
+        # versioned state of the experiment, protocols, devices and sensors for user interfaces
+        self.state = StateStore()
+        self.protocols_done = 0  # top level protocols finished
         self.name = name
         self.thread_list: list[Thread] = []
         self.public_thread_list: list[Thread] = []
@@ -52,18 +66,166 @@ class Experiment:
         self.is_running = False
         self.finished = False
         self.timer_start = None
-        self.pause: bool = False
+        self._pause: bool = False
         self.pause_ready: int = 0
         self.live_protocol: set[Protocol] = set()
+        self.resource_manager = ResourceManager()  # atomic reservation of public components for block_public
+        self.queue_policies: dict[Component, QueuePolicy] = dict()  # FIFO for public devices not in here
+        self.public_pending: dict[Component, list[PendingTask]] = dict()  # tasks taken from the queue, not started
+        self.tracer = Tracer(enabled=False)  # see enable_tracing(); also the clock of queue waits
+        self.hooks = HookRegistry()  # instrumentation callbacks, see HookRegistry.EVENTS
+        self.metrics: Union[None, ExperimentMetrics] = None  # see enable_metrics()
+        self.memory_watchdog: Union[None, MemoryWatchdog] = None  # see enable_memory_watchdog()
+        self.profiler: Union[None, SamplingProfiler] = None  # see enable_profiler()
+        self.supervisor_ident: Union[None, int] = None  # thread running start_master_operators
+        self.cpu_time = CpuTimeAccount()  # CPU time by channel, device, sensor and thread, summarised after a run
+        self.dashboard: Union[None, Dashboard] = None  # see start_dashboard()
+        self.event_log: Union[None, EventLog] = None  # see enable_event_log()
 
         self.directory = None
 
+        # lazily generated protocols (e.g. ParameterSweep); [iterator, channel or None for any channel]
+        self._protocol_sources: list[list[Union[Iterator[Protocol], int, None]]] = []
+        self._source_lock = Lock()
+
         for i in range(0, channels):
             self.channel_queue.append(Queue())
         # jobs in different channels are done in parallel, and jobs in the same channel are done sequentially
+        self._attach_state()
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in Experiment.STATE_FIELDS and 'state' in self.__dict__:
+            self._publish_experiment()
+
+    def _publish_experiment(self):
+        error = self.__dict__.get('error_detail')
+        self.state.publish('experiment', None, {
+            'name': self.name, 'channels': self.__dict__.get('channels'),
+            'running': self.__dict__.get('is_running', False), 'finished': self.__dict__.get('finished', False),
+            'paused': self.__dict__.get('_pause', False), 'error_quit': self.__dict__.get('error_quit', False),
+            'error': None if error is None else str(error.error),
+            'error_protocol': None if error is None or error.protocol is None else error.protocol.uid,
+            'timer_start': self.__dict__.get('timer_start'), 'protocols_done': self.protocols_done})
+
+    def _attach_state(self):
+        """Make the components publish their state to the state store of this experiment"""
+        for device in self.apparatus.components | self.apparatus.sensors:
+            device.state_store = self.state
+            self.state.publish('device', device.name, {
+                'port': device.get_port, 'is_connected': device.is_connected, 'current_op': device.current_op,
+                'description_display': device.description_display, 'public': device.is_public})
+
+    def _attach_protocol(self, protocol: Protocol):
+        protocol.state_store = self.state
+        self.state.publish('protocol', protocol.uid, protocol.state())
+
+    def _forget_protocol(self, protocol: Protocol):
+        """Drop a protocol generated by a source, with its sub protocols, from the state store"""
+        self.state.remove('protocol', protocol.uid)
+        for task in protocol.procedures:
+            if isinstance(task, Protocol):
+                self._forget_protocol(task)
+            elif isinstance(task, ParallelBlock):
+                for i in task.branches:
+                    self._forget_protocol(i)
+
+    @property
+    def pause(self) -> bool:
+        return self._pause
+
+    @pause.setter
+    def pause(self, value: bool):
+        changed = value != self._pause
+        self._pause = value
+        if changed and self.hooks.active:
+            self.hooks.emit('pause', paused=value)
+
+    def enable_metrics(self, port: Union[int, None] = 9108, snapshot_interval: Union[float, None] = 10.0) \
+            -> ExperimentMetrics:
+        """
+        Keep live metrics of the experiment, served in the Prometheus text format on http://127.0.0.1:<port>/metrics
+        while running and saved to metrics.prom in the experiment directory;
+        :param port: port of the local HTTP endpoint; no endpoint if None, a free port if 0
+        :param snapshot_interval: seconds between snapshot files; only saved at the end if None
+        """
+        if self.metrics is None:
+            self.metrics = ExperimentMetrics(self, port=port, snapshot_interval=snapshot_interval)
+        return self.metrics
+
+    def enable_tracing(self, max_events: int = 100000) -> Tracer:
+        """
+        Record the spans of protocols, operations and queue waits, saved as a Chrome trace at the end of a run
+        :param max_events: spans kept in memory, the oldest are dropped
+        """
+        self.tracer.max_events = max_events
+        self.tracer.enabled = True
+        return self.tracer
+
+    def enable_memory_watchdog(self, interval: float = 600.0, threshold_mb_per_hour: float = 100.0,
+                               top: int = 15) -> MemoryWatchdog:
+        """
+        Take tracemalloc snapshots while running and write memory_report.txt in the experiment directory, with the
+        growth by Chemingon module and object type; a warning is logged when memory grows faster than the threshold
+        :param interval: seconds between snapshots
+        :param threshold_mb_per_hour: growth of traced memory considered a leak
+        :param top: number of modules and object types in the report
+        """
+        if self.memory_watchdog is None:
+            self.memory_watchdog = MemoryWatchdog(interval=interval, threshold_mb_per_hour=threshold_mb_per_hour,
+                                                  top=top)
+        return self.memory_watchdog
+
+    def enable_profiler(self, interval: float = 0.05, per_thread: bool = False) -> SamplingProfiler:
+        """
+        Sample the stacks of all threads while running; profile.folded (collapsed stacks for flamegraphs) and
+        profile_summary.txt are saved in the experiment directory at the end.
+        The profiler can also be started and stopped during a run with exp.profiler.start() / stop()
+        :param interval: seconds between samples
+        :param per_thread: keep the thread names in the stacks, not only their roles
+        """
+        if self.profiler is None:
+            self.profiler = SamplingProfiler(self, interval=interval, per_thread=per_thread)
+        return self.profiler
+
+    def enable_event_log(self, level: str = 'DEBUG', batch_size: int = 512, flush_interval: float = 0.5) \
+            -> EventLog:
+        """
+        Log the run as JSON events to events.jsonl in the experiment directory, written by a background thread;
+        device logs and protocol steps are only formatted by that thread, and only if `level` is logged
+        :param level: lowest level logged, e.g. 'INFO' to skip the device logs
+        :param batch_size: events per write
+        :param flush_interval: seconds between writes
+        """
+        if self.event_log is None:
+            self.event_log = EventLog(self.name, level=level, batch_size=batch_size, flush_interval=flush_interval)
+        return self.event_log
+
+    def _attach_event_log(self, event_log: Union[None, EventLog]):
+        for device in self.apparatus.components | self.apparatus.sensors | {self.apparatus.virtual_device}:
+            device.event_log = event_log
+
+    def _log(self, level: str, message: str, *args, protocol: Protocol = None, device: Component = None):
+        """
+        Log a step of the execution to the event log if enabled, else to loguru;
+        :param message: template formatted with args ({} placeholders) only if the level is logged
+        """
+        if self.event_log is not None:
+            self.event_log.log(level, message, *args, channel=None if protocol is None else protocol.channel,
+                               protocol=None if protocol is None else protocol.name,
+                               device=None if device is None else device.name)
+        else:
+            logger.log(level, message, *args)
 
     @logger.catch()
     def _execute_operation(self, op: Operation, protocol: Protocol, dry_run: bool):
+        start = self.tracer.now()
+        cpu_start = self.cpu_time.now()
+        outcome = 'done'
+        if self.event_log is not None:
+            self.event_log.bind(protocol.channel, protocol.name)
+        if self.hooks.active:
+            self.hooks.emit('operation_start', op=op, protocol=protocol)
         try:
             if isinstance(op, Operation):
                 if not hasattr(op.device, op.command):
@@ -72,16 +234,19 @@ class Experiment:
                 attr = getattr(op.device, op.command)
 
                 if not dry_run:
-                    logger.info(f"Device {op.device} executing {op.command} with arguments {op.kwargs}; "
-                                f"Description: {op.description}")
+                    self._log('INFO', 'Device {} executing {} with arguments {}; Description: {}', op.device,
+                              op.command, op.kwargs, op.description, protocol=protocol, device=op.device)
                     # execute the command
                     attr(**op.kwargs)
                 else:
-                    logger.info(
-                        f"DRY RUN; Description: {op.description}; Device {op.device} execute {op.command}")
+                    self._log('INFO', 'DRY RUN; Description: {}; Device {} execute {}', op.description, op.device,
+                              op.command, protocol=protocol, device=op.device)
                     print(f"Description: {op.description}; Public device {op.device} execute {op.command}\n")
 
                 op.is_done = True
+                state = op.device.state_after(op.command, op.kwargs)
+                if state is not None:
+                    op.device.last_setup_state = state
 
             elif isinstance(op, VirtualOperation):
                 if not hasattr(op, op.cmd):
@@ -94,27 +259,84 @@ class Experiment:
 
         except Exception as e:
             # self.error_queue.put((protocol, e))
+            outcome = f'error: {e}'
             err = ErrorInfo(e, protocol, True, device=op.device)
             self.error_queue.put(err)
             raise e
+        finally:
+            if self.event_log is not None:
+                self.event_log.bind()
+            cpu = self.cpu_time.now() - cpu_start
+            self.cpu_time.add('device', op.device.name if isinstance(op, Operation) else 'virtual', cpu)
+            self.cpu_time.add('channel', 'supervisor' if protocol.channel is None else protocol.channel, cpu)
+            if self.tracer.enabled:
+                self._trace_operation(op, protocol, start, outcome)
+            if self.hooks.active:
+                self.hooks.emit('operation_end', op=op, protocol=protocol, outcome=outcome,
+                                duration=self.tracer.now() - start)
+
+    def _trace_operation(self, op: Union[Operation, VirtualOperation], protocol: Protocol, start: float,
+                         outcome: str):
+        end = self.tracer.now()
+        is_virtual = isinstance(op, VirtualOperation)
+        device_name = 'virtual' if is_virtual else op.device.name
+        args = {'device': device_name, 'channel': protocol.channel, 'protocol': protocol.name, 'outcome': outcome}
+        enqueue_time = getattr(op, 'enqueue_time', None)
+        if enqueue_time is not None:
+            args['queue_wait_ms'] = (start - enqueue_time) * 1e3
+            self.tracer.async_span(f'queue {device_name}', 'queue', enqueue_time, start,
+                                   {'channel': protocol.channel, 'protocol': protocol.name, 'command': op.command})
+        self.tracer.complete(f'{device_name}: {op.command}', 'virtual' if is_virtual else 'operation', start, end,
+                             args)
+
+    def set_queue_policy(self, policy: QueuePolicy, devices: Union[Component, list[Component], None] = None):
+        """
+        Set the policy deciding the order in which public devices execute their pending operations;
+        :param policy: e.g. SetupAwarePolicy(window=8)
+        :param devices: public devices to apply the policy to; all public devices if None
+        """
+        if devices is None:
+            devices = list(self.apparatus.publicComponents)
+        elif isinstance(devices, Component):
+            devices = [devices]
+        for device in devices:
+            assert device.is_public, f"Device {device} is not public"
+            self.queue_policies[device] = policy
+
+    def _next_public_task(self, device: Component, pending: list[PendingTask]) -> Union[PendingTask, None]:
+        while not device.taskQueue.empty():
+            task, protocol = device.taskQueue.get()
+            pending.append(PendingTask(task, protocol))
+        if not pending:
+            return None
+        policy = self.queue_policies.get(device)
+        idx = 0 if policy is None else policy.select(device, pending)
+        return pending.pop(idx)
 
     @logger.catch()
     def public_operator(self, device: Component, dry_run: bool = False):
         time.sleep(0.5)
 
+        pending: list[PendingTask] = []
+        self.public_pending[device] = pending
         while not self.error_quit:
             time.sleep(0.1)
-            if not device.taskQueue.empty():
-                task, protocol = device.taskQueue.get(timeout=2)
+            next_task = self._next_public_task(device, pending)
+            if next_task is not None:
+                task, protocol = next_task.task, next_task.protocol
+                if self.hooks.active:
+                    self.hooks.emit('public_dispatch', device=device, task=task, protocol=protocol)
                 if isinstance(task, PublicBlocker):
                     blocker: PublicBlocker = task
                     blocker.block_ready = True
-                    device.log(f'Occupied by protocol {protocol.name}')
+                    device.log('Occupied by protocol {}', protocol.name)
                     while blocker.block_request and not self.error_quit:
                         device.current_op = f'Occupied by protocol {protocol.name}'
                         if not blocker.taskQueue.empty():
                             try:
                                 task, protocol = blocker.taskQueue.get(timeout=2)
+                                if self.hooks.active:
+                                    self.hooks.emit('public_dispatch', device=device, task=task, protocol=protocol)
                                 op: Union[Operation, VirtualOperation] = task
                                 protocol: Protocol
                                 if isinstance(op, Operation):
@@ -151,6 +373,64 @@ class Experiment:
         assert 1 <= channel <= self.channels, f"Channel out of range. Only {self.channels} available"
         self.channel_queue[channel - 1].put(protocol)
         self.protocol_list.append(protocol)
+        protocol.channel = channel
+        self._attach_protocol(protocol)
+        self.state.publish('protocol', protocol.uid, {'top': True})
+
+    def add_protocol_source(self, source: Iterable[Protocol], channel: int = None):
+        """
+        Add protocols generated on demand, e.g. a ParameterSweep or a Campaign. A protocol is only created when a
+        channel is free and its queue is empty, and is dropped once done (not kept in protocol_list).
+        :param source: iterable of Protocol
+        :param channel: channel taking protocols from the source; any free channel if None
+        """
+        assert channel is None or 1 <= channel <= self.channels, \
+            f"Channel out of range. Only {self.channels} available"
+        with self._source_lock:
+            self._protocol_sources.append([iter(source), channel])
+
+    def _pull_source(self, channel: int) -> Union[Protocol, None]:
+        with self._source_lock:
+            for source in list(self._protocol_sources):
+                if source[1] is not None and source[1] != channel:
+                    continue
+                try:
+                    protocol = next(source[0])
+                    if protocol is not None:
+                        return protocol
+                except StopIteration:
+                    self._protocol_sources.remove(source)
+                except Exception as e:
+                    self._protocol_sources.remove(source)
+                    err = ErrorInfo(e, None, True)
+                    self.error_queue.put(err)
+        return None
+
+    def _next_protocol(self, channel: int) -> Union[Protocol, None]:
+        """
+        Next protocol for the channel: queued protocols first, then the protocol sources;
+        None if there is nothing left and the experiment is not kept running.
+        A source may yield None when it has nothing ready yet (e.g. a Campaign waiting for suggestions).
+        """
+        q = self.channel_queue[channel - 1]
+        while True:
+            if not q.empty():
+                return q.get()
+            protocol = self._pull_source(channel)
+            if protocol is not None:
+                return protocol
+            with self._source_lock:
+                pending = [i for i in self._protocol_sources if i[1] is None or i[1] == channel]
+            if len(pending) == 0:
+                if not self.keep_running:
+                    return None
+                return q.get()
+            if self.error_quit:
+                return None
+            try:
+                return q.get(timeout=0.1)
+            except Empty:
+                pass
 
     def initiation_protocol(self, protocol: Protocol):
         assert isinstance(protocol, Protocol)
@@ -164,7 +444,14 @@ class Experiment:
     def _sensor_monitor(self, sensor: Sensor):
         while not sensor.stop:
             try:
-                sensor.update()
+                cpu_start = self.cpu_time.now()
+                if self.hooks.active:
+                    update_start = time.perf_counter()
+                    sensor.update()
+                    self.hooks.emit('sensor_sample', sensor=sensor, duration=time.perf_counter() - update_start)
+                else:
+                    sensor.update()
+                self.cpu_time.add('sensor', sensor.name, self.cpu_time.now() - cpu_start)
                 time.sleep(sensor.interval)
             except Exception as e:
                 err = ErrorInfo(e, None, device=sensor)
@@ -172,9 +459,17 @@ class Experiment:
                 time.sleep(int(1/sensor.freq) + 1)
             self._pause_handler()
 
+    def _thread_cpu(self, target, *args):
+        """Target of the threads of the experiment; adds the CPU time of the whole thread to cpu_time"""
+        cpu_start = self.cpu_time.now()
+        try:
+            target(*args)
+        finally:
+            self.cpu_time.add('thread', threading.current_thread().name, self.cpu_time.now() - cpu_start)
+
     def start_sensor_thread(self, sensor: Sensor):
         sensor.save_start_time(self.timer_start, self.directory)
-        tmp = Thread(target=self._sensor_monitor, args=(sensor, ))
+        tmp = Thread(target=self._thread_cpu, args=(self._sensor_monitor, sensor), name=f'Sensor {sensor.name}')
         self.sensor_thread_list.append(tmp)
         tmp.start()
 
@@ -219,15 +514,41 @@ class Experiment:
 
     @logger.catch()
     def master_operator(self, channel: int, dry_run: bool = False):
-        if self.keep_running:
-            while True:
-                protocol = self.channel_queue[channel - 1].get()
-                self._execute_protocol(protocol, dry_run=dry_run)
-
-        else:
-            while not self.channel_queue[channel - 1].empty():
-                protocol = self.channel_queue[channel - 1].get()
-                self._execute_protocol(protocol, dry_run=dry_run)
+        protocol = self._next_protocol(channel)
+        while protocol is not None:
+            protocol.channel = channel
+            self.state.publish('protocol', protocol.uid, {'top': True})
+            self._execute_protocol(protocol, dry_run=dry_run)
+            with self._source_lock:
+                self.protocols_done += 1
+            self._publish_experiment()
+            if protocol not in self.protocol_list:  # from a protocol source
+                self._forget_protocol(protocol)
+            protocol = self._next_protocol(channel)
+
+    def _save_cpu_summary(self):
+        wall_time = time.time() - self.timer_start
+        with open(f'{self.directory}/cpu_time.txt', 'w') as f:
+            f.write(self.cpu_time.summary(wall_time) + '\n')
+        summary = self.cpu_time.summary(wall_time, top=5)
+        logger.info(summary)
+        print(summary)
+
+    def lock_contention_report(self) -> str:
+        """Wait and hold times of the locks of the ports shared by several components, busiest ports first"""
+        port_locks = sorted(self.apparatus.port_locks, key=lambda x: -x.wait_time)
+        return '\n'.join(i.report() for i in port_locks) + '\n'
+
+    def _save_lock_report(self):
+        port_locks = self.apparatus.port_locks
+        if not port_locks:
+            return
+        with open(f'{self.directory}/lock_contention.txt', 'w') as f:
+            f.write(self.lock_contention_report())
+        for i in port_locks:
+            if i.contended > 0:
+                logger.info(f'Lock of port {i.port}: {i.contended}/{i.acquisitions} acquisitions contended, '
+                            f'waited {i.wait_time:.3f}s')
 
     @logger.catch()
     def force_stop_all(self, e: Exception):
@@ -237,35 +558,46 @@ class Experiment:
                 i.force_terminate_operation()
             except Exception as err:
                 warnings.warn(f'Error when terminating device {i.name}: {err}')
-        for i in self.apparatus.virtual_devices:
-            i: VirtualDevice
-            try:
-                i.force_terminate_operation()
-            except Exception as err:
-                warnings.warn(f'Error when terminating virtual device {i}: {err}')
+        self.apparatus.virtual_device.force_terminate_operation()
         time.sleep(1)
         logger.debug(f"Force stop all: {e}")
         print(f"Force stop all: {e}")
 
     def start_master_operators(self, dry_run: bool = False):
+        self._attach_state()
         self.is_running = True
+        self.supervisor_ident = threading.get_ident()
+        self.cpu_time.reset()
+        supervisor_cpu_start = self.cpu_time.now()
         self.timer_start = time.time()
         time_str = time.strftime('%d%h%y_%H%M%S', time.localtime(self.timer_start))
         self.directory = f'experiment_results/{self.name}_{time_str}'
 
         logger.add(f'{self.directory}/{self.name}_' + '{time}.log')
+        if self.event_log is not None:
+            self.event_log.start(self.directory)
+            self._attach_event_log(self.event_log)
         logger.info(f'Experiment started with dry run = {dry_run}')
+        self.tracer.reset()
+        self.resource_manager.reset()
+        for i in self.apparatus.port_locks:
+            i.reset()
+        if self.metrics is not None:
+            self.metrics.start(self.directory)
+        if self.memory_watchdog is not None:
+            self.memory_watchdog.start(self.directory)
+        if self.profiler is not None:
+            self.profiler.start(self.directory)
 
         if not dry_run:
             self._open_all_components()
 
         time.sleep(0.5)
 
-        start_threading_no = threading.active_count()
         public_list = self.apparatus.publicComponents
         self.public_thread_list: list[Thread] = []
         for i in public_list:
-            tmp = Thread(target=self.public_operator, args=(i, dry_run,))
+            tmp = Thread(target=self._thread_cpu, args=(self.public_operator, i, dry_run), name=f'Public {i.name}')
             tmp.setDaemon(True)
             tmp.start()
             self.public_thread_list.append(tmp)
@@ -274,8 +606,8 @@ class Experiment:
             self._execute_protocol(self._init_protocol, dry_run=dry_run)
 
         self.thread_list: list[Thread] = []
-        for i in range(0, self.channels):
-            tmp = Thread(target=self.master_operator, args=(i, dry_run,))
+        for i in range(1, self.channels + 1):
+            tmp = Thread(target=self._thread_cpu, args=(self.master_operator, i, dry_run), name=f'Channel {i}')
             tmp.setDaemon(True)
             tmp.start()
             self.thread_list.append(tmp)
@@ -297,6 +629,8 @@ class Experiment:
 
                 err: ErrorInfo = self.error_queue.get()
                 self.error_detail: ErrorInfo = err
+                if self.hooks.active:
+                    self.hooks.emit('error', error_info=err)
                 e = err.error
 
                 print(f"Error raised: {e}")
@@ -314,7 +648,7 @@ class Experiment:
                         while not all_ready:
                             time.sleep(0.1)
                             all_ready = True
-                            for i in self.live_protocol:
+                            for i in list(self.live_protocol):
                                 if not i.paused:
                                     all_ready = False
                         logger.debug(f'Paused')
@@ -327,7 +661,8 @@ class Experiment:
                 else:
                     self.force_stop_all(e)
 
-            if threading.active_count() <= start_threading_no:
+            # channel threads join their branches; other threads of the process (UI, dashboard clients) don't count
+            if not any(i.is_alive() for i in self.thread_list + self.public_thread_list):
                 break
 
         if (not self.error_quit) and (self._fini_protocol is not None):
@@ -352,6 +687,27 @@ class Experiment:
         for i in self.sensor_thread_list:
             i.join()
 
+        self.resource_manager.log_report()
+        self._save_lock_report()
+        self.cpu_time.add('thread', 'Supervisor', self.cpu_time.now() - supervisor_cpu_start)
+        self._save_cpu_summary()
+        if self.metrics is not None:
+            self.metrics.stop(self.directory)
+        if self.memory_watchdog is not None:
+            self.memory_watchdog.stop()
+            logger.info(f'Memory report saved in {self.directory}/memory_report.txt')
+        if self.profiler is not None:
+            profile_file = self.profiler.stop()
+            if profile_file is not None:
+                logger.info(f'Profile saved as {profile_file}')
+        trace_file = self.tracer.export(f'{self.directory}/{self.name}_{time_str}_trace.json')
+        if trace_file is not None:
+            logger.info(f'Trace saved as {trace_file}')
+        if self.event_log is not None:
+            logger.info(f'Events saved as {self.event_log.path}')
+            self._attach_event_log(None)
+            self.event_log.stop()
+
         self.is_running = False
         self.finished = True
         logger.info("End of experiment")
@@ -374,6 +730,7 @@ class Experiment:
     def _execute_error_protocol(self, protocol: Union[Protocol, None], dry_run: bool = False):
         if protocol is None:
             return
+        self._attach_protocol(protocol)
 
         try:
             logger.info(f'Error protocol {protocol.name}: started')
@@ -387,6 +744,19 @@ class Experiment:
                     self._execute_error_protocol(task, dry_run=dry_run)
                     protocol.current_op = None
                     protocol.current_description = protocol.description
+                elif isinstance(task, ParallelBlock):
+                    protocol.current_op = f'parallel: {task.name}'
+                    protocol.current_description = task.description
+                    logger.info(f'Error protocol {protocol.name} executing parallel block: {task.name}')
+                    # error protocols always wait for all branches
+                    branch_threads = [Thread(target=self._execute_error_protocol, args=(i, dry_run), daemon=True)
+                                      for i in task.branches]
+                    for i in branch_threads:
+                        i.start()
+                    for i in branch_threads:
+                        i.join()
+                    protocol.current_op = None
+                    protocol.current_description = protocol.description
                 else:
                     op: Operation = task
                     protocol.current_op = f'{op.device.name}: {op.command}'
@@ -406,43 +776,85 @@ class Experiment:
         print(f'Error protocol {protocol.name}: finished')
 
     @logger.catch()
-    def _execute_protocol(self, protocol: Union[Protocol, None], dry_run: bool = False):
+    def _execute_protocol(self, protocol: Union[Protocol, None], dry_run: bool = False,
+                          parent_blockers: dict[Component, PublicBlocker] = None, cancel: Event = None):
         if protocol is None:
             return
+        self._attach_protocol(protocol)
+        protocol.start_time = time.time()
+        trace_start = self.tracer.now()
+        if self.hooks.active:
+            self.hooks.emit('protocol_start', protocol=protocol)
         self.live_protocol.add(protocol)
+        # public devices already blocked by a parent protocol stay routed through the parent's blockers
+        blocker_dict: dict[Component, PublicBlocker] = dict() if parent_blockers is None else dict(parent_blockers)
+        own_blockers: dict[Component, PublicBlocker] = dict()
+        detached: list[Thread] = []  # branches of 'any' parallel blocks still stopping, joined before the end
+        reservation = None
         try:
-            logger.info(f'Protocol {protocol.name}: started')
-            if protocol.block_public:
-                logger.info(f'Protocol {protocol.name}: blocking public components')
-                blocker_dict = {}
-                for device in protocol.public_set:
+            self._log('INFO', 'Protocol {}: started', protocol.name, protocol=protocol)
+            to_block = {i for i in protocol.public_set if i not in blocker_dict} if protocol.block_public else set()
+            if to_block:
+                self._log('INFO', 'Protocol {}: reserving public components', protocol.name, protocol=protocol)
+                reservation = self.resource_manager.request(protocol, to_block)
+                reserve_start = self.tracer.now()
+                while not self.resource_manager.acquire(reservation, timeout=0.1) and not self.error_quit:
+                    self._pause_handler(protocol)
+                self.tracer.complete('reserve public components', 'reservation', reserve_start, self.tracer.now(),
+                                     {'devices': [i.name for i in to_block], 'protocol': protocol.name})
+                self._log('INFO', 'Protocol {}: public components reserved after {:.3f}s; blocking public components',
+                          protocol.name, reservation.wait_time, protocol=protocol)
+
+                for device in to_block:
                     device: Component
                     tmp_blocker = PublicBlocker()
                     device.taskQueue.put((tmp_blocker, protocol))
-                    blocker_dict[device] = tmp_blocker
-
-                not_ready = True
-                while not_ready and not self.error_quit:
-                    not_ready = False
-                    for i in blocker_dict:
-                        if not blocker_dict[i].block_ready:
-                            not_ready = True
-                    time.sleep(0.1)
-                    self._pause_handler(protocol)
+                    own_blockers[device] = tmp_blocker
+                blocker_dict.update(own_blockers)
+
+                for i in own_blockers.values():
+                    while not i.wait_ready(timeout=0.1) and not self.error_quit:
+                        self._pause_handler(protocol)
                 self._pause_handler(protocol)
 
-                logger.info(f'Protocol {protocol.name}: public components ready')
+                self._log('INFO', 'Protocol {}: public components ready', protocol.name, protocol=protocol)
 
+            cancelled = False  # stopped before its last step by the cancel event of a 'any' parallel block
             for task in protocol.procedures:
+                if cancel is not None and cancel.is_set():
+                    cancelled = True
+                    break
                 protocol.progress += 1
 
                 try:
                     if isinstance(task, Protocol):
                         protocol.current_op = f'sub protocol: {task.name}'
                         protocol.current_description = task.description
-                        logger.info(f'protocol {protocol.name} executing sub protocol: {task.name}')
+                        self._log('INFO', 'protocol {} executing sub protocol: {}', protocol.name, task.name,
+                                  protocol=protocol)
+                        self.live_protocol.remove(protocol)
+                        task.channel = protocol.channel
+                        self._execute_protocol(task, dry_run=dry_run, parent_blockers=blocker_dict, cancel=cancel)
+                        self.live_protocol.add(protocol)
+                        cancelled = cancel is not None and cancel.is_set() and not task.finished
+                        protocol.current_op = None
+                        protocol.current_description = protocol.description
+                    elif isinstance(task, ParallelBlock):
+                        protocol.current_op = f'parallel: {task.name}'
+                        protocol.current_description = task.description
+                        self._log('INFO', 'protocol {} executing parallel block: {}', protocol.name, task.name,
+                                  protocol=protocol)
                         self.live_protocol.remove(protocol)
-                        self._execute_protocol(task, dry_run=dry_run)
+                        for i in task.branches:
+                            i.channel = protocol.channel
+                        parallel_start = self.tracer.now()
+                        detached += self._execute_parallel(task, dry_run=dry_run, parent_blockers=blocker_dict,
+                                                           cancel=cancel)
+                        done = [i.finished for i in task.branches]
+                        cancelled = cancel is not None and cancel.is_set() and \
+                            not (all(done) if task.wait == 'all' else any(done))
+                        self.tracer.complete(f'parallel: {task.name}', 'parallel', parallel_start, self.tracer.now(),
+                                             {'wait': task.wait, 'protocol': protocol.name})
                         self.live_protocol.add(protocol)
                         protocol.current_op = None
                         protocol.current_description = protocol.description
@@ -450,18 +862,25 @@ class Experiment:
                         op: Operation = task
                         protocol.current_op = f'{op.device.name}: {op.command}'
                         protocol.current_description = op.description
-                        logger.info(f'Protocol {protocol.name}: executing {op.command} on {op.device.name}')
+                        self._log('INFO', 'Protocol {}: executing {} on {}', protocol.name, op.command, op.device.name,
+                                  protocol=protocol, device=op.device)
                         if op.device.is_public:
-                            if not protocol.block_public:
+                            if op.device not in blocker_dict:
                                 q = op.device.taskQueue
                             else:
                                 q = blocker_dict[op.device].taskQueue
+                            op.enqueue_time = self.tracer.now()
+                            if self.hooks.active:
+                                self.hooks.emit('operation_enqueue', op=op, protocol=protocol, device=op.device)
                             q.put((op, protocol))
                             if op.wait:
                                 while not op.is_done and not self.error_quit:
                                     time.sleep(0.01)
                                     self._pause_handler(protocol)
                                     # wait until completed
+                                self.tracer.complete(f'wait {op.device.name}: {op.command}', 'wait',
+                                                     op.enqueue_time, self.tracer.now(),
+                                                     {'device': op.device.name, 'protocol': protocol.name})
                         else:
                             self._execute_operation(op, protocol, dry_run)
                         if self.error_quit:
@@ -474,14 +893,13 @@ class Experiment:
 
                 self._pause_handler(protocol)
 
-            if not self.error_quit:
-                protocol.finished = True
-            else:
+            if self.error_quit:
                 protocol.current_description = 'Stopped'
-
-            if protocol.block_public:
-                for device in protocol.public_set:
-                    blocker_dict[device].block_request = False
+            elif cancelled:
+                protocol.current_description = 'Cancelled'
+                self._log('INFO', 'Protocol {}: cancelled', protocol.name, protocol=protocol)
+            else:
+                protocol.finished = True
 
         except Exception as e:
             # self.error_queue.put((protocol, e))
@@ -489,486 +907,85 @@ class Experiment:
             self.error_queue.put(err)
             protocol.current_description = 'Error'
             # raise e
+        finally:
+            for i in detached:
+                i.join()
+            for blocker in own_blockers.values():
+                blocker.block_request = False
+            if reservation is not None:
+                self.resource_manager.release(reservation)
         self.live_protocol.remove(protocol)
-        logger.info(f'Protocol {protocol.name}: finished')
+        protocol.end_time = time.time()
+        outcome = 'finished' if protocol.finished else protocol.current_description
+        if self.tracer.enabled:
+            self.tracer.complete(f'protocol {protocol.name}', 'protocol', trace_start, self.tracer.now(),
+                                 {'channel': protocol.channel, 'block_public': protocol.block_public,
+                                  'outcome': outcome})
+        if self.hooks.active:
+            self.hooks.emit('protocol_end', protocol=protocol, outcome=outcome)
+        self._log('INFO', 'Protocol {}: finished', protocol.name, protocol=protocol)
+
+    def _execute_parallel(self, block: ParallelBlock, dry_run: bool = False,
+                          parent_blockers: dict[Component, PublicBlocker] = None,
+                          cancel: Event = None) -> list[Thread]:
+        """
+        Execute the branches of a parallel block in their own threads; with wait = 'all', return when they are all
+        finished; with wait = 'any', return as soon as one is finished, the others being cancelled at their next step
+        :return: threads of the cancelled branches still running, to be joined by the caller before it ends
+        """
+        done_queue: Queue[int] = Queue()
+        branch_cancel = [Event() for _ in block.branches]
+
+        def run_branch(idx: int):
+            try:
+                self._execute_protocol(block.branches[idx], dry_run=dry_run, parent_blockers=parent_blockers,
+                                       cancel=branch_cancel[idx])
+            finally:
+                done_queue.put(idx)
+
+        branch_threads = []
+        for idx, branch in enumerate(block.branches):
+            tmp = Thread(target=run_branch, args=(idx,), name=f'Branch {branch.name}')
+            tmp.daemon = True
+            tmp.start()
+            branch_threads.append(tmp)
+
+        remaining = len(branch_threads)
+        while remaining > 0:
+            try:
+                done_queue.get(timeout=0.1)
+                remaining -= 1
+                if block.wait == 'any':
+                    for i in branch_cancel:
+                        i.set()
+                    break
+            except Empty:
+                pass
+            if cancel is not None and cancel.is_set():
+                for i in branch_cancel:
+                    i.set()
+
+        if remaining == 0:
+            for i in branch_threads:
+                i.join()
+            return []
+        return [i for i in branch_threads if i.is_alive()]
 
     def start_jupyter_ui(self):
+        # ipywidgets and bqplot are only imported when a notebook interface is used
+        from .jupyter import JupyterUI
         ui = JupyterUI(self)
         ui.start_jupyter_ui()
 
+    def start_dashboard(self, port: int = 8765, host: str = '127.0.0.1', interval: float = 0.5) -> Dashboard:
+        """
+        Serve a web dashboard with the progress, devices and sensor plots, and the start, pause, resume and force stop
+        controls, on http://<host>:<port>/; it does not need Jupyter
+        :param port: a free port if 0
+        :param interval: minimum seconds between two updates sent to the page
+        """
+        if self.dashboard is None:
+            self.dashboard = Dashboard(self, port=port, host=host, interval=interval)
+        self.dashboard.start()
+        return self.dashboard
 
-class JupyterUI:
-    def __init__(self, exp: Experiment):
-        self.device_dict = None
-        self.devices_ui = None
-        self.channel_dict = None
-        self.exp_info_ui = None
-        self.exp_dict = None
-        self.exp_control_ui = None
-        self.exp = exp
-        self.sensor_panel = None
-        self.sensors_dict = None
-
-    def draw_exp_control(self):
-        def do_start_btn(btn):
-            if exp_dry_run.value:
-                exp_stop_all.value = True
-            self.exp.stop_all_upon_error = exp_stop_all.value
-            force_stop_btn.disabled = False
-            exp_status_label.description = 'Running'
-            btn.description = 'Running'
-            btn.disabled = True
-            btn.tooltip = 'Running'
-            btn.icon = 'hourglass'
-            thread = Thread(target=self.exp.start_master_operators, args=(exp_dry_run.value,))
-            thread.start()
-
-        def do_stop_btn(btn):
-            exp_status_label.description = 'Stopped'
-            exp_status_label.value = False
-            self.exp.stop_all_upon_error = exp_stop_all.value
-            err = ErrorInfo(ExperimentError('Force stop button'), None, True)
-            self.exp.error_queue.put(err)
-            # self.exp.error_queue.put((None, KeyboardInterrupt('Force stopped')))
-
-        def do_pause_btn(btn):
-            logger.debug('Pause button pressed')
-            if not self.exp.pause:
-                self.exp.pause = True
-
-        def do_resume_btn(btn):
-            logger.debug('Resume button pressed')
-            if self.exp.error_detail is None:
-                self.exp.pause = False
-
-        start_btn = widgets.Button(
-            description='Start',
-            disabled=False,
-            button_style='',  # 'success', 'info', 'warning', 'danger' or ''
-            tooltip='Start',
-            icon='play'  # (FontAwesome names without the `fa-` prefix)
-        )
-        start_btn.on_click(do_start_btn)
-
-        force_stop_btn = widgets.Button(
-            description='Force Stop',
-            disabled=True,
-            button_style='danger',  # 'success', 'info', 'warning', 'danger' or ''
-            tooltip='Force Stop',
-            icon='stop'  # (FontAwesome names without the `fa-` prefix)
-        )
-        force_stop_btn.on_click(do_stop_btn)
-
-        pause_btn = widgets.Button(
-            description='Pause',
-            disabled=True,
-            button_style='',
-            tooltip='Pause',
-            icon='pause-circle'
-        )
-        pause_btn.on_click(do_pause_btn)
-
-        resume_btn = widgets.Button(
-            description='Resume',
-            disabled=True,
-            button_style='',
-            tooltip='Resume',
-            icon='play-circle'
-        )
-        resume_btn.on_click(do_resume_btn)
-
-        # exp_status_label = widgets.Label(value="Status")
-        exp_status_label = widgets.Valid(
-            value=True,
-            description='Ready',
-        )
-
-        run_time_label = widgets.Label(value="00:00:00")
-
-        exp_control_main = widgets.HBox([start_btn, force_stop_btn, pause_btn, resume_btn, exp_status_label, run_time_label],
-                                        layout=widgets.Layout(flex_flow='row', display='flex', width='100%',
-                                                              justify_content='space-between'))
-        exp_control_title = widgets.HTML(
-            value="<h4><b>Experiment Control</b></h4>",
-        )
-
-        exp_dry_run = widgets.Checkbox(value=False, description='Dry run', indent=False,
-                                       layout=widgets.Layout(width='70px'))
-        exp_stop_all = widgets.Checkbox(value=False, description='Stop all upon error', indent=True,
-                                        layout=widgets.Layout(width='250px'))
-        exp_settings = widgets.HBox([exp_dry_run, exp_stop_all], layout=widgets.Layout(justify_content='flex-start'))
-        # exp_settings = widgets.HBox([exp_dry_run], layout=widgets.Layout(justify_content='flex-start'))
-
-        exp_control = widgets.VBox([exp_control_title, exp_control_main, exp_settings])
-        exp_dict = dict()  # update with this
-        exp_dict['start_btn'] = start_btn
-        exp_dict['force_stop'] = force_stop_btn
-        exp_dict['status'] = exp_status_label
-        exp_dict['run_time'] = run_time_label
-        exp_dict['dry_run'] = exp_dry_run
-        exp_dict['stop_all'] = exp_stop_all
-        exp_dict['pause_btn'] = pause_btn
-        exp_dict['resume_btn'] = resume_btn
-
-        self.exp_dict = exp_dict
-        self.exp_control_ui = exp_control
-
-    def draw_exp_info(self):
-        # Experiment info
-        exp_info_title = widgets.HTML(
-            value="<h4><b>Experiment Information</b></h4>",
-        )
-        channel_HBox_list = []
-        channel_dict = dict()  # update ui with this
-        for i in range(0, len(self.exp.protocol_list)):
-            protocol = self.exp.protocol_list[i]
-            channel_label = widgets.Label(value=protocol.name, layout=widgets.Layout(flex='0 0 auto'))
-            pg_bar = widgets.widgets.IntProgress(
-                value=0,
-                min=0,
-                max=len(protocol.procedures),
-                description='Ready',
-                bar_style='',  # 'success', 'info', 'warning', 'danger' or ''
-                # style={'bar_color': 'cyan'},
-                orientation='horizontal'
-            )
-            channel_description_box = widgets.Text(
-                value=protocol.description,
-                placeholder='No description',
-                description='Description:',
-                disabled=True
-            )
-            current_op = widgets.Text(
-                value='Inactive',
-                placeholder='Inactive',
-                description='Operation',
-                disabled=True,
-                layout={'overflow': 'scroll'}
-            )
-            channel_hb = widgets.HBox([channel_label, pg_bar, channel_description_box, current_op],
-                                      layout=widgets.Layout(flex_flow='row', display='flex', width='auto',
-                                                            justify_content='flex-start'))
-            channel_HBox_list.append(channel_hb)
-
-            single_channel_dict = dict()
-            single_channel_dict['label'] = channel_label
-            single_channel_dict['pg_bar'] = pg_bar
-            single_channel_dict['description'] = channel_description_box
-            single_channel_dict['op'] = current_op
-
-            channel_dict[protocol] = single_channel_dict
-
-        exp_info = widgets.VBox([exp_info_title] + channel_HBox_list)
-        self.exp_info_ui = exp_info
-        self.channel_dict = channel_dict
-
-    @staticmethod
-    def draw_single_device_mon(device: Component, operation=''):
-        name = device.name
-        port = device.get_port
-        connected = device.is_connected
-        description = device.description
-
-        device_name = widgets.Label(value=name, layout=widgets.Layout(height='auto', width='auto'))
-        device_port = widgets.Text(value=port, placeholder='Undefined', description='Port', disabled=True)
-        device_connected = widgets.Valid(
-            value=connected,
-            description='Disconnected',
-        )
-        device_description = widgets.Textarea(value=description, placeholder='None', disabled=True,
-                                              layout=widgets.Layout(height='30px', width='auto'))
-        device_operation = widgets.Text(value=operation, placeholder='Inactive', disabled=True,
-                                        layout=widgets.Layout(height='auto', width='auto'))
-        device_button_connect = widgets.Button(description='Wait', disabled=False, button_style='',
-                                               tooltip='Connect', icon='connect',
-                                               layout=widgets.Layout(width='auto'))
-        device_button_connect.on_click(device.btn_change_connection)
-        device_grid = widgets.GridspecLayout(2, 4, height='80px')
-
-        device_grid[:, 0] = device_name
-        device_grid[0, 1] = device_port
-        device_grid[0, 2] = device_connected
-        device_grid[0, 3] = device_button_connect
-        device_grid[1, 1:2] = device_description
-        device_grid[1, 2:4] = device_operation
-
-        tmp_single_device_dict = dict()
-        tmp_single_device_dict['name'] = device_name
-        tmp_single_device_dict['port'] = device_port
-        tmp_single_device_dict['connected'] = device_connected
-        tmp_single_device_dict['button_connect'] = device_button_connect
-        tmp_single_device_dict['description'] = device_description
-        tmp_single_device_dict['operation'] = device_operation
-
-        return device_grid, tmp_single_device_dict
-
-    def draw_device_ui(self):
-        instruments_info_title = widgets.HTML(
-            value="<h4><b>Instruments Information</b></h4>",
-        )
-
-        accordion_list = [None]
-        public_instrument_list = []
-        device_dict = dict()  # update ui with this
-        for protocol_i in self.exp.protocol_list:
-            instrument_list = []
-            for protocol_device in set(protocol_i.component_list):
-                if protocol_device not in device_dict:
-                    ui, single_device_dict = self.draw_single_device_mon(protocol_device)
-                    device_dict[protocol_device] = single_device_dict
-
-                    if protocol_device.is_public:
-                        public_instrument_list.append(ui)
-                    else:
-                        instrument_list.append(ui)
-            instrument_vbox = widgets.VBox(instrument_list)
-            accordion_list.append(instrument_vbox)
-        accordion_list[0] = widgets.VBox(public_instrument_list)
-        instrument_accordion = widgets.Accordion(accordion_list)
-        instrument_accordion.set_title(0, 'Public Devices')
-        for i in range(0, len(self.exp.protocol_list)):
-            instrument_accordion.set_title(i + 1, self.exp.protocol_list[i].name)
-
-        self.devices_ui = widgets.VBox([instruments_info_title, instrument_accordion])
-        self.device_dict = device_dict
-
-    def update_exp(self):
-        tmp_exp_dict = self.exp_dict
-
-        tmp_start_btn: widgets.Button = tmp_exp_dict['start_btn']
-        tmp_force_stop_btn: widgets.Button = tmp_exp_dict['force_stop']
-        tmp_exp_status_label: widgets.Valid = tmp_exp_dict['status']
-        tmp_run_time_label: widgets.Label = tmp_exp_dict['run_time']
-        tmp_exp_dry_run: widgets.Checkbox = tmp_exp_dict['dry_run']
-        tmp_exp_stop_all: widgets.Checkbox = tmp_exp_dict['stop_all']
-        tmp_pause_btn: widgets.Button = tmp_exp_dict['pause_btn']
-        tmp_resume_btn: widgets.Button = tmp_exp_dict['resume_btn']
-
-        if not self.exp.error_quit:
-            if self.exp.finished is False and self.exp.is_running is False:
-                tmp_exp_status_label.description = 'Ready'
-                tmp_exp_status_label.value = True
-                tmp_start_btn.disabled = False
-                tmp_force_stop_btn.disabled = True
-                tmp_pause_btn.disabled = tmp_resume_btn.disabled = True
-                tmp_resume_btn.button_style = ''
-            elif self.exp.finished is False and self.exp.is_running is True:
-                if not self.exp.pause:
-                    tmp_exp_status_label.description = 'Running'
-                tmp_exp_status_label.value = True
-                tmp_start_btn.disabled = True
-                tmp_force_stop_btn.disabled = False
-                if self.exp.pause:
-                    if self.exp.error_detail is None:
-                        tmp_exp_status_label.description = 'Paused'
-                    else:
-                        tmp_exp_status_label.description = 'Exception'
-                    tmp_pause_btn.disabled = True
-                    if self.exp.error_detail is None:
-                        tmp_resume_btn.disabled = False
-                        tmp_resume_btn.button_style = 'success'
-                    else:
-                        tmp_resume_btn.disabled = True
-                else:
-                    tmp_pause_btn.disabled = False
-                    tmp_resume_btn.disabled = True
-                    tmp_resume_btn.button_style = ''
-
-            elif self.exp.finished is True and self.exp.is_running is False:
-                tmp_exp_status_label.description = 'Finished'
-                tmp_exp_status_label.value = True
-                tmp_start_btn.disabled = True
-                tmp_start_btn.button_style = 'success'
-                tmp_start_btn.tooltip = 'Finished'
-                tmp_start_btn.description = 'Finished'
-                tmp_start_btn.icon = 'check'
-                tmp_force_stop_btn.disabled = True
-                tmp_resume_btn.disabled = tmp_pause_btn.disabled = True
-                tmp_resume_btn.button_style = ''
-            elif self.exp.finished:
-                tmp_start_btn.disabled = True
-                tmp_force_stop_btn.disabled = True
-                tmp_resume_btn.disabled = tmp_pause_btn.disabled = True
-                tmp_resume_btn.button_style = ''
-        else:
-            tmp_resume_btn.disabled = tmp_pause_btn.disabled = True
-            if self.exp.is_running is False:
-                tmp_exp_status_label.description = 'Error'
-                tmp_exp_status_label.value = False
-                tmp_start_btn.disabled = True
-                tmp_force_stop_btn.disabled = True
-            else:
-                tmp_exp_status_label.description = 'Stopping'
-                tmp_exp_status_label.value = False
-                tmp_start_btn.disabled = True
-                tmp_force_stop_btn.disabled = True
-
-        if self.exp.is_running:
-            tmp_run_time_label.value = self.exp.time_difference(self.exp.timer_start, time.time())  # todo runtime
-
-    def update_channel(self):
-        tmp_channel_dict = self.channel_dict
-        error_protocol = None
-        if self.exp.error_detail is not None:
-            error_protocol = self.exp.error_detail.protocol
-            e = self.exp.error_detail.error
-
-        for tmp_protocol in self.channel_dict:
-            if tmp_protocol == error_protocol:
-                tmp_protocol: Protocol
-                tmp_single_channel_dict = tmp_channel_dict[error_protocol]
-                tmp_pg_bar: widgets.IntProgress = tmp_single_channel_dict['pg_bar']
-                tmp_channel_description_box: widgets.Text = tmp_single_channel_dict['description']
-                tmp_current_op: widgets.Text = tmp_single_channel_dict['op']
-
-                tmp_pg_bar.value = tmp_protocol.progress
-                tmp_pg_bar.bar_style = 'danger'
-                tmp_channel_description_box.value = 'Error'
-                if tmp_protocol.current_op is not None:
-                    tmp_current_op.value = tmp_protocol.current_op
-
-            else:
-                tmp_protocol: Protocol
-                tmp_single_channel_dict = tmp_channel_dict[tmp_protocol]
-                tmp_pg_bar: widgets.IntProgress = tmp_single_channel_dict['pg_bar']
-                tmp_channel_description_box: widgets.Text = tmp_single_channel_dict['description']
-                tmp_current_op: widgets.Text = tmp_single_channel_dict['op']
-
-                tmp_pg_bar.value = tmp_protocol.progress
-                if tmp_protocol.current_op is not None:
-                    tmp_current_op.value = tmp_protocol.current_op
-                else:
-                    tmp_current_op.value = ''
-
-                if tmp_protocol.finished:
-                    tmp_pg_bar.bar_style = 'success'
-                    tmp_channel_description_box.value = 'Finished'
-                else:
-                    if tmp_protocol.current_description is not None:
-                        tmp_channel_description_box.value = tmp_protocol.current_description
-
-    def update_devices(self):
-        tmp_device_dict = self.device_dict
-
-        for single_device in tmp_device_dict:
-            single_device: Component
-            tmp_single_device_dict = tmp_device_dict[single_device]
-            # tmp_device_name = tmp_single_device_dict['name']
-            tmp_device_port: widgets.Text = tmp_single_device_dict['port']
-            tmp_device_connected: widgets.Valid = tmp_single_device_dict['connected']
-            tmp_device_button_connect: widgets.Button = tmp_single_device_dict['button_connect']
-            tmp_device_description: widgets.Textarea = tmp_single_device_dict['description']
-            tmp_device_operation: widgets.Text = tmp_single_device_dict['operation']
-
-            tmp_device_port.value = single_device.get_port
-            tmp_device_connected.value = single_device.is_connected
-            tmp_device_connected.description = 'Connected' if single_device.is_connected else 'Disconnected'
-            if single_device.is_connected:
-                if not tmp_device_button_connect.description == 'Disconnect':
-                    time.sleep(0.2)
-                    tmp_device_button_connect.description = 'Disconnect'
-                    tmp_device_button_connect.button_style = 'Danger'
-                    tmp_device_button_connect.icon = 'cross'
-            else:
-                if not tmp_device_button_connect.description == 'Connect':
-                    time.sleep(0.2)
-                    tmp_device_button_connect.description = 'Connect'
-                    tmp_device_button_connect.button_style = ''
-                    tmp_device_button_connect.icon = 'check'
-            tmp_device_description.value = '' if single_device.description_display is None else single_device.description_display
-            tmp_device_operation.value = '' if single_device.current_op is None else single_device.current_op
-
-    def update_sensors(self):
-        for sensor in self.sensors_dict:
-            for channel in self.sensors_dict[sensor]:
-                line: bqplot.marks.Scatter = self.sensors_dict[sensor][channel][1]
-                data: pd.DataFrame = sensor.data
-                xdata = np.array(data['time'])
-                ydata = np.array(data[channel])
-
-                tmp = 60*sensor.freq
-                if len(xdata) >= tmp:
-                    line.x = xdata[-tmp:]
-                    line.y = ydata[-tmp:]
-                else:
-                    line.x = xdata
-                    line.y = ydata
-
-    def update_ui(self):
-        while True:
-            time.sleep(0.1)
-            self.update_exp()
-            self.update_channel()
-            self.update_devices()
-            self.update_sensors()
-
-            if self.exp.finished:
-                self.update_exp()
-                self.update_channel()
-                self.update_devices()
-                self.update_sensors()
-                break
-
-    @staticmethod
-    def draw_single_sensor(sensor: Sensor):
-        # print(f"drawing sensor {sensor}")
-        plot_dict: dict[bqplot.figure.Figure] = dict()
-        for channel in sensor.channels:
-            data: pd.DataFrame = sensor.data
-            xdata = np.array(data['time'])
-            ydata = np.array(data[channel])
-
-            def_tt = bqplot.Tooltip(
-                fields=["x", "y"], formats=[".2f", ".2f"], labels=["Time(s)", channel]
-            )
-            fig = plt.figure(title=f"{sensor.name}: {channel}",
-                             fig_margin={'top': 50, 'bottom': 30, 'left': 50, 'right': 30})
-            fig.layout.height = '300px'
-            fig.layout.width = '300px'
-            scatter = plt.plot(x=xdata, y=ydata, default_size=5, tooltip=def_tt)
-            plt.xlabel('Time(s)')
-            plt.ylabel(channel)
-
-            plot_dict[channel] = (fig, scatter)
-
-        return plot_dict
-
-    def draw_sensors(self):
-        # print('draw all sensors')
-        self.sensors_dict = dict()
-        plot_list = []
-        for sensor in self.exp.apparatus.sensors:
-            self.sensors_dict[sensor] = self.draw_single_sensor(sensor)
-            for key in self.sensors_dict[sensor]:
-                plot_list.append(self.sensors_dict[sensor][key][0])
-
-        sensors_title = widgets.HTML(value="<h4><b>Sensors</b></h4>", )
-        vbox_list = [sensors_title]
-        hbox_list = []
-        for plot in plot_list:
-            if len(hbox_list) == 3:
-                vbox_list.append(widgets.HBox(hbox_list, layout=widgets.Layout(width='auto', height='310px')))
-                hbox_list = []
-            hbox_list.append(plot)
-        if len(hbox_list) > 0:
-            vbox_list.append(widgets.HBox(hbox_list, layout=widgets.Layout(width='auto', height='310px')))
-
-        self.sensor_panel = widgets.VBox(vbox_list)
-
-    def start_jupyter_ui(self):
-        self.draw_exp_control()
-        self.draw_exp_info()
-        self.draw_device_ui()
-        self.draw_sensors()
-
-        display(self.exp_control_ui)
-        display(self.exp_info_ui)
-        display(self.sensor_panel)
-        display(self.devices_ui)
-
-        tmp_ui_thread = Thread(target=self.update_ui, args=())
-        tmp_ui_thread.setDaemon(True)
-
-        tmp_ui_thread.start()
-        if self.exp.finished:
-            tmp_ui_thread.join()
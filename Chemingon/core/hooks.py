@@ -0,0 +1,47 @@
+from typing import Callable
+
+from loguru import logger
+
+
+class HookRegistry:
+    """
+    Callbacks called by Experiment on the execution path, all with keyword arguments:
+        protocol_start: protocol
+        protocol_end: protocol, outcome
+        operation_enqueue: op, protocol, device (operation put in the queue of a public device)
+        operation_start: op, protocol
+        operation_end: op, protocol, outcome, duration
+        public_dispatch: device, task, protocol (public device takes a task from its queue)
+        sensor_sample: sensor, duration
+        pause: paused
+        error: error_info
+    Callbacks run on the thread of the event and must be quick; an exception raised by a callback is logged and
+    never reaches the experiment.
+    """
+
+    EVENTS = ('protocol_start', 'protocol_end', 'operation_enqueue', 'operation_start', 'operation_end',
+              'public_dispatch', 'sensor_sample', 'pause', 'error')
+
+    def __init__(self):
+        self._callbacks: dict[str, tuple[Callable, ...]] = {i: () for i in self.EVENTS}
+        self.active = False  # any callback registered; checked before building the arguments of an event
+        self.hook_errors = 0
+
+    def register(self, event: str, callback: Callable):
+        if event not in self._callbacks:
+            raise ValueError(f'Unknown event {event}; must be one of {self.EVENTS}')
+        # tuples are replaced, never modified, so emit() needs no lock
+        self._callbacks[event] = self._callbacks[event] + (callback,)
+        self.active = True
+
+    def unregister(self, event: str, callback: Callable):
+        self._callbacks[event] = tuple(i for i in self._callbacks[event] if i is not callback)
+        self.active = any(len(i) > 0 for i in self._callbacks.values())
+
+    def emit(self, event: str, **kwargs):
+        for callback in self._callbacks[event]:
+            try:
+                callback(**kwargs)
+            except Exception as e:
+                self.hook_errors += 1
+                logger.error(f'Hook {callback} for event {event} raised an exception: {e}')
@@ -0,0 +1,687 @@
+import time
+from threading import Thread
+from typing import Union, Iterable
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from ..components.stdlib.component import Component
+from ..components.stdlib.sensor import Sensor
+from .errors import ExperimentError, ErrorInfo
+from .experiment import Experiment
+
+# the notebook stack, imported when a UI is created so that importing this module does not need it
+bqplot = plt = display = widgets = None
+
+
+def _import_notebook():
+    global bqplot, plt, display, widgets
+    if widgets is None:
+        import bqplot.figure
+        import bqplot.pyplot as plt
+        from IPython.display import display
+        import ipywidgets as widgets
+
+
+class JupyterUI:
+    def __init__(self, exp: Experiment):
+        _import_notebook()
+        self.device_dict = None
+        self.devices_ui = None
+        self.channel_dict = None
+        self.exp_info_ui = None
+        self.exp_dict = None
+        self.exp_control_ui = None
+        self.exp = exp
+        self.sensor_panel = None
+        self.sensors_dict = None
+        self._rendered: dict[widgets.Widget, dict] = dict()  # last state sent to the frontend, see _render()
+
+        # sensor plots show the last plot_window seconds, decimated to at most max_plot_points points
+        self.plot_window: float = 60.0
+        self.max_plot_points: int = 500
+        self._plot_state: dict[Sensor, dict] = dict()  # rows plotted, next refresh, visible
+
+        # widgets are refreshed from the changes published to exp.state since the last refresh
+        self._state_version = 0
+        self._error_protocol = None
+
+        # protocols and devices are shown page_size at a time; rows of widgets are reused from page to page
+        self.page_size: int = 20
+        self._protocol_order: list[int] = []  # uid of the protocols of protocol_list
+        self._device_order: list[str] = []
+        self._channel_rows: list[dict] = []
+        self._device_rows: list[dict] = []
+        self._channel_pager: dict = dict()
+        self._device_pager: dict = dict()
+        self.channel_summary: Union[None, widgets.HTML] = None
+        self.device_summary: Union[None, widgets.HTML] = None
+        self._devices: dict[str, Component] = dict()
+        self._summary_due = True
+        self._summary_time = 0.0
+
+    def _render(self, widget: 'widgets.Widget', **state):
+        """
+        Set the properties of a widget that differ from the last rendered ones; every assignment is a message to the
+        frontend, so unchanged properties are skipped and the changed ones are sent together
+        """
+        last = self._rendered.setdefault(widget, dict())
+        changes = {key: value for key, value in state.items() if key not in last or last[key] != value}
+        if not changes:
+            return
+        with widget.hold_sync():
+            for key, value in changes.items():
+                setattr(widget, key, value)
+        last.update(changes)
+
+    def draw_exp_control(self):
+        def do_start_btn(btn):
+            if exp_dry_run.value:
+                exp_stop_all.value = True
+            self.exp.stop_all_upon_error = exp_stop_all.value
+            self._render(force_stop_btn, disabled=False)
+            self._render(exp_status_label, description='Running')
+            self._render(btn, description='Running', disabled=True, tooltip='Running', icon='hourglass')
+            thread = Thread(target=self.exp.start_master_operators, args=(exp_dry_run.value,), name='Supervisor')
+            thread.start()
+
+        def do_stop_btn(btn):
+            self._render(exp_status_label, description='Stopped', value=False)
+            self.exp.stop_all_upon_error = exp_stop_all.value
+            err = ErrorInfo(ExperimentError('Force stop button'), None, True)
+            self.exp.error_queue.put(err)
+            # self.exp.error_queue.put((None, KeyboardInterrupt('Force stopped')))
+
+        def do_pause_btn(btn):
+            logger.debug('Pause button pressed')
+            if not self.exp.pause:
+                self.exp.pause = True
+
+        def do_resume_btn(btn):
+            logger.debug('Resume button pressed')
+            if self.exp.error_detail is None:
+                self.exp.pause = False
+
+        start_btn = widgets.Button(
+            description='Start',
+            disabled=False,
+            button_style='',  # 'success', 'info', 'warning', 'danger' or ''
+            tooltip='Start',
+            icon='play'  # (FontAwesome names without the `fa-` prefix)
+        )
+        start_btn.on_click(do_start_btn)
+
+        force_stop_btn = widgets.Button(
+            description='Force Stop',
+            disabled=True,
+            button_style='danger',  # 'success', 'info', 'warning', 'danger' or ''
+            tooltip='Force Stop',
+            icon='stop'  # (FontAwesome names without the `fa-` prefix)
+        )
+        force_stop_btn.on_click(do_stop_btn)
+
+        pause_btn = widgets.Button(
+            description='Pause',
+            disabled=True,
+            button_style='',
+            tooltip='Pause',
+            icon='pause-circle'
+        )
+        pause_btn.on_click(do_pause_btn)
+
+        resume_btn = widgets.Button(
+            description='Resume',
+            disabled=True,
+            button_style='',
+            tooltip='Resume',
+            icon='play-circle'
+        )
+        resume_btn.on_click(do_resume_btn)
+
+        # exp_status_label = widgets.Label(value="Status")
+        exp_status_label = widgets.Valid(
+            value=True,
+            description='Ready',
+        )
+
+        run_time_label = widgets.Label(value="00:00:00")
+
+        exp_control_main = widgets.HBox([start_btn, force_stop_btn, pause_btn, resume_btn, exp_status_label, run_time_label],
+                                        layout=widgets.Layout(flex_flow='row', display='flex', width='100%',
+                                                              justify_content='space-between'))
+        exp_control_title = widgets.HTML(
+            value="<h4><b>Experiment Control</b></h4>",
+        )
+
+        exp_dry_run = widgets.Checkbox(value=False, description='Dry run', indent=False,
+                                       layout=widgets.Layout(width='70px'))
+        exp_stop_all = widgets.Checkbox(value=False, description='Stop all upon error', indent=True,
+                                        layout=widgets.Layout(width='250px'))
+        exp_settings = widgets.HBox([exp_dry_run, exp_stop_all], layout=widgets.Layout(justify_content='flex-start'))
+        # exp_settings = widgets.HBox([exp_dry_run], layout=widgets.Layout(justify_content='flex-start'))
+
+        exp_control = widgets.VBox([exp_control_title, exp_control_main, exp_settings])
+        exp_dict = dict()  # update with this
+        exp_dict['start_btn'] = start_btn
+        exp_dict['force_stop'] = force_stop_btn
+        exp_dict['status'] = exp_status_label
+        exp_dict['run_time'] = run_time_label
+        exp_dict['dry_run'] = exp_dry_run
+        exp_dict['stop_all'] = exp_stop_all
+        exp_dict['pause_btn'] = pause_btn
+        exp_dict['resume_btn'] = resume_btn
+
+        self.exp_dict = exp_dict
+        self.exp_control_ui = exp_control
+
+    def _draw_pager(self, n_items: int, show_page) -> dict:
+        """Previous / next buttons over pages of page_size items; show_page(page) is called on change"""
+        pages = max(1, -(-n_items // self.page_size))
+        prev_btn = widgets.Button(description='', icon='chevron-left', tooltip='Previous page',
+                                  layout=widgets.Layout(width='40px'))
+        next_btn = widgets.Button(description='', icon='chevron-right', tooltip='Next page',
+                                  layout=widgets.Layout(width='40px'))
+        page_label = widgets.Label(value=f'Page 1/{pages} ({n_items})')
+        box = widgets.HBox([prev_btn, page_label, next_btn],
+                           layout=widgets.Layout(display=None if pages > 1 else 'none'))
+        pager = {'box': box, 'label': page_label, 'page': 0, 'pages': pages, 'items': n_items}
+
+        def turn(step):
+            page = min(max(pager['page'] + step, 0), pager['pages'] - 1)
+            if page != pager['page']:
+                pager['page'] = page
+                self._render(page_label, value=f'Page {page + 1}/{pages} ({n_items})')
+                show_page(page)
+
+        prev_btn.on_click(lambda btn: turn(-1))
+        next_btn.on_click(lambda btn: turn(1))
+        return pager
+
+    @staticmethod
+    def _draw_channel_row() -> dict:
+        channel_label = widgets.Label(value='', layout=widgets.Layout(flex='0 0 auto'))
+        pg_bar = widgets.widgets.IntProgress(
+            value=0,
+            min=0,
+            max=1,
+            description='Ready',
+            bar_style='',  # 'success', 'info', 'warning', 'danger' or ''
+            orientation='horizontal'
+        )
+        channel_description_box = widgets.Text(
+            value='',
+            placeholder='No description',
+            description='Description:',
+            disabled=True
+        )
+        current_op = widgets.Text(
+            value='Inactive',
+            placeholder='Inactive',
+            description='Operation',
+            disabled=True,
+            layout={'overflow': 'scroll'}
+        )
+        channel_hb = widgets.HBox([channel_label, pg_bar, channel_description_box, current_op],
+                                  layout=widgets.Layout(flex_flow='row', display='flex', width='auto',
+                                                        justify_content='flex-start'))
+        return {'box': channel_hb, 'label': channel_label, 'pg_bar': pg_bar, 'description': channel_description_box,
+                'op': current_op, 'uid': None}
+
+    def draw_exp_info(self):
+        # Experiment info
+        exp_info_title = widgets.HTML(
+            value="<h4><b>Experiment Information</b></h4>",
+        )
+        self._protocol_order = [i.uid for i in self.exp.protocol_list]
+        self._channel_rows = [self._draw_channel_row()
+                              for _ in range(min(self.page_size, len(self._protocol_order)))]
+        self._channel_pager = self._draw_pager(len(self._protocol_order), self._show_channel_page)
+        self.channel_summary = widgets.HTML(value='')
+        self.channel_dict = dict()  # uid -> row of the protocols on the current page
+
+        exp_info = widgets.VBox([exp_info_title, self.channel_summary, self._channel_pager['box']] +
+                                [i['box'] for i in self._channel_rows])
+        self.exp_info_ui = exp_info
+        self._show_channel_page(0)
+
+    def _show_channel_page(self, page: int):
+        uids = self._protocol_order[page * self.page_size:(page + 1) * self.page_size]
+        self.channel_dict = dict()
+        for idx, row in enumerate(self._channel_rows):
+            if idx >= len(uids):
+                row['uid'] = None
+                self._render(row['box'].layout, display='none')
+                continue
+            uid = uids[idx]
+            st = self.exp.state.get('protocol', uid)
+            row['uid'] = uid
+            self.channel_dict[uid] = row
+            self._render(row['box'].layout, display='flex')
+            self._render(row['label'], value=st['name'])
+            self._render(row['pg_bar'], max=max(1, st['total']), value=0, bar_style='')
+            self._render(row['description'], value='' if st['description'] is None else st['description'])
+            self._render(row['op'], value='')
+        self.update_channel(uids)
+
+    @staticmethod
+    def draw_single_device_mon(device: Component, operation=''):
+        _import_notebook()
+        name = device.name
+        port = device.get_port
+        connected = device.is_connected
+        description = device.description
+
+        device_name = widgets.Label(value=name, layout=widgets.Layout(height='auto', width='auto'))
+        device_port = widgets.Text(value=port, placeholder='Undefined', description='Port', disabled=True)
+        device_connected = widgets.Valid(
+            value=connected,
+            description='Disconnected',
+        )
+        device_description = widgets.Textarea(value=description, placeholder='None', disabled=True,
+                                              layout=widgets.Layout(height='30px', width='auto'))
+        device_operation = widgets.Text(value=operation, placeholder='Inactive', disabled=True,
+                                        layout=widgets.Layout(height='auto', width='auto'))
+        device_button_connect = widgets.Button(description='Wait', disabled=False, button_style='',
+                                               tooltip='Connect', icon='connect',
+                                               layout=widgets.Layout(width='auto'))
+        device_button_connect.on_click(device.btn_change_connection)
+        device_grid = widgets.GridspecLayout(2, 4, height='80px')
+
+        device_grid[:, 0] = device_name
+        device_grid[0, 1] = device_port
+        device_grid[0, 2] = device_connected
+        device_grid[0, 3] = device_button_connect
+        device_grid[1, 1:2] = device_description
+        device_grid[1, 2:4] = device_operation
+
+        tmp_single_device_dict = dict()
+        tmp_single_device_dict['name'] = device_name
+        tmp_single_device_dict['port'] = device_port
+        tmp_single_device_dict['connected'] = device_connected
+        tmp_single_device_dict['button_connect'] = device_button_connect
+        tmp_single_device_dict['description'] = device_description
+        tmp_single_device_dict['operation'] = device_operation
+
+        return device_grid, tmp_single_device_dict
+
+    def _draw_device_row(self) -> dict:
+        device_name = widgets.Label(value='', layout=widgets.Layout(height='auto', width='auto'))
+        device_port = widgets.Text(value='', placeholder='Undefined', description='Port', disabled=True)
+        device_connected = widgets.Valid(
+            value=False,
+            description='Disconnected',
+        )
+        device_description = widgets.Textarea(value='', placeholder='None', disabled=True,
+                                              layout=widgets.Layout(height='30px', width='auto'))
+        device_operation = widgets.Text(value='', placeholder='Inactive', disabled=True,
+                                        layout=widgets.Layout(height='auto', width='auto'))
+        device_button_connect = widgets.Button(description='Wait', disabled=False, button_style='',
+                                               tooltip='Connect', icon='connect',
+                                               layout=widgets.Layout(width='auto'))
+        device_grid = widgets.GridspecLayout(2, 4, height='80px')
+
+        device_grid[:, 0] = device_name
+        device_grid[0, 1] = device_port
+        device_grid[0, 2] = device_connected
+        device_grid[0, 3] = device_button_connect
+        device_grid[1, 1:2] = device_description
+        device_grid[1, 2:4] = device_operation
+
+        row = {'box': device_grid, 'name': device_name, 'port': device_port, 'connected': device_connected,
+               'button_connect': device_button_connect, 'description': device_description,
+               'operation': device_operation, 'device': None}
+        # the row shows different devices from page to page
+        device_button_connect.on_click(lambda btn: row['device'].btn_change_connection(btn)
+                                       if row['device'] is not None else None)
+        return row
+
+    def draw_device_ui(self):
+        instruments_info_title = widgets.HTML(
+            value="<h4><b>Instruments Information</b></h4>",
+        )
+
+        # public devices first, then the devices of each protocol
+        public_devices, private_devices = [], []
+        for protocol_i in self.exp.protocol_list:
+            for protocol_device in protocol_i.component_list:
+                if protocol_device in public_devices or protocol_device in private_devices:
+                    continue
+                (public_devices if protocol_device.is_public else private_devices).append(protocol_device)
+        devices = public_devices + private_devices
+        self._devices = {i.name: i for i in devices}
+        self._device_order = [i.name for i in devices]
+
+        self._device_rows = [self._draw_device_row() for _ in range(min(self.page_size, len(devices)))]
+        self._device_pager = self._draw_pager(len(devices), self._show_device_page)
+        self.device_summary = widgets.HTML(value='')
+        self.device_dict = dict()  # name -> row of the devices on the current page
+
+        self.devices_ui = widgets.VBox([instruments_info_title, self.device_summary, self._device_pager['box']] +
+                                       [i['box'] for i in self._device_rows])
+        self._show_device_page(0)
+
+    def _show_device_page(self, page: int):
+        names = self._device_order[page * self.page_size:(page + 1) * self.page_size]
+        self.device_dict = dict()
+        for idx, row in enumerate(self._device_rows):
+            if idx >= len(names):
+                row['device'] = None
+                self._render(row['box'].layout, display='none')
+                continue
+            name = names[idx]
+            row['device'] = self._devices[name]
+            self.device_dict[name] = row
+            self._render(row['box'].layout, display='grid')
+            self._render(row['name'], value=f'{name} (public)' if row['device'].is_public else name)
+        self.update_devices(names)
+
+    def update_summary(self):
+        """Counters of all protocols and devices, and the protocol running on each channel"""
+        version, snapshot = self.exp.state.snapshot()
+        error_protocol = snapshot[('experiment', None)]['error_protocol']
+        counts = {'running': 0, 'finished': 0, 'error': 0, 'waiting': 0}
+        channels = dict()
+        connected = busy = n_devices = 0
+        for (kind, key), st in snapshot.items():
+            if kind == 'protocol' and st.get('top'):
+                if st.get('finished'):
+                    status = 'finished'
+                elif key == error_protocol:
+                    status = 'error'
+                elif st.get('progress', 0) > 0:
+                    status = 'running'
+                else:
+                    status = 'waiting'
+                counts[status] += 1
+                channel = channels.setdefault(st.get('channel'), {'done': 0, 'total': 0, 'running': None})
+                channel['total'] += 1
+                channel['done'] += status == 'finished'
+                if status == 'running':
+                    channel['running'] = st
+            elif kind == 'device' and key in self._devices:
+                n_devices += 1
+                connected += bool(st.get('is_connected'))
+                busy += st.get('current_op') not in (None, '', 'Inactive')
+
+        table = ['<table style="font-size: 12px"><tr><th>Channel</th><th>Running protocol</th><th>Step</th>'
+                 '<th>Done</th></tr>']
+        for channel in sorted(channels, key=lambda x: (x is None, x)):
+            entry = channels[channel]
+            running = entry['running']
+            name = '' if running is None else running['name']
+            step = '' if running is None else f"{running['progress']}/{running['total']}"
+            table.append(f'<tr><td>{channel}</td><td>{name}</td><td>{step}</td>'
+                         f'<td>{entry["done"]}/{entry["total"]}</td></tr>')
+        table.append('</table>')
+        total = sum(counts.values())
+        self._render(self.channel_summary,
+                     value=f"<b>{total} protocols</b>: {counts['running']} running, {counts['finished']} finished, "
+                           f"{counts['error']} stopped by error, {counts['waiting']} waiting" + ''.join(table))
+        self._render(self.device_summary,
+                     value=f'<b>{n_devices} devices</b>: {connected} connected, {busy} busy')
+
+    def update_exp(self):
+        tmp_exp_dict = self.exp_dict
+        st = self.exp.state.get('experiment', None)
+        error_quit, finished, is_running, pause = st['error_quit'], st['finished'], st['running'], st['paused']
+        error = st['error']
+
+        # state of the widgets; only the properties given are rendered
+        start_btn, force_stop_btn, status_label, pause_btn, resume_btn = dict(), dict(), dict(), dict(), dict()
+        if not error_quit:
+            if finished is False and is_running is False:
+                status_label.update(description='Ready', value=True)
+                start_btn['disabled'] = False
+                force_stop_btn['disabled'] = True
+                pause_btn['disabled'] = True
+                resume_btn.update(disabled=True, button_style='')
+            elif finished is False and is_running is True:
+                if not pause:
+                    status_label['description'] = 'Running'
+                status_label['value'] = True
+                start_btn['disabled'] = True
+                force_stop_btn['disabled'] = False
+                if pause:
+                    status_label['description'] = 'Paused' if error is None else 'Exception'
+                    pause_btn['disabled'] = True
+                    if error is None:
+                        resume_btn.update(disabled=False, button_style='success')
+                    else:
+                        resume_btn['disabled'] = True
+                else:
+                    pause_btn['disabled'] = False
+                    resume_btn.update(disabled=True, button_style='')
+
+            elif finished is True and is_running is False:
+                status_label.update(description='Finished', value=True)
+                start_btn.update(disabled=True, button_style='success', tooltip='Finished', description='Finished',
+                                 icon='check')
+                force_stop_btn['disabled'] = True
+                pause_btn['disabled'] = True
+                resume_btn.update(disabled=True, button_style='')
+            elif finished:
+                start_btn['disabled'] = True
+                force_stop_btn['disabled'] = True
+                pause_btn['disabled'] = True
+                resume_btn.update(disabled=True, button_style='')
+        else:
+            pause_btn['disabled'] = True
+            resume_btn['disabled'] = True
+            status_label.update(description='Error' if is_running is False else 'Stopping', value=False)
+            start_btn['disabled'] = True
+            force_stop_btn['disabled'] = True
+
+        self._render(tmp_exp_dict['start_btn'], **start_btn)
+        self._render(tmp_exp_dict['force_stop'], **force_stop_btn)
+        self._render(tmp_exp_dict['status'], **status_label)
+        self._render(tmp_exp_dict['pause_btn'], **pause_btn)
+        self._render(tmp_exp_dict['resume_btn'], **resume_btn)
+        if is_running:
+            self._render(tmp_exp_dict['run_time'], value=self.exp.time_difference(st['timer_start'], time.time()))
+
+    def update_channel(self, uids: Iterable[int] = None):
+        """
+        :param uids: protocols whose state changed; all if None
+        """
+        tmp_channel_dict = self.channel_dict
+        state = self.exp.state
+        error_protocol = state.get('experiment', None)['error_protocol']
+
+        for uid in (list(tmp_channel_dict) if uids is None else uids):
+            tmp_single_channel_dict = tmp_channel_dict.get(uid)  # None if not on the current page
+            st = state.get('protocol', uid)
+            if tmp_single_channel_dict is None or st is None:
+                continue
+            pg_bar = {'value': st['progress']}
+            description, current_op = dict(), dict()
+            if uid == error_protocol:
+                pg_bar['bar_style'] = 'danger'
+                description['value'] = 'Error'
+                if st['current_op'] is not None:
+                    current_op['value'] = st['current_op']
+            else:
+                current_op['value'] = '' if st['current_op'] is None else st['current_op']
+                if st['finished']:
+                    pg_bar['bar_style'] = 'success'
+                    description['value'] = 'Finished'
+                elif st['current_description'] is not None:
+                    description['value'] = st['current_description']
+
+            self._render(tmp_single_channel_dict['pg_bar'], **pg_bar)
+            self._render(tmp_single_channel_dict['description'], **description)
+            self._render(tmp_single_channel_dict['op'], **current_op)
+
+    def update_devices(self, names: Iterable[str] = None):
+        """
+        :param names: devices whose state changed; all if None
+        """
+        tmp_device_dict = self.device_dict
+        state = self.exp.state
+
+        for name in (list(tmp_device_dict) if names is None else names):
+            tmp_single_device_dict = tmp_device_dict.get(name)  # None if not on the current page
+            st = state.get('device', name)
+            if tmp_single_device_dict is None or st is None:
+                continue
+            connected = st['is_connected']
+
+            self._render(tmp_single_device_dict['port'], value=st['port'])
+            self._render(tmp_single_device_dict['connected'], value=connected,
+                         description='Connected' if connected else 'Disconnected')
+            if connected:
+                self._render(tmp_single_device_dict['button_connect'], description='Disconnect',
+                             button_style='danger', icon='cross')
+            else:
+                self._render(tmp_single_device_dict['button_connect'], description='Connect', button_style='',
+                             icon='check')
+            self._render(tmp_single_device_dict['description'],
+                         value='' if st['description_display'] is None else st['description_display'])
+            self._render(tmp_single_device_dict['operation'],
+                         value='' if st['current_op'] is None else st['current_op'])
+
+    def plot_interval(self, sensor: Sensor) -> float:
+        """Seconds between two refreshes of the plots of a sensor: no faster than new points can appear"""
+        return max(0.1, 1.0 / sensor.freq, self.plot_window / self.max_plot_points)
+
+    def update_sensors(self, force: bool = False):
+        """
+        Refresh the plots of the visible sensors whose refresh interval has elapsed and which recorded new samples;
+        only the last plot_window seconds, decimated to max_plot_points, are sent
+        :param force: refresh all visible sensors now
+        """
+        now = time.perf_counter()
+        for sensor in self.sensors_dict:
+            state = self._plot_state[sensor]
+            if not state['visible'] or (now < state['next'] and not force):
+                continue
+            state['next'] = now + self.plot_interval(sensor)
+            rows = len(sensor.data)
+            if rows == state['rows'] and not force:
+                continue
+            state['rows'] = rows
+
+            tmp = max(1, int(self.plot_window * sensor.freq))
+            with sensor.pandas_lock:
+                tail = sensor.data.iloc[-tmp:]
+                xdata = tail['time'].to_numpy(dtype=float)
+                ydata = {channel: tail[channel].to_numpy(dtype=float) for channel in self.sensors_dict[sensor]}
+            stride = -(-len(xdata) // self.max_plot_points)
+            if stride > 1:
+                # keep the latest point
+                xdata = xdata[::-stride][::-1]
+                ydata = {channel: values[::-stride][::-1] for channel, values in ydata.items()}
+            for channel in self.sensors_dict[sensor]:
+                line: bqplot.marks.Scatter = self.sensors_dict[sensor][channel][1]
+                with line.hold_sync():
+                    line.x = xdata
+                    line.y = ydata[channel]
+
+    def _changes(self) -> tuple[set, set]:
+        """Protocols and devices changed since the last refresh, from the state store of the experiment"""
+        self._state_version, changes, _ = self.exp.state.changes_since(self._state_version)  # refreshed by key
+        uids = {key for kind, key in changes if kind == 'protocol'}
+        names = {key for kind, key in changes if kind == 'device'}
+        if ('experiment', None) in changes:
+            error_protocol = self.exp.state.get('experiment', None)['error_protocol']
+            if error_protocol != self._error_protocol:
+                uids.update(i for i in (error_protocol, self._error_protocol) if i is not None)
+                self._error_protocol = error_protocol
+        return uids, names
+
+    def update_ui(self):
+        while True:
+            time.sleep(0.1)
+            refresh_start = time.perf_counter()
+            cpu_start = self.exp.cpu_time.now()
+            uids, names = self._changes()
+            self.update_exp()
+            self.update_channel(uids)
+            self.update_devices(names)
+            self._summary_due = self._summary_due or bool(uids) or bool(names)
+            if self._summary_due and refresh_start - self._summary_time > 1.0:
+                self._summary_due = False
+                self._summary_time = refresh_start
+                self.update_summary()
+            self.update_sensors()
+            self.exp.cpu_time.add('thread', 'UI update', self.exp.cpu_time.now() - cpu_start)
+            if self.exp.metrics is not None:
+                self.exp.metrics.observe_ui_refresh(time.perf_counter() - refresh_start)
+
+            if self.exp.finished:
+                self.update_exp()
+                self.update_channel()
+                self.update_devices()
+                self.update_summary()
+                self.update_sensors(force=True)
+                break
+
+    @staticmethod
+    def draw_single_sensor(sensor: Sensor):
+        _import_notebook()
+        # print(f"drawing sensor {sensor}")
+        plot_dict: dict[bqplot.figure.Figure] = dict()
+        for channel in sensor.channels:
+            data: pd.DataFrame = sensor.data
+            xdata = np.array(data['time'])
+            ydata = np.array(data[channel])
+
+            def_tt = bqplot.Tooltip(
+                fields=["x", "y"], formats=[".2f", ".2f"], labels=["Time(s)", channel]
+            )
+            fig = plt.figure(title=f"{sensor.name}: {channel}",
+                             fig_margin={'top': 50, 'bottom': 30, 'left': 50, 'right': 30})
+            fig.layout.height = '300px'
+            fig.layout.width = '300px'
+            scatter = plt.plot(x=xdata, y=ydata, default_size=5, tooltip=def_tt)
+            plt.xlabel('Time(s)')
+            plt.ylabel(channel)
+
+            plot_dict[channel] = (fig, scatter)
+
+        return plot_dict
+
+    def draw_sensors(self):
+        # print('draw all sensors')
+        self.sensors_dict = dict()
+        sensors_title = widgets.HTML(value="<h4><b>Sensors</b></h4>", )
+        vbox_list = [sensors_title]
+        for sensor in self.exp.apparatus.sensors:
+            self.sensors_dict[sensor] = self.draw_single_sensor(sensor)
+            self._plot_state[sensor] = {'rows': -1, 'next': 0.0, 'visible': True}
+            plot_list = [self.sensors_dict[sensor][key][0] for key in self.sensors_dict[sensor]]
+
+            rows = [widgets.HBox(plot_list[i:i + 3], layout=widgets.Layout(width='auto', height='310px'))
+                    for i in range(0, len(plot_list), 3)]
+            plot_box = widgets.VBox(rows)
+            # hidden plots are not refreshed
+            show_btn = widgets.ToggleButton(value=True, description=sensor.name, tooltip='Show or hide the plots',
+                                            icon='eye', layout=widgets.Layout(width='auto'))
+
+            def toggle(change, sensor=sensor, plot_box=plot_box):
+                visible = change['new']
+                plot_box.layout.display = None if visible else 'none'
+                self._plot_state[sensor].update(visible=visible, rows=-1, next=0.0)
+
+            show_btn.observe(toggle, names='value')
+            vbox_list += [show_btn, plot_box]
+
+        self.sensor_panel = widgets.VBox(vbox_list)
+
+    def start_jupyter_ui(self):
+        self.draw_exp_control()
+        self.draw_exp_info()
+        self.draw_device_ui()
+        self.draw_sensors()
+
+        display(self.exp_control_ui)
+        display(self.exp_info_ui)
+        display(self.sensor_panel)
+        display(self.devices_ui)
+
+        tmp_ui_thread = Thread(target=self.update_ui, args=(), name='UI update')
+        tmp_ui_thread.setDaemon(True)
+
+        tmp_ui_thread.start()
+        if self.exp.finished:
+            tmp_ui_thread.join()
@@ -0,0 +1,159 @@
+import gc
+import os
+import resource
+import time
+import tracemalloc
+from collections import Counter
+from threading import Thread, Event
+from typing import Union
+
+from loguru import logger
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class MemoryWatchdog:
+    """
+    Takes tracemalloc snapshots every `interval` seconds during a run and attributes the growth since the start to
+    Chemingon modules (the most recent Chemingon frame of each allocation) and to object types.
+    The report is rewritten to memory_report.txt in the experiment directory after every snapshot, and a warning is
+    logged when the traced memory grows faster than `threshold_mb_per_hour`.
+    tracemalloc slows down allocations; keep the watchdog for runs being investigated.
+    """
+
+    def __init__(self, interval: float = 600.0, threshold_mb_per_hour: float = 100.0, top: int = 15,
+                 nframes: int = 8):
+        self.interval = interval
+        self.threshold_mb_per_hour = threshold_mb_per_hour
+        self.top = top
+        self.nframes = nframes
+
+        self.samples: list[dict] = []  # time, traced and rss memory of every snapshot
+        self._baseline_modules: Counter = Counter()
+        self._baseline_types: Counter = Counter()
+        self._start_time: Union[None, float] = None
+        self._started_tracemalloc = False
+        self._stop = Event()
+        self._thread: Union[None, Thread] = None
+        self._directory: Union[None, str] = None
+        self.last_report: str = ''
+
+    @staticmethod
+    def _rss_mb() -> float:
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+        except (OSError, ValueError, IndexError):
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak, in KiB on linux
+
+    @staticmethod
+    def _by_module(snapshot: tracemalloc.Snapshot) -> Counter:
+        # allocations of the watchdog itself
+        snapshot = snapshot.filter_traces((tracemalloc.Filter(False, __file__),
+                                           tracemalloc.Filter(False, tracemalloc.__file__)))
+        result = Counter()
+        for stat in snapshot.statistics('traceback'):
+            owner = 'outside Chemingon'
+            for frame in reversed(stat.traceback):  # most recent first
+                if frame.filename.startswith(PACKAGE_DIR):
+                    owner = os.path.relpath(frame.filename, os.path.dirname(PACKAGE_DIR))
+                    break
+            result[owner] += stat.size
+        return result
+
+    @staticmethod
+    def _by_type() -> Counter:
+        result = Counter()
+        for obj in gc.get_objects():
+            tp = type(obj)
+            result[f'{tp.__module__}.{tp.__qualname__}'] += 1
+        return result
+
+    def start(self, directory: str):
+        self._directory = directory
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.nframes)
+            self._started_tracemalloc = True
+        self._start_time = time.time()
+        self.samples = []
+        self._baseline_modules = self._by_module(tracemalloc.take_snapshot())
+        self._baseline_types = self._by_type()
+        self._record_sample()
+        self._stop.clear()
+        self._thread = Thread(target=self._watch, name='Memory watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._start_time is not None:
+            self.check()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f'Memory watchdog: {e}')
+
+    def _record_sample(self) -> dict:
+        traced, peak = tracemalloc.get_traced_memory()
+        sample = {'time': time.time() - self._start_time, 'traced_mb': traced / 2 ** 20,
+                  'peak_mb': peak / 2 ** 20, 'rss_mb': self._rss_mb()}
+        self.samples.append(sample)
+        return sample
+
+    @property
+    def growth_mb_per_hour(self) -> float:
+        if len(self.samples) < 2 or self.samples[-1]['time'] <= 0:
+            return 0.0
+        first, last = self.samples[0], self.samples[-1]
+        return (last['traced_mb'] - first['traced_mb']) / ((last['time'] - first['time']) / 3600)
+
+    def check(self) -> str:
+        """Take a snapshot, rewrite the report and warn if memory grows too fast"""
+        if not tracemalloc.is_tracing():
+            return self.last_report
+        sample = self._record_sample()
+        modules = self._by_module(tracemalloc.take_snapshot())
+        types = self._by_type()
+
+        module_growth = Counter(modules)
+        module_growth.subtract(self._baseline_modules)
+        type_growth = Counter(types)
+        type_growth.subtract(self._baseline_types)
+
+        growth = self.growth_mb_per_hour
+        lines = [f'Memory report after {sample["time"] / 3600:.2f} h',
+                 f'traced {sample["traced_mb"]:.1f} MB (peak {sample["peak_mb"]:.1f} MB), rss {sample["rss_mb"]:.1f} MB',
+                 f'traced memory growth: {growth:.2f} MB/h (threshold {self.threshold_mb_per_hour} MB/h)',
+                 '', 'Growth by module (KB):']
+        for name, size in module_growth.most_common(self.top):
+            if size <= 0:
+                break
+            lines.append(f'  {size / 1024:>12.1f}  {name} (now {modules[name] / 1024:.1f})')
+        lines += ['', 'Growth by object type (count):']
+        for name, count in type_growth.most_common(self.top):
+            if count <= 0:
+                break
+            lines.append(f'  {count:>12d}  {name} (now {types[name]})')
+        lines += ['', 'Samples (h, traced MB, rss MB):']
+        for i in self.samples:
+            lines.append(f'  {i["time"] / 3600:.3f}, {i["traced_mb"]:.2f}, {i["rss_mb"]:.2f}')
+        self.last_report = '\n'.join(lines) + '\n'
+
+        if self._directory is not None:
+            os.makedirs(self._directory, exist_ok=True)
+            with open(f'{self._directory}/memory_report.txt', 'w') as f:
+                f.write(self.last_report)
+
+        if len(self.samples) >= 2 and growth > self.threshold_mb_per_hour:
+            top_module = module_growth.most_common(1)[0][0] if module_growth else None
+            logger.warning(f'Memory growing at {growth:.1f} MB/h, above {self.threshold_mb_per_hour} MB/h; '
+                           f'largest growth in {top_module}')
+        return self.last_report
@@ -0,0 +1,275 @@
+import bisect
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread, Event
+from typing import Union
+
+from loguru import logger
+
+from .operation import Operation
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0, 300.0, 1800.0)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    Counters, gauges and histograms rendered in the Prometheus text format.
+    Each update holds the lock only for a dictionary update.
+    """
+
+    def __init__(self, prefix: str = 'chemingon'):
+        self.prefix = prefix
+        self._lock = Lock()
+        self._counters: dict[str, dict[tuple, float]] = dict()
+        self._gauges: dict[str, dict[tuple, float]] = dict()
+        self._histograms: dict[str, dict[tuple, Histogram]] = dict()
+        self._help: dict[str, str] = dict()
+
+    def describe(self, name: str, text: str):
+        self._help[name] = text
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, dict())
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._gauges.setdefault(name, dict())[key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, dict())
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    def get(self, name: str, **labels) -> float:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            for kind in (self._counters, self._gauges):
+                if name in kind and key in kind[name]:
+                    return kind[name][key]
+        return 0.0
+
+    @staticmethod
+    def _format_labels(key: tuple, extra: tuple = ()) -> str:
+        items = list(key) + list(extra)
+        if not items:
+            return ''
+        text = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                        for k, v in items)
+        return '{' + text + '}'
+
+    def collect(self):
+        """Update the gauges computed at scrape time; override in subclasses"""
+        pass
+
+    def render(self) -> str:
+        self.collect()
+        lines = []
+        with self._lock:
+            for kind, type_name in ((self._counters, 'counter'), (self._gauges, 'gauge')):
+                for name, series in sorted(kind.items()):
+                    full_name = f'{self.prefix}_{name}'
+                    if name in self._help:
+                        lines.append(f'# HELP {full_name} {self._help[name]}')
+                    lines.append(f'# TYPE {full_name} {type_name}')
+                    for key, value in series.items():
+                        lines.append(f'{full_name}{self._format_labels(key)} {value}')
+            for name, series in sorted(self._histograms.items()):
+                full_name = f'{self.prefix}_{name}'
+                if name in self._help:
+                    lines.append(f'# HELP {full_name} {self._help[name]}')
+                lines.append(f'# TYPE {full_name} histogram')
+                for key, hist in series.items():
+                    cumulative = 0
+                    for bound, count in zip(list(hist.buckets) + ['+Inf'], hist.counts):
+                        cumulative += count
+                        lines.append(f'{full_name}_bucket{self._format_labels(key, (("le", bound),))} {cumulative}')
+                    lines.append(f'{full_name}_sum{self._format_labels(key)} {hist.sum}')
+                    lines.append(f'{full_name}_count{self._format_labels(key)} {hist.count}')
+        return '\n'.join(lines) + '\n'
+
+
+class ExperimentMetrics(Metrics):
+    """
+    Live metrics of an Experiment, fed by its hooks: public device queue depth and busy time, channel utilisation,
+    sensor sample counts and missed deadlines, errors and UI refresh cost.
+    Served on http://127.0.0.1:<port>/metrics while the experiment runs, and written to metrics.prom in the
+    experiment directory every snapshot_interval seconds.
+    """
+
+    def __init__(self, exp, port: Union[int, None] = 9108, snapshot_interval: float = 10.0):
+        super().__init__()
+        self.exp = exp
+        self.port = port
+        self.snapshot_interval = snapshot_interval
+        self._server: Union[None, ThreadingHTTPServer] = None
+        self._stop = Event()
+        self._snapshot_thread: Union[None, Thread] = None
+        self._channel_depth: dict = dict()
+        self._channel_since: dict = dict()
+
+        self.describe('public_queue_depth', 'Tasks waiting for a public device')
+        self.describe('public_busy_seconds_total', 'Time public devices spent executing operations')
+        self.describe('operations_total', 'Operations executed')
+        self.describe('operation_duration_seconds', 'Execution time of operations')
+        self.describe('queue_wait_seconds', 'Time operations waited in the queue of a public device')
+        self.describe('channel_busy_seconds_total', 'Time channels spent executing protocols')
+        self.describe('channel_utilisation', 'Fraction of the run time channels spent executing protocols')
+        self.describe('sensor_samples_total', 'Sensor samples recorded')
+        self.describe('sensor_missed_deadlines_total', 'Sensor updates taking longer than the sampling interval')
+        self.describe('sensor_sample_duration_seconds', 'Time taken by sensor updates')
+        self.describe('errors_total', 'Errors raised in the experiment')
+        self.describe('ui_refresh_seconds', 'Time taken by one refresh of the user interface')
+
+        hooks = exp.hooks
+        hooks.register('operation_start', self._on_operation_start)
+        hooks.register('operation_end', self._on_operation_end)
+        hooks.register('protocol_start', self._on_protocol_start)
+        hooks.register('protocol_end', self._on_protocol_end)
+        hooks.register('sensor_sample', self._on_sensor_sample)
+        hooks.register('error', self._on_error)
+
+    def _on_operation_start(self, op, protocol):
+        enqueue_time = getattr(op, 'enqueue_time', None)
+        if enqueue_time is not None:
+            self.observe('queue_wait_seconds', self.exp.tracer.now() - enqueue_time, device=op.device.name)
+
+    def _on_operation_end(self, op, protocol, outcome, duration):
+        device = op.device.name if isinstance(op, Operation) else 'virtual'
+        self.inc('operations_total', device=device, outcome='done' if outcome == 'done' else 'error')
+        self.observe('operation_duration_seconds', duration, device=device)
+        if isinstance(op, Operation) and op.device.is_public:
+            self.inc('public_busy_seconds_total', duration, device=device)
+
+    def _on_protocol_start(self, protocol):
+        channel = protocol.channel
+        with self._lock:
+            depth = self._channel_depth.get(channel, 0)
+            if depth == 0:
+                self._channel_since[channel] = time.time()
+            self._channel_depth[channel] = depth + 1
+
+    def _on_protocol_end(self, protocol, outcome):
+        channel = protocol.channel
+        with self._lock:
+            depth = self._channel_depth.get(channel, 1) - 1
+            self._channel_depth[channel] = depth
+            since = self._channel_since.pop(channel, None) if depth == 0 else None
+        if since is not None:
+            self.inc('channel_busy_seconds_total', time.time() - since, channel=channel)
+
+    def _on_sensor_sample(self, sensor, duration):
+        self.inc('sensor_samples_total', sensor=sensor.name)
+        self.observe('sensor_sample_duration_seconds', duration, sensor=sensor.name)
+        if duration > sensor.interval:
+            self.inc('sensor_missed_deadlines_total', sensor=sensor.name)
+
+    def _on_error(self, error_info):
+        device = None if error_info.device is None else error_info.device.name
+        self.inc('errors_total', type=type(error_info.error).__name__, device=device,
+                 fatal=bool(error_info.fatality))
+
+    def observe_ui_refresh(self, duration: float):
+        self.observe('ui_refresh_seconds', duration)
+
+    def collect(self):
+        exp = self.exp
+        for device in list(exp.apparatus.publicComponents):
+            pending = exp.public_pending.get(device, [])
+            self.set('public_queue_depth', device.taskQueue.qsize() + len(pending), device=device.name)
+        if exp.timer_start is not None:
+            elapsed = time.time() - exp.timer_start
+            self.set('uptime_seconds', elapsed)
+            with self._lock:
+                busy = dict(self._counters.get('channel_busy_seconds_total', dict()))
+                running = dict(self._channel_since)
+            now = time.time()
+            for channel in range(1, exp.channels + 1):
+                total = busy.get((('channel', channel),), 0.0)
+                if channel in running:
+                    total += now - running[channel]
+                self.set('channel_utilisation', total / elapsed if elapsed > 0 else 0.0, channel=channel)
+        # the final snapshot is written by stop(), once the run is over but before exp.is_running is cleared
+        self.set('experiment_running', float(exp.is_running and not self._stop.is_set()))
+        self.set('live_protocols', float(len(exp.live_protocol)))
+
+    def start(self, directory: str = None):
+        self._stop.clear()
+        if self.port is not None and self._server is None:
+            metrics = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split('?')[0] not in ('/', '/metrics'):
+                        self.send_error(404)
+                        return
+                    body = metrics.render().encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            try:
+                self._server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+                self._server.daemon_threads = True
+                Thread(target=self._server.serve_forever, name='Metrics server', daemon=True).start()
+                logger.info(f'Metrics served on http://127.0.0.1:{self._server.server_address[1]}/metrics')
+            except OSError as e:
+                logger.error(f'Metrics server not started on port {self.port}: {e}')
+                self._server = None
+
+        if directory is not None and self.snapshot_interval is not None:
+            self._snapshot_thread = Thread(target=self._snapshot_loop, args=(directory,), name='Metrics snapshot',
+                                           daemon=True)
+            self._snapshot_thread.start()
+
+    def _snapshot_loop(self, directory: str):
+        while not self._stop.wait(self.snapshot_interval):
+            self.snapshot(directory)
+
+    def snapshot(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        tmp_name = f'{directory}/metrics.prom.tmp'
+        with open(tmp_name, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_name, f'{directory}/metrics.prom')
+
+    @property
+    def server_port(self) -> Union[None, int]:
+        return None if self._server is None else self._server.server_address[1]
+
+    def stop(self, directory: str = None):
+        self._stop.set()
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+        if directory is not None:
+            self.snapshot(directory)
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
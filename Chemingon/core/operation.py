@@ -1,8 +1,13 @@
+import time
+
 from ..components.stdlib import component
 from queue import Queue
+from threading import Event
 
 
 class Operation:
+    __slots__ = ('device', 'command', 'wait', 'kwargs', 'is_done', 'description', 'enqueue_time')
+
     def __init__(self, device: component.Component, cmd: str, wait: bool = False, description: str = None,
                  kwargs: dict = {}):
 
@@ -19,6 +24,7 @@ class Operation:
         self.kwargs = kwargs
         self.is_done = False
         self.description = description
+        self.enqueue_time = None  # Tracer.now() when put in the queue of a public device
 
     def __repr__(self):
         return f"<{self.__class__.__name__}; device:{self.device}; command: {self.command}; description {self.description}>"
@@ -28,11 +34,17 @@ class Operation:
 
 
 class VirtualDevice(component.Component):
+    """
+    Executes the virtual operations (delays, waits) of all the protocols of an apparatus.
+    force_terminate_operation() stops the virtual operations running at the time; the ones started later run normally.
+    """
+
     def terminate(self):
         pass
 
     def __init__(self):
         super().__init__('Virtual Operation')
+        self._epoch = 0  # incremented by each force termination
 
     def base_state(self):
         pass
@@ -43,35 +55,47 @@ class VirtualDevice(component.Component):
     def close(self):
         pass
 
-    def sleep(self, seconds: float):
-        ret = self._sleep(seconds)
-        if self._force_terminated:
-            self.log(f"Force terminated while doing {self.current_op}")
-        return ret
+    def sleep(self, seconds: float, epoch: int = None, doing: str = None):
+        """
+        force termination aware version of time.sleep();
+        :param epoch: self._epoch when the virtual operation started; terminated if it changed since
+        :param doing: description of the operation, for the log
+        :return: time slept
+        """
+        epoch = self._epoch if epoch is None else epoch
+        start_time = time.time()
+        while time.time() - start_time < seconds and self._epoch == epoch:
+            time.sleep(0.01)
+        if self._epoch != epoch:
+            self.log("Force terminated while doing {}", doing)
+            raise RuntimeError(f'{self.name}: force terminated')
+        return time.time() - start_time
 
     def force_terminate_operation(self):
-        self._force_terminated = True
+        self._epoch += 1
+
+
+_default_device = VirtualDevice()  # for virtual operations not added to a protocol
 
 
 class VirtualOperation:
+    __slots__ = ('cmd', 'kwargs', 'is_done', 'description', 'device')
+
     def __init__(self, cmd: str, description: str = None, kwargs: dict = None):
         self.cmd = cmd
         self.kwargs = kwargs
         self.is_done = False
         self.description = description
-        self.device = VirtualDevice()
+        self.device: VirtualDevice = _default_device  # replaced by the one of the apparatus in Protocol
 
     def wait_for_operation(self, op: Operation):
-        self.device.current_op = f'Wait for operation {op.command} on {op.device}'
+        epoch, doing = self.device._epoch, f'Wait for operation {op.command} on {op.device}'
         while not op.is_done:
-            self.device.sleep(0.01)
+            self.device.sleep(0.01, epoch, doing)
             # wait until completed
-        self.device.current_op = None
 
     def delay(self, seconds: float):
-        self.device.current_op = f"Delay {seconds} seconds"
-        self.device.sleep(seconds)
-        self.device.current_op = None
+        self.device.sleep(seconds, doing=f"Delay {seconds} seconds")
 
     @property
     def command(self):
@@ -87,5 +111,19 @@ class VirtualOperation:
 class PublicBlocker:
     def __init__(self):
         self.block_request: bool = True
-        self.block_ready: bool = False
         self.taskQueue: Queue = Queue()
+        self._ready = Event()
+
+    @property
+    def block_ready(self) -> bool:
+        return self._ready.is_set()
+
+    @block_ready.setter
+    def block_ready(self, value: bool):
+        if value:
+            self._ready.set()
+        else:
+            self._ready.clear()
+
+    def wait_ready(self, timeout: float = None) -> bool:
+        return self._ready.wait(timeout)
@@ -0,0 +1,197 @@
+import linecache
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from threading import Thread, Event
+from typing import Union
+
+from loguru import logger
+
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# thread name prefix -> role; names are given by Experiment and JupyterUI
+ROLE_PREFIXES = (('Channel ', 'channel'), ('Branch ', 'channel'), ('Public ', 'public'), ('Sensor ', 'sensor'),
+                 ('UI ', 'ui'), ('Supervisor', 'supervisor'), ('Metrics ', 'instrumentation'),
+                 ('Memory ', 'instrumentation'), ('Profiler', 'instrumentation'),
+                 ('Event log', 'instrumentation'))
+
+# a frame whose current line contains one of these is blocked rather than using CPU
+WAIT_CALLS = ('sleep(', '.wait(', 'wait_for(', '.get(', '.join(', '.acquire(', 'select(', '.read(', 'readline(',
+              '.recv(', 'accept(')
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler of all threads, using sys._current_frames() every `interval` seconds.
+    Threads are tagged by role (channel, public, sensor, ui, supervisor, instrumentation, other) and their stacks are
+    aggregated into the collapsed format of flamegraph.pl / speedscope, one 'role;frame;frame... count' per line.
+    Stacks of blocked threads (sleep, wait, queue get, serial read...) end with a '[waiting]' frame.
+    The stack of a thread is only walked again when its innermost frame has moved, so idle threads cost almost nothing.
+    """
+
+    def __init__(self, exp=None, interval: float = 0.05, max_depth: int = 64, per_thread: bool = False):
+        self.exp = exp
+        self.interval = interval
+        self.max_depth = max_depth
+        self.per_thread = per_thread  # thread name after the role in the stacks
+
+        self.counts: Counter = Counter()  # (role, thread name or None, frames, waiting) -> samples
+        self.n_samples = 0
+        self.sampling_time = 0.0  # time spent in sample(), i.e. the overhead
+        self._labels: dict = dict()
+        self._waiting: dict = dict()
+        self._last: dict = dict()  # thread ident -> (frame, lineno, key)
+        self._names: dict[int, str] = dict()
+        self._stop = Event()
+        self._thread: Union[None, Thread] = None
+        self._directory: Union[None, str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def role_of(self, ident: int, name: str) -> str:
+        if self.exp is not None and ident == getattr(self.exp, 'supervisor_ident', None):
+            return 'supervisor'
+        for prefix, role in ROLE_PREFIXES:
+            if name.startswith(prefix):
+                return role
+        return 'other'
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            filename = code.co_filename
+            if filename.startswith(PACKAGE_PARENT):
+                filename = os.path.relpath(filename, PACKAGE_PARENT)
+            else:
+                filename = os.path.basename(filename)
+            name = getattr(code, 'co_qualname', code.co_name)
+            label = f'{name} ({filename}:{code.co_firstlineno})'.replace(';', ',')
+            self._labels[code] = label
+        return label
+
+    def _is_waiting(self, code, lineno: int) -> bool:
+        key = (code, lineno)
+        waiting = self._waiting.get(key)
+        if waiting is None:
+            line = linecache.getline(code.co_filename, lineno)
+            waiting = any(i in line for i in WAIT_CALLS)
+            self._waiting[key] = waiting
+        return waiting
+
+    def sample(self):
+        start = time.perf_counter()
+        own = threading.get_ident()
+        frames = sys._current_frames()
+        if frames.keys() != self._names.keys():
+            self._names = {i.ident: i.name for i in threading.enumerate()}
+        last = dict()
+        for ident, frame in frames.items():
+            if ident == own:
+                continue
+            lineno = frame.f_lineno
+            cached = self._last.get(ident)
+            if cached is not None and cached[0] is frame and cached[1] == lineno:
+                key = cached[2]
+            else:
+                name = self._names.get(ident, str(ident))
+                stack = []
+                f = frame
+                while f is not None and len(stack) < self.max_depth:
+                    stack.append(self._label(f.f_code))
+                    f = f.f_back
+                stack.reverse()
+                key = (self.role_of(ident, name), name if self.per_thread else None, tuple(stack),
+                       self._is_waiting(frame.f_code, lineno))
+            last[ident] = (frame, lineno, key)
+            self.counts[key] += 1
+        self._last = last
+        self.n_samples += 1
+        self.sampling_time += time.perf_counter() - start
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f'Profiler: {e}')
+
+    def start(self, directory: str = None):
+        """
+        Start sampling; can also be called while the experiment is running
+        :param directory: the profile is saved in it when stopped
+        """
+        if self._thread is not None:
+            return
+        self._directory = directory
+        self._stop.clear()
+        self._thread = Thread(target=self._loop, name='Profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Union[None, str]:
+        """
+        Stop sampling and save the profile in the directory given to start()
+        :return: name of the collapsed stack file, None if not saved
+        """
+        if self._thread is None:
+            return None
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._last = dict()  # frames must not be kept alive
+        if self._directory is None:
+            return None
+        filename = self.export(f'{self._directory}/profile.folded')
+        with open(f'{self._directory}/profile_summary.txt', 'w') as f:
+            f.write(self.summary())
+        return filename
+
+    def reset(self):
+        self.counts = Counter()
+        self.n_samples = 0
+        self.sampling_time = 0.0
+
+    def collapsed(self, include_waiting: bool = True) -> list[str]:
+        merged = Counter()
+        for (role, name, stack, waiting), count in list(self.counts.items()):
+            if waiting and not include_waiting:
+                continue
+            frames = [role] + ([name.replace(';', ',')] if name is not None else []) + list(stack)
+            if waiting:
+                frames.append('[waiting]')
+            merged[';'.join(frames)] += count
+        return [f'{stack} {count}' for stack, count in merged.most_common()]
+
+    def export(self, filename: str, include_waiting: bool = True) -> str:
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        with open(filename, 'w') as f:
+            f.write('\n'.join(self.collapsed(include_waiting)) + '\n')
+        return filename
+
+    def by_role(self) -> dict[str, dict[str, int]]:
+        result = dict()
+        for (role, name, stack, waiting), count in list(self.counts.items()):
+            entry = result.setdefault(role, {'samples': 0, 'busy': 0})
+            entry['samples'] += count
+            if not waiting:
+                entry['busy'] += count
+        return result
+
+    def summary(self, top: int = 10) -> str:
+        lines = [f'{self.n_samples} samples every {self.interval} s, '
+                 f'sampling overhead {self.sampling_time / max(self.n_samples, 1) * 1e3:.3f} ms per sample',
+                 '', 'Busy samples by role:']
+        for role, entry in sorted(self.by_role().items(), key=lambda x: -x[1]['busy']):
+            lines.append(f'  {role:<16} {entry["busy"]:>8} busy / {entry["samples"]:>8} '
+                         f'({entry["busy"] / entry["samples"] * 100:.1f}%)')
+        leaves = Counter()
+        for (role, name, stack, waiting), count in list(self.counts.items()):
+            if not waiting and stack:
+                leaves[f'{role}: {stack[-1]}'] += count
+        lines += ['', 'Busiest frames:']
+        for leaf, count in leaves.most_common(top):
+            lines.append(f'  {count:>8}  {leaf}')
+        return '\n'.join(lines) + '\n'
@@ -1,25 +1,89 @@
+import itertools
+
 from .apparatus import Apparatus
 from ..components.stdlib import component
 from typing import Union
 from .operation import Operation, VirtualOperation
 
 
+class _StateField:
+    """Attribute of a Protocol published to the StateStore of the experiment executing it whenever assigned"""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.slot = owner.__dict__[f'_{name}']  # slot holding the value
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return self.slot.__get__(instance, owner)
+
+    def __set__(self, instance, value):
+        self.slot.__set__(instance, value)
+        if instance.state_store is not None:
+            instance.state_store.publish('protocol', instance.uid, {self.name: value})
+
+
+class ParallelBlock:
+    """
+    Sub protocols executed concurrently within a protocol.
+    wait = 'all': the next step starts when all branches are finished;
+    wait = 'any': the next step starts as soon as one branch is finished; the other branches are stopped at their next
+    step, finishing the step in progress meanwhile, and are joined before the protocol containing the block ends.
+    """
+
+    def __init__(self, branches: list, wait: str = 'all', description: str = None):
+        if wait not in ('all', 'any'):
+            raise ValueError(f"wait must be 'all' or 'any', got {wait}")
+        self.branches: list[Protocol] = branches
+        self.wait = wait
+        self.description = description
+
+    @property
+    def name(self):
+        return ' | '.join(i.name for i in self.branches)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}; wait {self.wait}; branches: {self.name}>"
+
+    def __str__(self):
+        return f"<{self.__class__.__name__}; wait {self.wait}; branches: {self.name}>"
+
+
 class Protocol:
     """
     Instructions for a process.
     """
 
+    __slots__ = ('state_store', 'uid', 'apparatus', 'name', 'description', '_components', 'procedures', '_progress',
+                 '_current_op', '_current_description', '_finished', '_paused', 'start_time', 'end_time', '_channel',
+                 'block_public', 'public_set', '__weakref__')
+    # published to the StateStore of the experiment executing the protocol whenever they are assigned
+    STATE_FIELDS = ('progress', 'current_op', 'current_description', 'finished', 'paused', 'channel')
+    progress = _StateField()
+    current_op = _StateField()
+    current_description = _StateField()
+    finished = _StateField()
+    paused = _StateField()
+    channel = _StateField()
+    _uids = itertools.count(1)
+
     def __init__(self, apparatus: Apparatus, name: str, description: str = None, block_public: bool = False):
+        self.state_store = None  # StateStore of the experiment executing the protocol
+        self.uid: int = next(Protocol._uids)  # key of the protocol in the StateStore
         self.apparatus: Apparatus = apparatus
         self.name: str = name
         self.description = description
-        self.component_list = []
-        self.procedures: list[Union[Operation, VirtualOperation, Protocol]] = []
+        self._components: dict[component.Component, None] = dict()  # devices used, in order of first use
+        self.procedures: list[Union[Operation, VirtualOperation, Protocol, ParallelBlock]] = []
         self.progress = 0
         self.current_op = None
         self.current_description = None
         self.finished = False
         self.paused = False
+        self.start_time: Union[None, float] = None  # time.time() when execution started and ended
+        self.end_time: Union[None, float] = None
+        self.channel: Union[None, int] = None  # channel executing the protocol
 
         self.block_public = block_public
         self.public_set = set()
@@ -29,6 +93,18 @@ class Protocol:
             raise TypeError(f"Must pass an Apparatus object. Got {type(apparatus)}, which is not an instance of "
                             f"Apparatus.")
 
+    @property
+    def component_list(self) -> list[component.Component]:
+        """Devices used by the protocol and its sub protocols, each listed once"""
+        return list(self._components)
+
+    def state(self) -> dict:
+        """Fields published to the StateStore"""
+        return {'name': self.name, 'description': self.description, 'total': len(self.procedures),
+                'progress': self.progress, 'current_op': self.current_op,
+                'current_description': self.current_description, 'finished': self.finished, 'paused': self.paused,
+                'channel': self.channel}
+
     def __repr__(self):
         return f"<{self.__str__()}>"
 
@@ -51,19 +127,38 @@ class Protocol:
 
         self.procedures.append(op)
         if not isinstance(op, VirtualOperation):
-            self.component_list.append(op.device)
+            self._components[op.device] = None
             if op.device.is_public:
                 self.public_set.add(op.device)
         else:
-            self.apparatus.virtual_devices.add(op.device)
+            op.device = self.apparatus.virtual_device
         return op
 
     def add_sub_protocol(self, sub_protocol):
         assert isinstance(sub_protocol, Protocol)
         self.procedures.append(sub_protocol)
         self.public_set = sub_protocol.public_set | self.public_set
-        self.component_list += sub_protocol.component_list
-
+        self._components.update(sub_protocol._components)
+
+    def add_parallel(self, branches: list, wait: str = 'all', description: str = None) -> ParallelBlock:
+        """
+        Add sub protocols to be executed at the same time;
+        :param branches: list of Protocol, each executed in its own thread
+        :param wait: 'all' to join all branches, 'any' to continue once the first branch finishes
+        :param description: description of the step
+        :return: the ParallelBlock added
+        """
+        if len(branches) == 0:
+            raise ValueError('A parallel block needs at least one branch')
+        for i in branches:
+            if not isinstance(i, Protocol):
+                raise TypeError(f"{i} must be an instance of Protocol")
+        block = ParallelBlock(list(branches), wait=wait, description=description)
+        self.procedures.append(block)
+        for i in branches:
+            self.public_set = i.public_set | self.public_set
+            self._components.update(i._components)
+        return block
 
     def add_operation(self, op: Union[list[Union[Operation, VirtualOperation]], Operation, VirtualOperation],
                       description: str = None):
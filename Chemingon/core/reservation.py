@@ -0,0 +1,139 @@
+import time
+from threading import Condition
+from typing import Union
+
+from loguru import logger
+
+from ..components.stdlib.component import Component
+
+
+class Reservation:
+    """
+    A request for exclusive use of a set of public components.
+    """
+
+    def __init__(self, owner, devices: set[Component]):
+        self.owner = owner
+        self.devices: frozenset[Component] = frozenset(devices)
+        self.request_time = time.time()
+        self.grant_time: Union[None, float] = None
+        self.granted = False
+
+    @property
+    def wait_time(self) -> float:
+        if self.grant_time is None:
+            return time.time() - self.request_time
+        return self.grant_time - self.request_time
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}; owner: {self.owner}; devices: {set(self.devices)}>"
+
+
+class ResourceManager:
+    """
+    Grants the public components of a block_public protocol all at once.
+    A reservation is granted only when every requested device is free and no earlier waiting reservation
+    overlaps it, so a channel never holds part of a set (no deadlock) and requests are served first come,
+    first served (no starvation).
+    """
+
+    def __init__(self):
+        self._condition = Condition()
+        self._holders: dict[Component, Reservation] = dict()
+        self._waiting: list[Reservation] = []
+
+        # owner name: {'count', 'total', 'max'} of the waiting times of its reservations, since reset()
+        self.wait_stats: dict[str, dict[str, float]] = dict()
+
+    def _can_grant(self, reservation: Reservation) -> bool:
+        for device in reservation.devices:
+            if device in self._holders:
+                return False
+        for earlier in self._waiting:
+            if earlier is reservation:
+                break
+            if earlier.devices & reservation.devices:
+                return False
+        return True
+
+    def request(self, owner, devices: set[Component]) -> Reservation:
+        """
+        Queue up a reservation without waiting for it;
+        :param owner: the protocol requesting the devices
+        :param devices: public components to be reserved
+        :return: the reservation, to be passed to acquire() and release()
+        """
+        reservation = Reservation(owner, devices)
+        with self._condition:
+            self._waiting.append(reservation)
+        return reservation
+
+    def acquire(self, reservation: Reservation, timeout: float = None) -> bool:
+        """
+        Wait until the reservation is granted; woken up whenever another reservation is released.
+        :param reservation: returned by request()
+        :param timeout: maximum time to wait in seconds; wait forever if None
+        :return: True if granted
+        """
+        with self._condition:
+            if reservation.granted:
+                return True
+            granted = self._condition.wait_for(lambda: self._can_grant(reservation), timeout=timeout)
+            if granted:
+                self._waiting.remove(reservation)
+                for device in reservation.devices:
+                    self._holders[device] = reservation
+                reservation.granted = True
+                reservation.grant_time = time.time()
+                # later reservations queued behind this one may be grantable now
+                self._condition.notify_all()
+                self._record_wait(str(getattr(reservation.owner, 'name', reservation.owner)), reservation.wait_time)
+            return granted
+
+    def _record_wait(self, owner: str, wait_time: float):
+        stat = self.wait_stats.get(owner)
+        if stat is None:
+            self.wait_stats[owner] = {'count': 1, 'total': wait_time, 'max': wait_time}
+        else:
+            stat['count'] += 1
+            stat['total'] += wait_time
+            stat['max'] = max(stat['max'], wait_time)
+
+    def reset(self):
+        """Forget the waiting times, at the start of a run"""
+        with self._condition:
+            self.wait_stats = dict()
+
+    def release(self, reservation: Reservation):
+        """
+        Release the devices of a granted reservation, or withdraw a reservation still waiting.
+        """
+        with self._condition:
+            if reservation.granted:
+                for device in reservation.devices:
+                    if self._holders.get(device) is reservation:
+                        del self._holders[device]
+                reservation.granted = False
+            elif reservation in self._waiting:
+                self._waiting.remove(reservation)
+            self._condition.notify_all()
+
+    def holder(self, device: Component) -> Union[None, Reservation]:
+        with self._condition:
+            return self._holders.get(device)
+
+    @property
+    def total_wait_time(self) -> float:
+        return sum(i['total'] for i in self.wait_stats.values())
+
+    def report(self) -> dict[str, dict[str, float]]:
+        """
+        :return: {owner name: {'count', 'total', 'max'}} of the time spent waiting for reservations, in seconds
+        """
+        with self._condition:
+            return {owner: dict(stat) for owner, stat in self.wait_stats.items()}
+
+    def log_report(self):
+        for owner, stat in self.report().items():
+            logger.info(f"Reservation wait of {owner}: {stat['count']} reservation(s), "
+                        f"total {stat['total']:.3f}s, max {stat['max']:.3f}s")
@@ -0,0 +1,75 @@
+from typing import Union
+
+from ..components.stdlib.component import Component
+from .operation import Operation, VirtualOperation, PublicBlocker
+
+
+class PendingTask:
+    """
+    A task waiting in the queue of a public device.
+    """
+
+    def __init__(self, task: Union[Operation, VirtualOperation, PublicBlocker], protocol):
+        self.task = task
+        self.protocol = protocol
+        self.bypassed = 0  # number of times a later task was executed first
+
+
+class QueuePolicy:
+    """
+    Decides which pending task a public device executes next. First come, first served by default.
+    """
+
+    def select(self, device: Component, pending: list[PendingTask]) -> int:
+        """
+        :param device: the public device
+        :param pending: pending tasks, in the order they were queued; never empty
+        :return: index of the task to be executed next
+        """
+        return 0
+
+
+class SetupAwarePolicy(QueuePolicy):
+    """
+    Reorders the pending operations of a public device to reduce the setup cost declared by the device
+    (Component.setup_state and Component.setup_cost), e.g. grouping operations on the same valve position.
+    Only the first `window` tasks are considered, a task is never bypassed more than `max_bypass` times,
+    tasks of the same protocol keep their order, and nothing is moved across a PublicBlocker.
+    """
+
+    def __init__(self, window: int = 8, max_bypass: int = 4):
+        assert window >= 1 and max_bypass >= 0
+        self.window = window
+        self.max_bypass = max_bypass
+
+    def select(self, device: Component, pending: list[PendingTask]) -> int:
+        candidates = []
+        seen_protocols = set()
+        for idx, item in enumerate(pending[:self.window]):
+            if isinstance(item.task, PublicBlocker):
+                if idx == 0:
+                    return 0
+                break
+            if item.bypassed >= self.max_bypass:
+                # fairness bound reached: the oldest starving task goes first
+                return idx
+            if id(item.protocol) in seen_protocols:
+                continue
+            seen_protocols.add(id(item.protocol))
+            candidates.append(idx)
+
+        best_idx = 0
+        best_cost = None
+        for idx in candidates:
+            item = pending[idx]
+            if not isinstance(item.task, Operation):
+                cost = 0.0
+            else:
+                state = device.setup_state(item.task.command, item.task.kwargs)
+                cost = 0.0 if state is None else device.setup_cost(device.last_setup_state, state)
+            if best_cost is None or cost < best_cost:
+                best_idx, best_cost = idx, cost
+
+        for item in pending[:best_idx]:
+            item.bypassed += 1
+        return best_idx
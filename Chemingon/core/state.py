@@ -0,0 +1,98 @@
+from threading import Condition
+from typing import Hashable, Union
+
+
+class StateStore:
+    """
+    Versioned state of a running experiment, written by the execution threads and read by user interfaces.
+    Each entry is identified by a kind ('experiment', 'protocol', 'device', 'sensor') and a key, and holds a small
+    dict of fields. publish() merges the fields that changed and increments the version; a UI remembers the last
+    version it rendered and asks for changes_since() that version, so its work grows with the activity of the
+    experiment rather than with the size of the apparatus.
+    """
+
+    def __init__(self, history: int = 10000):
+        self.history = history  # number of changes kept for changes_since()
+        self._cond = Condition()
+        self._version = 0
+        self._state: dict[tuple[str, Hashable], dict] = dict()
+        self._log: list[tuple[str, Hashable, Union[None, dict]]] = []  # change of version _log_start + index
+        self._log_start = 1
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def _append(self, kind: str, key: Hashable, fields: Union[None, dict]):
+        self._version += 1
+        self._log.append((kind, key, fields))
+        if len(self._log) > 2 * self.history:
+            drop = len(self._log) - self.history
+            del self._log[:drop]
+            self._log_start += drop
+        self._cond.notify_all()
+
+    def publish(self, kind: str, key: Hashable, fields: dict) -> int:
+        """
+        Merge the fields into the entry, creating it if needed
+        :return: version of the store after the update
+        """
+        with self._cond:
+            entry = self._state.get((kind, key))
+            if entry is None:
+                entry = self._state[(kind, key)] = dict()
+                changes = dict(fields)
+            else:
+                changes = {name: value for name, value in fields.items()
+                           if name not in entry or entry[name] != value}
+            if changes:
+                entry.update(changes)
+                self._append(kind, key, changes)
+            return self._version
+
+    def remove(self, kind: str, key: Hashable):
+        """Drop an entry; reported as a change with fields None"""
+        with self._cond:
+            if self._state.pop((kind, key), None) is not None:
+                self._append(kind, key, None)
+
+    def get(self, kind: str, key: Hashable) -> Union[None, dict]:
+        with self._cond:
+            entry = self._state.get((kind, key))
+            return None if entry is None else dict(entry)
+
+    def snapshot(self) -> tuple[int, dict[tuple[str, Hashable], dict]]:
+        with self._cond:
+            return self._version, {i: dict(j) for i, j in self._state.items()}
+
+    def changes_since(self, version: int) -> tuple[int, dict[tuple[str, Hashable], Union[None, dict]], bool]:
+        """
+        :param version: last version seen by the caller, 0 for everything
+        :return: current version, {(kind, key): fields changed since, None if removed}, and whether these are instead
+                 the full entries, replacing everything the caller has: when the changes since that version are no
+                 longer kept, or when an entry was removed and created again since
+        """
+        with self._cond:
+            if version >= self._version:
+                return self._version, dict(), False
+            if version + 1 >= self._log_start:
+                changes = dict()
+                for kind, key, fields in self._log[version + 1 - self._log_start:]:
+                    previous = changes.get((kind, key), ())
+                    if fields is None:
+                        changes[(kind, key)] = None
+                    elif previous is None:
+                        break  # created again after its removal; its old fields must not be merged
+                    else:
+                        changes[(kind, key)] = {**previous, **fields} if previous else dict(fields)
+                else:
+                    return self._version, changes, False
+            return self._version, {i: dict(j) for i, j in self._state.items()}, True
+
+    def wait(self, version: int, timeout: float = None) -> bool:
+        """
+        Block until the version is greater than the given one
+        :return: False if timed out
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._version > version, timeout)
@@ -0,0 +1,179 @@
+import itertools
+from typing import Union, Iterable, Iterator
+
+from ..components.stdlib import component
+from .apparatus import Apparatus
+from .operation import Operation, VirtualOperation
+from .protocol import Protocol
+
+
+class Param:
+    """
+    Placeholder for a parameter in the kwargs of a ProtocolTemplate, filled in when the template is instantiated.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.name}>"
+
+
+class TemplateStep:
+    """
+    A step of a ProtocolTemplate; can be used in the kwargs of later steps (e.g. wait_for_operation) to refer to
+    the operation created from this step.
+    """
+
+    def __init__(self, kind: str, device: Union[None, component.Component], cmd: str, wait: bool,
+                 description: str, kwargs: dict):
+        self.kind = kind  # 'operation' or 'virtual'
+        self.device = device
+        self.cmd = cmd
+        self.wait = wait
+        self.description = description
+        self.kwargs = kwargs
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}; {self.kind}; device: {self.device}; command: {self.cmd}>"
+
+
+class ProtocolTemplate:
+    """
+    A protocol with parameter placeholders. Only the steps are stored; Protocol objects are built on demand by
+    instantiate(), so a campaign of any length never keeps more than the running protocols in memory.
+    Names and descriptions may contain str.format fields, e.g. 'screening {temperature}C'.
+    """
+
+    def __init__(self, apparatus: Apparatus, name: str, description: str = None, block_public: bool = False):
+        if not isinstance(apparatus, Apparatus):
+            raise TypeError(f"Must pass an Apparatus object. Got {type(apparatus)}, which is not an instance of "
+                            f"Apparatus.")
+        self.apparatus = apparatus
+        self.name = name
+        self.description = description
+        self.block_public = block_public
+        self.steps: list[Union[TemplateStep, ProtocolTemplate, tuple]] = []
+
+    def __repr__(self):
+        return f"<{self.__str__()}>"
+
+    def __str__(self):
+        return f"ProtocolTemplate {self.name} defined over {repr(self.apparatus)}"
+
+    def quick_add(self, device: component.Component, cmd: str, wait: bool = True, description: str = None,
+                  kwargs: dict = None) -> TemplateStep:
+        if device not in self.apparatus.components:
+            raise ValueError(f'The device {device} must be in {self.apparatus}')
+        if not hasattr(device, cmd):
+            raise ValueError(f'Device {device} does not have command {cmd}')
+        step = TemplateStep('operation', device, cmd, wait, description, {} if kwargs is None else kwargs)
+        self.steps.append(step)
+        return step
+
+    def add_virtual_operation(self, cmd: str, description: str = None, kwargs: dict = None) -> TemplateStep:
+        if not hasattr(VirtualOperation, cmd):
+            raise ValueError(f'Command {cmd} does not exist')
+        step = TemplateStep('virtual', None, cmd, True, description, {} if kwargs is None else kwargs)
+        self.steps.append(step)
+        return step
+
+    def add_sub_template(self, sub_template):
+        assert isinstance(sub_template, ProtocolTemplate)
+        self.steps.append(sub_template)
+
+    def add_parallel(self, branches: list, wait: str = 'all', description: str = None):
+        for i in branches:
+            assert isinstance(i, ProtocolTemplate)
+        self.steps.append((list(branches), wait, description))
+
+    @property
+    def parameters(self) -> set[str]:
+        """Names of all placeholders used in the template"""
+        result = set()
+        for step in self.steps:
+            if isinstance(step, TemplateStep):
+                result |= {i.name for i in step.kwargs.values() if isinstance(i, Param)}
+            elif isinstance(step, ProtocolTemplate):
+                result |= step.parameters
+            else:
+                for branch in step[0]:
+                    result |= branch.parameters
+        return result
+
+    @staticmethod
+    def _fill(kwargs: dict, params: dict, created: dict) -> dict:
+        filled = dict()
+        for key, value in kwargs.items():
+            if isinstance(value, Param):
+                if value.name not in params:
+                    raise KeyError(f'Parameter {value.name} not given')
+                filled[key] = params[value.name]
+            elif isinstance(value, TemplateStep):
+                filled[key] = created[id(value)]
+            else:
+                filled[key] = value
+        return filled
+
+    @staticmethod
+    def _format(text: Union[None, str], params: dict) -> Union[None, str]:
+        if text is None:
+            return None
+        try:
+            return text.format(**params)
+        except (KeyError, IndexError, ValueError):
+            return text
+
+    def instantiate(self, **params) -> Protocol:
+        """
+        Build a Protocol with the placeholders replaced by the given values
+        """
+        protocol = Protocol(self.apparatus, self._format(self.name, params), self._format(self.description, params),
+                            block_public=self.block_public)
+        created = dict()  # id of TemplateStep: operation created from it
+        for step in self.steps:
+            if isinstance(step, TemplateStep):
+                kwargs = self._fill(step.kwargs, params, created)
+                description = self._format(step.description, params)
+                if step.kind == 'operation':
+                    op = Operation(step.device, step.cmd, step.wait, description, kwargs)
+                else:
+                    op = VirtualOperation(step.cmd, description, kwargs)
+                protocol.add_single_operation(op, description=description)
+                created[id(step)] = op
+            elif isinstance(step, ProtocolTemplate):
+                protocol.add_sub_protocol(step.instantiate(**params))
+            else:
+                branches, wait, description = step
+                protocol.add_parallel([i.instantiate(**params) for i in branches], wait=wait,
+                                      description=self._format(description, params))
+        return protocol
+
+
+class ParameterSweep:
+    """
+    Lazily generates one Protocol per parameter set of a ProtocolTemplate; pass it to Experiment.add_protocol_source.
+    Either a grid (all combinations of the values, the last key varying fastest) or an iterable of dicts is taken.
+    """
+
+    def __init__(self, template: ProtocolTemplate, grid: dict[str, Iterable] = None,
+                 parameter_sets: Iterable[dict] = None, repeat: int = 1):
+        if (grid is None) == (parameter_sets is None):
+            raise ValueError('Exactly one of grid and parameter_sets must be given')
+        self.template = template
+        self.grid = grid
+        self.parameter_sets = parameter_sets
+        self.repeat = repeat
+
+    def _iter_params(self) -> Iterator[dict]:
+        if self.grid is not None:
+            keys = list(self.grid.keys())
+            for values in itertools.product(*(self.grid[i] for i in keys)):
+                yield dict(zip(keys, values))
+        else:
+            yield from self.parameter_sets
+
+    def __iter__(self) -> Iterator[Protocol]:
+        for params in self._iter_params():
+            for _ in range(self.repeat):
+                yield self.template.instantiate(**params)
@@ -0,0 +1,117 @@
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Union
+
+
+class Tracer:
+    """
+    Records spans of protocols, operations and queue waits in an in-memory ring buffer,
+    exported as Chrome trace-event JSON (chrome://tracing, https://ui.perfetto.dev).
+    Spans of the same thread nest by time; queue waits are async spans as they overlap.
+    Only the last `max_events` spans are kept; the names of at most `max_threads` threads are kept beyond the threads
+    of these spans.
+    """
+
+    def __init__(self, enabled: bool = True, max_events: int = 100000, max_threads: int = 1000):
+        self.enabled = enabled
+        self.max_threads = max_threads
+        self._events: deque = deque(maxlen=max_events)  # deque.append is thread safe
+        self._tids: dict[tuple[int, str], int] = dict()  # (thread ident, name): tid of the trace, as idents are reused
+        self._thread_names: dict[int, str] = dict()
+        self._names_lock = threading.Lock()
+        self._next_tid = itertools.count(1)
+        self._async_id = itertools.count(1)  # next() is atomic
+        self._t0 = time.perf_counter()
+        self.wall_start = time.time()
+
+    @staticmethod
+    def now() -> float:
+        return time.perf_counter()
+
+    @property
+    def max_events(self) -> int:
+        return self._events.maxlen
+
+    @max_events.setter
+    def max_events(self, value: int):
+        self._events = deque(self._events, maxlen=value)
+
+    def reset(self):
+        self._events.clear()
+        with self._names_lock:
+            self._tids.clear()
+            self._thread_names.clear()
+        self._t0 = time.perf_counter()
+        self.wall_start = time.time()
+
+    def _tid(self) -> int:
+        thread = threading.current_thread()
+        key = (thread.ident, thread.name)
+        tid = self._tids.get(key)
+        if tid is None:
+            with self._names_lock:
+                if len(self._tids) >= self.max_threads:
+                    self._prune_threads()
+                tid = self._tids[key] = next(self._next_tid)
+                self._thread_names[tid] = thread.name
+        return tid
+
+    def _prune_threads(self):
+        """Forget the threads without span left in the ring buffer"""
+        used = {i[5] for i in list(self._events) if i[0] == 'X'}
+        self._tids = {key: tid for key, tid in self._tids.items() if tid in used}
+        self._thread_names = {tid: name for tid, name in self._thread_names.items() if tid in used}
+
+    def complete(self, name: str, cat: str, start: float, end: float, args: dict = None):
+        """
+        Record a span executed by the current thread;
+        :param start: Tracer.now() at the start
+        :param end: Tracer.now() at the end
+        """
+        if self.enabled:
+            self._events.append(('X', name, cat, start, end, self._tid(), args))
+
+    def async_span(self, name: str, cat: str, start: float, end: float, args: dict = None):
+        """Record a span that may overlap others, e.g. an operation waiting in a queue"""
+        if self.enabled:
+            self._events.append(('b', name, cat, start, end, next(self._async_id), args))
+
+    def __len__(self):
+        return len(self._events)
+
+    def to_chrome_trace(self) -> dict:
+        pid = os.getpid()
+        trace_events = []
+        for tid, name in list(self._thread_names.items()):
+            trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}})
+        for ph, name, cat, start, end, tid_or_id, args in list(self._events):
+            ts = (start - self._t0) * 1e6
+            if ph == 'X':
+                event = {'name': name, 'cat': cat, 'ph': 'X', 'ts': ts, 'dur': (end - start) * 1e6, 'pid': pid,
+                         'tid': tid_or_id}
+                if args:
+                    event['args'] = args
+                trace_events.append(event)
+            else:
+                begin = {'name': name, 'cat': cat, 'ph': 'b', 'ts': ts, 'pid': pid, 'tid': 0, 'id': tid_or_id}
+                if args:
+                    begin['args'] = args
+                trace_events.append(begin)
+                trace_events.append({'name': name, 'cat': cat, 'ph': 'e', 'ts': (end - self._t0) * 1e6, 'pid': pid,
+                                     'tid': 0, 'id': tid_or_id})
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms',
+                'otherData': {'wall_start': self.wall_start}}
+
+    def export(self, filename: str) -> Union[None, str]:
+        if not self.enabled:
+            return None
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(filename, 'w') as f:
+            json.dump(self.to_chrome_trace(), f, default=str)
+        return filename
@@ -0,0 +1,119 @@
+"""
+Import time benchmark of the package.
+
+Each target module is imported in fresh interpreters, `--repeat` times. The benchmark reports the median and the best
+wall time of the import, the cumulative import time of the slowest top-level packages (python -X importtime) and
+which heavy optional packages were loaded: the notebook stack (IPython, ipywidgets, bqplot) and the SDKs of contrib
+drivers (alicat, pyvisa, daqmx, usb, modbus_tk, serial). None of them should be loaded by `import Chemingon`.
+
+With --baseline, the results are compared to a previous output. The exit status is 1 if an import became slower than
+the baseline by more than --max-slowdown, or if a heavy package is loaded by a target that did not load it before.
+
+    python benchmarks/bench_import.py --output import.json
+    python benchmarks/bench_import.py --baseline import.json --max-slowdown 1.3
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ('IPython', 'ipywidgets', 'bqplot', 'alicat', 'pyvisa', 'daqmx', 'usb', 'modbus_tk', 'serial')
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+duration = time.perf_counter() - start
+print(json.dumps({{'seconds': duration, 'heavy': [i for i in {heavy!r} if i in sys.modules],
+                  'modules': len(sys.modules)}}))
+"""
+
+
+def probe(module: str, importtime: bool = False) -> tuple[dict, str]:
+    """Import the module in a new interpreter; :return: measurements and the -X importtime output"""
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + \
+        ['-c', PROBE.format(module=module, heavy=HEAVY)]
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_packages(importtime_output: str, top: int) -> dict[str, float]:
+    """Cumulative import time, in seconds, of the top-level packages other than Chemingon (pandas, loguru, ...)"""
+    packages = dict()
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        if '.' not in name and name != 'Chemingon':
+            packages[name] = packages.get(name, 0.0) + int(cumulative) / 1e6
+    return dict(sorted(packages.items(), key=lambda x: -x[1])[:top])
+
+
+def run_target(module: str, repeat: int, top: int) -> dict:
+    times, heavy, modules = [], set(), 0
+    for _ in range(repeat):
+        result, _ = probe(module)
+        times.append(result['seconds'])
+        heavy.update(result['heavy'])
+        modules = result['modules']
+    _, importtime_output = probe(module, importtime=True)
+    return {'module': module, 'median_s': statistics.median(times), 'best_s': min(times), 'repeat': repeat,
+            'modules_loaded': modules, 'heavy_loaded': sorted(heavy),
+            'slowest_packages_s': slowest_packages(importtime_output, top)}
+
+
+def compare(results: list[dict], baseline: dict, max_slowdown: float) -> list[str]:
+    previous = {i['module']: i for i in baseline['results']}
+    problems = []
+    for result in results:
+        before = previous.get(result['module'])
+        if before is None:
+            continue
+        if result['median_s'] > before['median_s'] * max_slowdown:
+            problems.append(f"import {result['module']}: {result['median_s'] * 1e3:.0f} ms, was "
+                            f"{before['median_s'] * 1e3:.0f} ms")
+        new_heavy = set(result['heavy_loaded']) - set(before['heavy_loaded'])
+        if new_heavy:
+            problems.append(f"import {result['module']} now loads {', '.join(sorted(new_heavy))}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', type=str, default='Chemingon,Chemingon.cli', help='modules to import')
+    parser.add_argument('--repeat', type=int, default=7, help='fresh interpreters per module')
+    parser.add_argument('--top', type=int, default=10, help='number of top-level packages reported')
+    parser.add_argument('--baseline', type=str, default=None, help='previous JSON output to compare with')
+    parser.add_argument('--max-slowdown', type=float, default=1.25, help='tolerated ratio to the baseline')
+    parser.add_argument('--output', type=str, default=None, help='JSON file; printed to stdout if omitted')
+    args = parser.parse_args(argv)
+
+    results = [run_target(i, args.repeat, args.top) for i in args.modules.split(',')]
+    report = {'benchmark': 'import', 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version(), 'platform': platform.platform(), 'results': results}
+    problems = []
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            problems = compare(results, json.load(f), args.max_slowdown)
+        report['regressions'] = problems
+
+    text = json.dumps(report, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    for i in problems:
+        print(f'Regression: {i}', file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Throughput and latency benchmark of the execution engine (Experiment).
+
+Synthetic apparatuses are built from DummyComponent/DummySensor: one private device per channel, a number of shared
+public devices, protocols alternating private and public operations of a fixed duration, optionally wrapped in nested
+sub protocols with block_public. For each scenario it reports operations per second, dispatch latency percentiles
+(time from queueing a public operation to its start), CPU usage and the makespan against the theoretical optimum.
+
+    python benchmarks/bench_scheduler.py --output scheduler.json
+    python benchmarks/bench_scheduler.py --full --output scheduler_full.json
+    python benchmarks/bench_scheduler.py --channels 1,16 --public 0,2 --depth 4 --block-public
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Chemingon import Apparatus, Experiment, Protocol, DummyComponent, DummySensor  # noqa: E402
+
+
+class BenchComponent(DummyComponent):
+    def work(self, seconds: float = 0.0):
+        if seconds > 0:
+            self._sleep(seconds)
+
+
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, int(round(q / 100 * (len(values) - 1)))))
+    return values[idx]
+
+
+def build_scenario(channels: int, public: int, ops: int, op_time: float, depth: int, block_public: bool,
+                   protocols_per_channel: int, sensors: int):
+    apparatus = Apparatus('benchmark')
+    private_devices = [BenchComponent(f'private {i}') for i in range(channels)]
+    public_devices = [BenchComponent(f'public {i}', is_public=True) for i in range(public)]
+    sensor_list = [DummySensor(f'sensor {i}', freq=10) for i in range(sensors)]
+    apparatus.add_component_list(private_devices + public_devices + sensor_list)
+
+    exp = Experiment(apparatus, channels=channels, name='Benchmark')
+    channel_load = [0.0] * channels
+    public_load = [0.0] * public
+    public_rr = itertools.count()
+    for channel in range(channels):
+        for n in range(protocols_per_channel):
+            inner = Protocol(apparatus, f'c{channel} p{n} d{depth}', block_public=block_public and depth > 0)
+            for i in range(ops):
+                if public > 0 and i % 2 == 1:
+                    idx = next(public_rr) % public
+                    inner.quick_add(public_devices[idx], 'work', kwargs={'seconds': op_time})
+                    public_load[idx] += op_time
+                else:
+                    inner.quick_add(private_devices[channel], 'work', kwargs={'seconds': op_time})
+                channel_load[channel] += op_time
+            protocol = inner
+            for level in range(depth - 1, -1, -1):
+                outer = Protocol(apparatus, f'c{channel} p{n} d{level}')
+                outer.add_sub_protocol(protocol)
+                protocol = outer
+            exp.add_protocol(protocol, channel + 1)
+
+    # lower bound: the busiest channel or the busiest public device
+    optimum = max(channel_load + public_load) if (channel_load or public_load) else 0.0
+    return exp, optimum
+
+
+def run_scenario(channels: int, public: int, ops: int, op_time: float, depth: int, block_public: bool,
+                 protocols_per_channel: int, sensors: int, trace: bool) -> dict:
+    exp, optimum = build_scenario(channels, public, ops, op_time, depth, block_public, protocols_per_channel, sensors)
+    if trace:
+        exp.enable_tracing()
+
+    dispatch = []
+    op_count = [0]
+    bounds = {'first': None, 'last': None}
+
+    def on_start(op, protocol):
+        enqueue_time = getattr(op, 'enqueue_time', None)
+        if enqueue_time is not None:
+            dispatch.append(exp.tracer.now() - enqueue_time)
+
+    def on_end(op, protocol, outcome, duration):
+        op_count[0] += 1
+
+    def on_protocol_start(protocol):
+        if bounds['first'] is None:
+            bounds['first'] = time.perf_counter()
+
+    def on_protocol_end(protocol, outcome):
+        bounds['last'] = time.perf_counter()
+
+    exp.hooks.register('operation_start', on_start)
+    exp.hooks.register('operation_end', on_end)
+    exp.hooks.register('protocol_start', on_protocol_start)
+    exp.hooks.register('protocol_end', on_protocol_end)
+
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    wall_start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # progress printed by Experiment
+        exp.start_master_operators(dry_run=False)
+    wall = time.perf_counter() - wall_start
+    usage_end = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (usage_end.ru_utime - usage_start.ru_utime) + (usage_end.ru_stime - usage_start.ru_stime)
+
+    makespan = (bounds['last'] - bounds['first']) if bounds['first'] is not None else 0.0
+    return {
+        'channels': channels, 'public_devices': public, 'ops_per_protocol': ops, 'op_time': op_time,
+        'depth': depth, 'block_public': block_public, 'protocols_per_channel': protocols_per_channel,
+        'sensors': sensors, 'trace': trace,
+        'operations': op_count[0],
+        'wall_s': wall,
+        'makespan_s': makespan,
+        'optimum_s': optimum,
+        'overhead_s': makespan - optimum,
+        'makespan_ratio': (makespan / optimum) if optimum > 0 else None,
+        'ops_per_s': op_count[0] / makespan if makespan > 0 else None,
+        'dispatch_latency_ms': {f'p{q}': (None if not dispatch else percentile(dispatch, q) * 1e3)
+                                for q in (50, 90, 99)},
+        'dispatch_latency_max_ms': max(dispatch) * 1e3 if dispatch else None,
+        'cpu_s': cpu,
+        'cpu_utilisation': cpu / wall if wall > 0 else None,
+        'completed': all(i.finished for i in exp.protocol_list),
+    }
+
+
+def parse_list(text: str, cast=int) -> list:
+    return [cast(i) for i in text.split(',') if i]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--channels', type=str, default='1,8,64')
+    parser.add_argument('--public', type=str, default='0,1,4')
+    parser.add_argument('--depth', type=str, default='0')
+    parser.add_argument('--ops', type=int, default=10, help='operations per protocol')
+    parser.add_argument('--protocols', type=int, default=1, help='protocols per channel')
+    parser.add_argument('--op-time', type=float, default=0.0, help='duration of each operation, s')
+    parser.add_argument('--sensors', type=int, default=0)
+    parser.add_argument('--block-public', action='store_true', help='innermost sub protocol blocks public devices')
+    parser.add_argument('--no-trace', action='store_true', help='disable the tracer')
+    parser.add_argument('--full', action='store_true', help='1-512 channels, 0-16 public devices, depth 0 and 8, '
+                                                            'with and without block_public')
+    parser.add_argument('--output', type=str, default=None, help='JSON file; printed to stdout if omitted')
+    args = parser.parse_args(argv)
+
+    if args.full:
+        channel_list = [1, 8, 64, 512]
+        public_list = [0, 1, 4, 16]
+        depth_list = [0, 8]
+        block_list = [False, True]
+    else:
+        channel_list = parse_list(args.channels)
+        public_list = parse_list(args.public)
+        depth_list = parse_list(args.depth)
+        block_list = [args.block_public]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)  # experiment_results/ of the runs
+        try:
+            seen = set()
+            for channels, public, depth, block_public in itertools.product(channel_list, public_list, depth_list,
+                                                                          block_list):
+                # block_public needs a sub protocol and public devices
+                block_public = block_public and depth > 0 and public > 0
+                if (channels, public, depth, block_public) in seen:
+                    continue
+                seen.add((channels, public, depth, block_public))
+                result = run_scenario(channels, public, args.ops, args.op_time, depth, block_public,
+                                      args.protocols, args.sensors, not args.no_trace)
+                print(f"channels {channels:>4} public {public:>3} depth {depth} block {block_public!s:>5}: "
+                      f"{result['operations']} ops, makespan {result['makespan_s']:.3f}s "
+                      f"(optimum {result['optimum_s']:.3f}s), {result['ops_per_s'] or 0:.1f} ops/s, "
+                      f"dispatch p50 {result['dispatch_latency_ms']['p50'] or 0:.1f}ms", file=sys.stderr)
+                results.append(result)
+        finally:
+            os.chdir(cwd)
+
+    report = {'benchmark': 'scheduler', 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version(), 'platform': platform.platform(), 'results': results}
+    text = json.dumps(report, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text)
+
+
+if __name__ == '__main__':
+    main()
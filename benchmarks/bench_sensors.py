@@ -0,0 +1,234 @@
+"""
+Ingestion and persistence benchmark of sensors.
+
+Synthetic sensors with a configurable number of channels record samples as fast as possible until they hold the
+history of a run of the given length and sampling rate. The history is built in phases; after each phase the data of
+all sensors is saved with Apparatus.save_all_data. A reader thread can emulate JupyterUI.update_sensors, reading the
+last minute of every channel every 100 ms under pandas_lock.
+
+Reported per phase: Sensor.record latency percentiles, sustainable samples per second against the configured rate,
+memory held by the DataFrames and the process, cost of save_all_data, and the time writers and the reader spent
+waiting for pandas_lock.
+
+    python benchmarks/bench_sensors.py --output sensors.json
+    python benchmarks/bench_sensors.py --sensors 4 --channels 2,16 --rate 10 --hours 1
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from threading import Lock, Thread, Event
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Chemingon import Apparatus, Sensor  # noqa: E402
+
+
+class TimedLock:
+    """Drop-in replacement of pandas_lock recording the time spent waiting for it"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._stats_lock = Lock()
+        self.waits: dict[str, list[float]] = {'writer': [], 'reader': [], 'flush': []}
+
+    def acquire_as(self, role: str):
+        start = time.perf_counter()
+        self._lock.acquire()
+        wait = time.perf_counter() - start
+        with self._stats_lock:
+            self.waits[role].append(wait)
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        name = threading.current_thread().name
+        role = 'reader' if name.startswith('reader') else ('writer' if name.startswith('writer') else 'flush')
+        self.acquire_as(role)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def reset(self):
+        with self._stats_lock:
+            for i in self.waits.values():
+                i.clear()
+
+
+class SyntheticSensor(Sensor):
+    def __init__(self, name: str, freq: int, n_channels: int):
+        self.n_channels = n_channels
+        super().__init__(name, freq, keep_log=False)
+        self.pandas_lock = TimedLock()
+
+    def _set_channels(self):
+        self.channels = tuple(f'channel {i}' for i in range(self.n_channels))
+
+    def sample(self) -> dict:
+        return {i: random.random() for i in self.channels}
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def base_state(self):
+        pass
+
+    def update(self):
+        self.record(self.sample())
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {'p50': None, 'p90': None, 'p99': None, 'max': None}
+    arr = np.asarray(values) * 1e3
+    return {'p50': float(np.percentile(arr, 50)), 'p90': float(np.percentile(arr, 90)),
+            'p99': float(np.percentile(arr, 99)), 'max': float(arr.max())}
+
+
+def reader_loop(sensors: list, stop: Event, durations: list):
+    # JupyterUI.update_sensors, with the lock taken; only the copies made under the lock are timed
+    while not stop.is_set():
+        start = time.perf_counter()
+        for sensor in sensors:
+            tmp = 60 * sensor.freq
+            with sensor.pandas_lock:
+                data = sensor.data
+                np.array(data['time'])[-tmp:]
+                for channel in sensor.channels:
+                    np.array(data[channel])[-tmp:]
+        durations.append(time.perf_counter() - start)
+        stop.wait(0.1)
+
+
+def run_scenario(n_sensors: int, n_channels: int, rate: int, hours: float, phases: int, reader: bool,
+                 directory: str) -> dict:
+    apparatus = Apparatus('sensor benchmark')
+    sensors = [SyntheticSensor(f'sensor {i}', rate, n_channels) for i in range(n_sensors)]
+    apparatus.add_component_list(sensors)
+    for sensor in sensors:
+        sensor.save_start_time(time.time(), directory)
+
+    samples_total = max(phases, int(rate * hours * 3600))
+    samples_per_phase = samples_total // phases
+
+    stop_reader = Event()
+    reader_durations = []
+    reader_thread = None
+    if reader:
+        reader_thread = Thread(target=reader_loop, args=(sensors, stop_reader, reader_durations), name='reader')
+        reader_thread.start()
+
+    phase_results = []
+    for phase in range(phases):
+        latencies = [[] for _ in sensors]
+        for sensor in sensors:
+            sensor.pandas_lock.reset()
+        n_reads = len(reader_durations)
+
+        def writer(idx: int):
+            sensor = sensors[idx]
+            record = sensor.record
+            for _ in range(samples_per_phase):
+                data = sensor.sample()
+                start = time.perf_counter()
+                record(data)
+                latencies[idx].append(time.perf_counter() - start)
+
+        phase_start = time.perf_counter()
+        writers = [Thread(target=writer, args=(i,), name=f'writer {i}') for i in range(n_sensors)]
+        for i in writers:
+            i.start()
+        for i in writers:
+            i.join()
+        phase_time = time.perf_counter() - phase_start
+
+        flush_start = time.perf_counter()
+        apparatus.save_all_data()
+        flush_time = time.perf_counter() - flush_start
+
+        all_latencies = list(itertools.chain.from_iterable(latencies))
+        writer_waits = list(itertools.chain.from_iterable(i.pandas_lock.waits['writer'] for i in sensors))
+        reader_waits = list(itertools.chain.from_iterable(i.pandas_lock.waits['reader'] for i in sensors))
+        history = len(sensors[0].data)
+        phase_results.append({
+            'history_samples': history,
+            'history_hours': history / rate / 3600,
+            'record_latency_ms': percentiles(all_latencies),
+            'samples_per_s': len(all_latencies) / phase_time if phase_time > 0 else None,
+            'required_samples_per_s': n_sensors * rate,
+            'dataframe_mb': sum(float(i.data.memory_usage(deep=True).sum()) for i in sensors) / 2 ** 20,
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            'flush_s': flush_time,
+            'file_mb': sum(os.path.getsize(i.filename) for i in sensors) / 2 ** 20,
+            'writer_lock_wait_ms': percentiles(writer_waits),
+            'writer_lock_wait_total_s': float(sum(writer_waits)),
+            'reader_lock_wait_total_s': float(sum(reader_waits)),
+            'reader_refresh_ms': percentiles(reader_durations[n_reads:]),
+        })
+        print(f"sensors {n_sensors} channels {n_channels} reader {reader!s:>5} history {history:>7}: "
+              f"record p50 {phase_results[-1]['record_latency_ms']['p50']:.3f}ms "
+              f"p99 {phase_results[-1]['record_latency_ms']['p99']:.3f}ms, "
+              f"{phase_results[-1]['samples_per_s']:.0f} samples/s, flush {flush_time * 1e3:.1f}ms",
+              file=sys.stderr)
+
+    stop_reader.set()
+    if reader_thread is not None:
+        reader_thread.join()
+
+    return {'sensors': n_sensors, 'channels': n_channels, 'rate_hz': rate, 'hours': hours, 'reader': reader,
+            'phases': phase_results}
+
+
+def parse_list(text: str, cast=int) -> list:
+    return [cast(i) for i in text.split(',') if i]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sensors', type=str, default='1,4', help='numbers of sensors')
+    parser.add_argument('--channels', type=str, default='2,16', help='numbers of channels per sensor')
+    parser.add_argument('--rate', type=int, default=10, help='sampling rate of each sensor, Hz')
+    parser.add_argument('--hours', type=float, default=0.1, help='length of the simulated history')
+    parser.add_argument('--phases', type=int, default=5, help='number of save_all_data checkpoints')
+    parser.add_argument('--reader', choices=['both', 'on', 'off'], default='both',
+                        help='emulate the Jupyter UI reading the data')
+    parser.add_argument('--output', type=str, default=None, help='JSON file; printed to stdout if omitted')
+    args = parser.parse_args(argv)
+
+    reader_list = {'both': [False, True], 'on': [True], 'off': [False]}[args.reader]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_sensors, n_channels, reader in itertools.product(parse_list(args.sensors), parse_list(args.channels),
+                                                               reader_list):
+            with contextlib.redirect_stdout(io.StringIO()):
+                results.append(run_scenario(n_sensors, n_channels, args.rate, args.hours, args.phases, reader,
+                                            tmp_dir))
+
+    report = {'benchmark': 'sensors', 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version(), 'platform': platform.platform(), 'results': results}
+    text = json.dumps(report, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text)
+
+
+if __name__ == '__main__':
+    main()
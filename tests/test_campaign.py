@@ -0,0 +1,34 @@
+import time
+
+from Chemingon import Apparatus, Campaign, Protocol
+
+
+def test_suggestions_never_exceed_budget_with_slow_build():
+    apparatus = Apparatus('campaign test')
+    suggested = []
+
+    def suggest():
+        suggested.append(len(suggested))
+        return {'x': suggested[-1]}
+
+    def build(params):
+        time.sleep(0.2)  # the optimiser thread tops up the queue several times meanwhile
+        return Protocol(apparatus, f"p{params['x']}")
+
+    budget = 4
+    campaign = Campaign(build, suggest=suggest, observe=lambda params, result: None, budget=budget, prefetch=2)
+    issued = []
+    deadline = time.time() + 30
+    for protocol in campaign:
+        assert time.time() < deadline
+        if protocol is None:
+            time.sleep(0.01)
+            continue
+        protocol.start_time = protocol.end_time = time.time()
+        protocol.finished = True
+        issued.append(protocol)
+        assert len(suggested) <= budget
+    assert campaign.wait(timeout=5)
+    assert len(issued) == budget
+    assert len(suggested) == budget
+    assert len(campaign.results) == budget
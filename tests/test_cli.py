@@ -0,0 +1,49 @@
+import io
+
+import pytest
+
+from Chemingon import Apparatus, DummyComponent, Experiment, Protocol
+from Chemingon.cli import EXIT_ERROR, EXIT_OK, run
+from Chemingon.core.errors import ErrorInfo, ExperimentError
+
+
+class Reporter(DummyComponent):
+    """Reports a non-fatal error to the experiment and carries on"""
+
+    def __init__(self, name: str, exp: Experiment = None):
+        super().__init__(name)
+        self.exp = exp
+
+    def work(self, fail: bool = False):
+        if fail:
+            self.exp.error_queue.put(ErrorInfo(ExperimentError('Clogged', fatality=False, pause=False), None))
+
+
+def make_experiment(fail: bool) -> Experiment:
+    apparatus = Apparatus('cli test')
+    device = Reporter('reporter')
+    apparatus.add_component(device)
+    exp = Experiment(apparatus, name='cli_test')
+    device.exp = exp
+    protocol = Protocol(apparatus, 'p')
+    protocol.quick_add(device, 'work', kwargs={'fail': fail})
+    protocol.quick_add(device, 'work')
+    exp.add_protocol(protocol)
+    return exp
+
+
+@pytest.fixture(autouse=True)
+def results_in_tmp(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def test_run_without_error_exits_ok():
+    exp = make_experiment(fail=False)
+    assert run(exp, interval=0.2, out=io.StringIO()) == EXIT_OK
+
+
+def test_non_fatal_error_gives_error_exit_status():
+    exp = make_experiment(fail=True)
+    assert run(exp, interval=0.2, out=io.StringIO()) == EXIT_ERROR
+    assert exp.finished and not exp.error_quit  # resumed after the error
+    assert exp.hooks.hook_errors == 0
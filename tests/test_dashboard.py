@@ -0,0 +1,64 @@
+import http.client
+import json
+
+import pytest
+
+from Chemingon import Apparatus, DummyComponent, Experiment
+
+
+@pytest.fixture
+def dashboard():
+    apparatus = Apparatus('dashboard test')
+    apparatus.add_component(DummyComponent('device'))
+    dashboard = Experiment(apparatus, channels=1).start_dashboard(port=0)
+    yield dashboard
+    dashboard.stop()
+
+
+def request(dashboard, method, path, body=None, **headers):
+    connection = http.client.HTTPConnection('127.0.0.1', dashboard.server_port, timeout=5)
+    connection.putrequest(method, path, skip_host=True)
+    headers.setdefault('Host', f'127.0.0.1:{dashboard.server_port}')
+    for name, value in headers.items():
+        connection.putheader(name.replace('_', '-'), value)
+    body = None if body is None else json.dumps(body).encode()
+    if body is not None:
+        connection.putheader('Content-Length', str(len(body)))
+    connection.endheaders(body)
+    response = connection.getresponse()
+    content = response.read()
+    connection.close()
+    return response.status, content
+
+
+def test_cross_origin_control_is_refused(dashboard):
+    host = f'127.0.0.1:{dashboard.server_port}'
+    token = dashboard.token
+    # pause is refused with 409 while the experiment is not running: the request itself was accepted
+    assert request(dashboard, 'POST', '/control', {'action': 'pause'}, Content_Type='application/json',
+                   X_Dashboard_Token=token)[0] == 409
+    assert request(dashboard, 'POST', '/control', {'action': 'pause'}, Content_Type='application/json',
+                   X_Dashboard_Token=token, Origin=f'http://{host}')[0] == 409
+    # a form or script of another site, with or without the token
+    assert request(dashboard, 'POST', '/control', {'action': 'start'}, Content_Type='text/plain',
+                   Origin='http://evil.example')[0] == 403
+    assert request(dashboard, 'POST', '/control', {'action': 'start'}, Content_Type='application/json',
+                   X_Dashboard_Token=token, Origin='http://evil.example')[0] == 403
+    # DNS rebinding: the page of another name resolving to this address
+    assert request(dashboard, 'POST', '/control', {'action': 'start'}, Content_Type='application/json',
+                   X_Dashboard_Token=token, Host=f'evil.example:{dashboard.server_port}')[0] == 403
+    assert request(dashboard, 'GET', '/state', Host=f'evil.example:{dashboard.server_port}')[0] == 403
+    # same origin without the token or as a simple form
+    assert request(dashboard, 'POST', '/control', {'action': 'start'}, Content_Type='application/json')[0] == 403
+    assert request(dashboard, 'POST', '/control', {'action': 'start'}, Content_Type='text/plain',
+                   X_Dashboard_Token=token)[0] == 415
+    assert not dashboard.exp.is_running and dashboard.supervisor is None
+
+
+def test_websocket_requires_token(dashboard):
+    upgrade = {'Upgrade': 'websocket', 'Connection': 'Upgrade', 'Sec-WebSocket-Key': 'dGhlIHNhbXBsZSBub25jZQ==',
+               'Sec-WebSocket-Version': '13'}
+    assert request(dashboard, 'GET', '/ws', **upgrade)[0] == 403
+    assert request(dashboard, 'GET', '/ws?token=wrong', **upgrade)[0] == 403
+    status, page = request(dashboard, 'GET', '/')
+    assert status == 200 and dashboard.token.encode() in page
@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from Chemingon import Apparatus, DummyComponent, ProtocolFile, VirtualOperation
+
+
+class Pump(DummyComponent):
+    def infuse(self, volume, rate=1.0):
+        pass
+
+
+DOCUMENT = {
+    'experiment': {'channels': 2},
+    'definitions': {'wash': {'steps': [{'device': 'pump', 'command': 'infuse', 'kwargs': {'volume': 5}}]}},
+    'protocols': [
+        {'name': 'run 1', 'channel': 1, 'steps': [
+            {'device': 'pump', 'command': 'infuse', 'kwargs': {'volume': 1}, 'wait': False, 'id': 'fill'},
+            {'virtual': 'wait_for_operation', 'kwargs': {'op': {'$ref': 'fill'}}},
+            {'use': 'wash'},
+            {'parallel': [{'name': 'a', 'steps': []}, {'name': 'b', 'steps': []}], 'wait': 'any'}]},
+        {'name': 'run 2', 'steps': [{'virtual': 'delay', 'kwargs': {'seconds': 1}, 'description': 'react'}]}]}
+
+
+@pytest.fixture
+def apparatus():
+    apparatus = Apparatus('definition test')
+    apparatus.add_component(Pump('pump'))
+    return apparatus
+
+
+def write(path, document=DOCUMENT):
+    if path.suffix == '.jsonl':
+        header = {key: value for key, value in document.items() if key != 'protocols'}
+        path.write_text('\n'.join(json.dumps(i) for i in [header] + document['protocols']) + '\n')
+    elif path.suffix == '.yaml':
+        yaml = pytest.importorskip('yaml')
+        path.write_text(yaml.safe_dump(document))
+    else:
+        path.write_text(json.dumps(document))
+    return str(path)
+
+
+@pytest.mark.parametrize('extension', ['.json', '.jsonl', '.yaml'])
+def test_load_formats(extension, apparatus, tmp_path):
+    protocol_file = ProtocolFile(write(tmp_path / f'protocols{extension}'), apparatus=apparatus, cache_dir=None)
+    assert protocol_file.header['experiment'] == {'channels': 2}
+    first, second = protocol_file.load()
+    assert (first.name, first.channel, second.name, second.channel) == ('run 1', 1, 'run 2', None)
+    fill, wait, wash, parallel = first.procedures
+    assert fill.command == 'infuse' and fill.kwargs == {'volume': 1} and not fill.wait
+    assert isinstance(wait, VirtualOperation) and wait.kwargs['op'] is fill
+    assert wash.name == 'wash' and wash.procedures[0].kwargs == {'volume': 5}
+    assert parallel.wait == 'any' and [i.name for i in parallel.branches] == ['a', 'b']
+
+
+@pytest.mark.parametrize('step, message', [
+    ({'device': 'pump', 'command': 'infuse', 'kwargs': {}}, "missing a required argument: 'volume'"),
+    ({'device': 'pump', 'command': 'infuse', 'kwargs': {'volume': 1, 'speed': 2}}, "unexpected keyword argument"),
+    ({'device': 'pump', 'command': 'aspirate'}, 'does not have command aspirate'),
+    ({'virtual': 'delay', 'kwargs': {'minutes': 1}}, 'wrong arguments for delay'),
+    ({'virtual': 'wait_for_operation', 'kwargs': {'op': {'$ref': 'later'}}}, 'no operation with id later'),
+])
+def test_invalid_kwargs(step, message, apparatus, tmp_path):
+    document = {'protocols': [{'name': 'p', 'steps': [step]}]}
+    with pytest.raises(ValueError, match=message) as error:
+        ProtocolFile(write(tmp_path / 'protocols.json', document), apparatus=apparatus, cache_dir=None)
+    assert 'protocol 1 (p) step 1' in str(error.value)
+
+
+def test_cache_invalidated_by_source_and_driver(apparatus, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    path = write(tmp_path / 'protocols.json')
+    assert not ProtocolFile(path, apparatus=apparatus, cache_dir=cache_dir).cache_hit
+    assert ProtocolFile(path, apparatus=apparatus, cache_dir=cache_dir).cache_hit
+
+    document = json.loads(json.dumps(DOCUMENT))
+    document['protocols'][1]['name'] = 'run 3'
+    write(tmp_path / 'protocols.json', document)
+    protocol_file = ProtocolFile(path, apparatus=apparatus, cache_dir=cache_dir)
+    assert not protocol_file.cache_hit
+    assert [i.name for i in protocol_file.load()] == ['run 1', 'run 3']
+    assert ProtocolFile(path, apparatus=apparatus, cache_dir=cache_dir).cache_hit
+
+    class ChangedPump(DummyComponent):
+        def infuse(self, amount, rate=1.0):
+            pass
+
+    changed = Apparatus('definition test')
+    changed.add_component(ChangedPump('pump'))
+    with pytest.raises(ValueError, match="missing a required argument: 'amount'"):
+        ProtocolFile(path, apparatus=changed, cache_dir=cache_dir)
+
+    def infuse(self, amount, rate=1.0):
+        pass
+
+    # the same class, changed in place as when a driver is edited and reloaded
+    original = Pump.infuse
+    Pump.infuse = infuse
+    try:
+        with pytest.raises(ValueError, match="missing a required argument: 'amount'"):
+            ProtocolFile(path, apparatus=apparatus, cache_dir=cache_dir)
+    finally:
+        Pump.infuse = original
+    assert ProtocolFile(path, apparatus=apparatus, cache_dir=cache_dir).cache_hit
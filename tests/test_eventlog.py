@@ -0,0 +1,47 @@
+import json
+
+from Chemingon import Apparatus, DummyComponent, Experiment, Protocol
+
+
+class Reading:
+    formatted = 0
+
+    def __str__(self):
+        Reading.formatted += 1
+        return 'reading'
+
+
+class Probe(DummyComponent):
+    def measure(self):
+        self.log('Measured {}', Reading())
+
+
+def run(level, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    Reading.formatted = 0
+    apparatus = Apparatus('event log test')
+    probe = Probe('probe')
+    apparatus.add_component(probe)
+    experiment = Experiment(apparatus, channels=1)
+    protocol = Protocol(apparatus, 'p')
+    protocol.quick_add(probe, 'measure')
+    experiment.add_protocol(protocol, 1)
+    event_log = experiment.enable_event_log(level=level)
+    experiment.start_master_operators()
+    return [json.loads(i) for i in open(event_log.path)]
+
+
+def test_filtered_device_log_is_not_formatted(monkeypatch, tmp_path):
+    events = run('INFO', monkeypatch, tmp_path)
+    assert Reading.formatted == 0
+    assert not any(i['level'] == 'DEBUG' for i in events)
+
+
+def test_device_log_has_context(monkeypatch, tmp_path):
+    events = run('DEBUG', monkeypatch, tmp_path)
+    assert Reading.formatted == 1
+    event = next(i for i in events if i['message'] == 'Measured reading')
+    assert event['level'] == 'DEBUG'
+    assert event['device'] == 'probe'
+    assert event['channel'] == 1
+    assert event['protocol'] == 'p'
@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the notebook stack and the SDKs of the contrib drivers
+HEAVY = ('IPython', 'ipywidgets', 'bqplot', 'alicat', 'pyvisa', 'daqmx', 'usb', 'modbus_tk', 'serial')
+
+
+def loaded_after(statement: str) -> dict:
+    code = f"""
+import json, sys
+{statement}
+print(json.dumps({{'heavy': [i for i in {HEAVY!r} if i in sys.modules],
+                  'drivers': [i for i in sys.modules if i.startswith('Chemingon.components.contrib.')],
+                  'names': sorted(i for i in dir() if not i.startswith('_'))}}))
+"""
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize('statement', ['import Chemingon', 'from Chemingon import *',
+                                       'from Chemingon.components import *'])
+def test_import_loads_no_notebook_stack_or_sdk(statement):
+    loaded = loaded_after(statement)
+    assert loaded['heavy'] == []
+    assert loaded['drivers'] == []
+
+
+def test_star_import_names():
+    names = loaded_after('from Chemingon import *')['names']
+    assert {'Apparatus', 'Experiment', 'Protocol', 'DummyComponent', 'JupyterUI'} <= set(names)
+    assert 'ViciValve' not in names
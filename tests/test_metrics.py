@@ -0,0 +1,89 @@
+import re
+import urllib.request
+
+from Chemingon import Apparatus, DummyComponent, Experiment, Protocol
+
+SAMPLE = re.compile(r'^([a-z_]+)(\{(?:[a-z_]+="(?:[^"\\]|\\.)*",?)*\})? (-?[0-9.e+-]+|\+Inf|NaN)$')
+
+
+def parse(text: str) -> dict[str, dict[str, float]]:
+    """Check the Prometheus text format; :return: {metric name: {labels: value}}"""
+    assert text.endswith('\n')
+    types, samples = dict(), dict()
+    for line in text.splitlines():
+        if line.startswith('# HELP '):
+            continue
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ')
+            assert kind in ('counter', 'gauge', 'histogram') and name not in types
+            types[name] = kind
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        name, labels, value = match.groups()
+        family = re.sub(r'_(bucket|sum|count)$', '', name) if name not in types else name
+        assert family in types, f'{name} has no TYPE line'
+        samples.setdefault(name, dict())[labels or ''] = float(value)
+    for name, kind in types.items():
+        if kind == 'histogram':
+            for labels, count in samples[f'{name}_count'].items():
+                prefix = labels[:-1] + ',' if labels else '{'
+                buckets = [value for key, value in samples[f'{name}_bucket'].items()
+                           if key.startswith(prefix) and key[len(prefix):].startswith('le=')]
+                assert buckets == sorted(buckets), 'buckets are cumulative'
+                assert samples[f'{name}_bucket'][prefix + 'le="+Inf"}'] == count
+    return samples
+
+
+class Worker(DummyComponent):
+    def work(self, t=0.1):
+        self._sleep(t)
+
+
+class Scraper(DummyComponent):
+    def scrape(self, exp):
+        url = f'http://127.0.0.1:{exp.metrics.server_port}/metrics'
+        with urllib.request.urlopen(url, timeout=5) as response:
+            self.content_type = response.headers['Content-Type']
+            self.text = response.read().decode()
+
+
+def test_metrics_after_run(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    apparatus = Apparatus('metrics test')
+    shared, private, scraper = Worker('shared', is_public=True), Worker('private'), Scraper('scraper')
+    apparatus.add_component_list([shared, private, scraper])
+    experiment = Experiment(apparatus, channels=2)
+    for channel in (1, 2):
+        protocol = Protocol(apparatus, f'p{channel}')
+        protocol.quick_add(shared, 'work', kwargs={'t': 0.2})
+        protocol.quick_add(shared, 'work', kwargs={'t': 0.2})
+        experiment.add_protocol(protocol, channel)
+    protocol = Protocol(apparatus, 'p3')
+    protocol.quick_add(private, 'work', kwargs={'t': 0.1})
+    protocol.quick_add(scraper, 'scrape', kwargs={'exp': experiment})
+    experiment.add_protocol(protocol, 1)
+    metrics = experiment.enable_metrics(port=0, snapshot_interval=None)
+    experiment.start_master_operators()
+
+    # scraped while running
+    assert scraper.content_type.startswith('text/plain; version=0.0.4')
+    live = parse(scraper.text)
+    assert live['chemingon_experiment_running'][''] == 1.0
+    assert live['chemingon_operations_total']['{device="private",outcome="done"}'] == 1
+
+    # saved at the end
+    final = parse(open(f'{experiment.directory}/metrics.prom').read())
+    operations = final['chemingon_operations_total']
+    assert operations['{device="shared",outcome="done"}'] == 4
+    assert operations['{device="private",outcome="done"}'] == 1
+    assert operations['{device="scraper",outcome="done"}'] == 1
+    # the two channels queued on the shared device, each operation waited there once
+    assert final['chemingon_queue_wait_seconds_count']['{device="shared"}'] == 4
+    assert final['chemingon_queue_wait_seconds_sum']['{device="shared"}'] > 0.15
+    assert final['chemingon_queue_wait_seconds_bucket']['{device="shared",le="+Inf"}'] == 4
+    assert 0.75 < final['chemingon_public_busy_seconds_total']['{device="shared"}'] < 1.5
+    assert final['chemingon_public_queue_depth']['{device="shared"}'] == 0
+    assert final['chemingon_experiment_running'][''] == 0.0
+    assert 'chemingon_errors_total' not in final
+    assert metrics.get('operations_total', device='shared', outcome='done') == 4
@@ -0,0 +1,49 @@
+import time
+
+from Chemingon import Apparatus, DummyComponent, Experiment, Protocol
+
+
+class Timed(DummyComponent):
+    def __init__(self, name):
+        super().__init__(name)
+        self.started = []
+
+    def work(self, t=0.1):
+        self.started.append(time.time())
+        self._sleep(t)
+
+
+def run_parallel(wait, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    apparatus = Apparatus('parallel test')
+    fast, slow, after = Timed('fast'), Timed('slow'), Timed('after')
+    apparatus.add_component_list([fast, slow, after])
+    branch_fast = Protocol(apparatus, 'fast branch')
+    branch_fast.quick_add(fast, 'work', kwargs={'t': 0.5})
+    branch_slow = Protocol(apparatus, 'slow branch')
+    branch_slow.quick_add(slow, 'work', kwargs={'t': 3})
+    branch_slow.quick_add(slow, 'work', kwargs={'t': 3})
+    protocol = Protocol(apparatus, 'parent')
+    protocol.add_parallel([branch_fast, branch_slow], wait=wait)
+    protocol.quick_add(after, 'work', kwargs={'t': 0.1})
+    experiment = Experiment(apparatus, channels=1)
+    experiment.add_protocol(protocol, 1)
+    start = time.time()
+    experiment.start_master_operators()
+    return start, time.time() - start, protocol, branch_slow, after
+
+
+def test_wait_any_continues_after_first_branch(monkeypatch, tmp_path):
+    start, elapsed, protocol, branch_slow, after = run_parallel('any', monkeypatch, tmp_path)
+    assert protocol.finished
+    assert after.started[0] - start < 1.5  # not held by the 3 s step of the slow branch
+    assert 2.5 < elapsed < 5  # the slow branch is joined after its step in progress, then cancelled
+    assert not branch_slow.finished
+
+
+def test_wait_all_waits_for_every_branch(monkeypatch, tmp_path):
+    start, elapsed, protocol, branch_slow, after = run_parallel('all', monkeypatch, tmp_path)
+    assert protocol.finished
+    assert branch_slow.finished
+    assert after.started[0] - start > 5.5
+    assert elapsed > 5.5
@@ -0,0 +1,72 @@
+import threading
+
+from Chemingon import Apparatus, DummyComponent, Experiment, Protocol
+from Chemingon.core.reservation import ResourceManager
+
+
+class Worker(DummyComponent):
+    def work(self, t=0.1):
+        self._sleep(t)
+
+
+def test_grants_all_or_nothing_first_come_first_served():
+    a, b, c = (DummyComponent(i, is_public=True) for i in 'abc')
+    manager = ResourceManager()
+    first = manager.request('first', {a})
+    assert manager.acquire(first, timeout=0)
+    both = manager.request('both', {a, b})
+    assert not manager.acquire(both, timeout=0.05)
+    assert manager.holder(b) is None  # b is not held while a is not available
+    # b is free, but an earlier request waiting for it goes first
+    later = manager.request('later', {b})
+    assert not manager.acquire(later, timeout=0.05)
+    other = manager.request('other', {c})
+    assert manager.acquire(other, timeout=0)
+
+    manager.release(first)
+    assert manager.acquire(both, timeout=1)
+    assert manager.holder(a) is both and manager.holder(b) is both
+    assert not manager.acquire(later, timeout=0.05)
+    manager.release(both)
+    assert manager.acquire(later, timeout=1)
+    assert set(manager.report()) == {'first', 'both', 'later', 'other'}
+    manager.reset()
+    assert manager.report() == {} and manager.total_wait_time == 0
+
+
+def test_overlapping_block_public_protocols(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    apparatus = Apparatus('reservation test')
+    x, shared, y = Worker('x', is_public=True), Worker('shared', is_public=True), Worker('y', is_public=True)
+    apparatus.add_component_list([x, shared, y])
+    experiment = Experiment(apparatus, channels=2)
+
+    def add_protocols():
+        protocols = []
+        for channel, devices in ((1, [x, shared]), (2, [shared, y])):
+            protocol = Protocol(apparatus, f'p{channel}', block_public=True)
+            for device in devices:
+                protocol.quick_add(device, 'work', kwargs={'t': 0.4})
+            experiment.add_protocol(protocol, channel)
+            protocols.append(protocol)
+        return protocols
+
+    for run in range(2):
+        protocols = add_protocols()
+        supervisor = threading.Thread(target=experiment.start_master_operators, daemon=True)
+        supervisor.start()
+        supervisor.join(timeout=20)
+        assert not supervisor.is_alive(), 'deadlock'
+        assert all(i.finished for i in protocols)
+        report = experiment.resource_manager.report()
+        # waits of this run only, one reservation per protocol
+        assert set(report) == {'p1', 'p2'} and all(i['count'] == 1 for i in report.values())
+        first, second = sorted(report.values(), key=lambda i: i['total'])
+        assert first['total'] < 0.2
+        # the second waited for the whole first protocol: two operations of 0.4 s
+        assert 0.7 < second['total'] < 2
+        assert second['max'] == second['total']
+        assert abs(experiment.resource_manager.total_wait_time - first['total'] - second['total']) < 1e-9
+        # the protocols did not overlap
+        p1, p2 = sorted(protocols, key=lambda i: i.start_time)
+        assert p2.start_time + second['total'] >= p1.end_time - 0.05
@@ -0,0 +1,61 @@
+from Chemingon import DummyComponent, Operation, SetupAwarePolicy
+from Chemingon.core.operation import PublicBlocker
+from Chemingon.core.scheduling import PendingTask
+
+
+class Valve(DummyComponent):
+    """Two positions; every move is the same cost"""
+
+    def __init__(self, name):
+        super().__init__(name, is_public=True)
+        self.last_setup_state = 'A'
+
+    def dose(self, position, volume=1):
+        pass
+
+    def setup_state(self, command, kwargs):
+        return kwargs['position']
+
+
+def queue(valve, positions, protocols=None):
+    protocols = protocols or [object() for _ in positions]
+    return [PendingTask(Operation(valve, 'dose', kwargs={'position': position}), protocol)
+            for position, protocol in zip(positions, protocols)]
+
+
+def drain(policy, valve, pending) -> list[PendingTask]:
+    """Execute the queue as the public device does"""
+    executed = []
+    while pending:
+        item = pending.pop(policy.select(valve, pending))
+        valve.last_setup_state = valve.state_after(item.task.command, item.task.kwargs)
+        executed.append(item)
+    return executed
+
+
+def test_operations_batched_by_state():
+    valve = Valve('valve')
+    executed = drain(SetupAwarePolicy(window=8, max_bypass=4), valve, queue(valve, 'ABABAB'))
+    assert ''.join(i.task.kwargs['position'] for i in executed) == 'AAABBB'
+    first_come = drain(SetupAwarePolicy(window=1), valve, queue(valve, 'ABABAB'))
+    assert ''.join(i.task.kwargs['position'] for i in first_come) == 'ABABAB'
+
+
+def test_bypass_bound():
+    valve = Valve('valve')
+    pending = queue(valve, 'BAAAAAA')
+    starving = pending[0]
+    executed = drain(SetupAwarePolicy(window=8, max_bypass=2), valve, pending)
+    assert executed.index(starving) == 2
+    assert max(i.bypassed for i in executed) <= 2
+
+
+def test_protocol_order_and_blockers_kept():
+    valve = Valve('valve')
+    protocol = object()
+    # the two operations of one protocol are not swapped even if the second one needs no move
+    executed = drain(SetupAwarePolicy(), valve, queue(valve, 'BA', [protocol, protocol]))
+    assert [i.task.kwargs['position'] for i in executed] == ['B', 'A']
+    # nothing is moved ahead of a blocker
+    pending = queue(valve, 'B') + [PendingTask(PublicBlocker(), object())] + queue(valve, 'A')
+    assert SetupAwarePolicy().select(valve, pending) == 0
@@ -0,0 +1,56 @@
+from Chemingon import StateStore
+
+
+def apply(view: dict, changes: dict, replace: bool) -> dict:
+    """What a client following the store holds after applying the changes"""
+    if replace:
+        return {i: dict(j) for i, j in changes.items()}
+    for key, fields in changes.items():
+        if fields is None:
+            view.pop(key, None)
+        else:
+            view.setdefault(key, dict()).update(fields)
+    return view
+
+
+def follow(store: StateStore, view: dict, version: int) -> tuple[int, dict]:
+    version, changes, replace = store.changes_since(version)
+    return version, apply(view, changes, replace)
+
+
+def test_incremental_changes():
+    store = StateStore()
+    store.publish('protocol', 1, {'progress': 0, 'name': 'a'})
+    version, view = follow(store, dict(), 0)
+    store.publish('protocol', 1, {'progress': 1})
+    store.publish('protocol', 2, {'progress': 0})
+    store.remove('protocol', 2)
+    version, changes, replace = store.changes_since(version)
+    assert not replace
+    assert changes == {('protocol', 1): {'progress': 1}, ('protocol', 2): None}
+
+
+def test_removed_then_published_again_replaces_old_fields():
+    store = StateStore()
+    store.publish('protocol', 1, {'progress': 3, 'name': 'old', 'finished': True})
+    version, view = follow(store, dict(), 0)
+    store.remove('protocol', 1)
+    store.publish('protocol', 1, {'progress': 0})
+    version, view = follow(store, view, version)
+    assert view == {('protocol', 1): {'progress': 0}}
+    assert view == store.snapshot()[1]
+
+
+def test_client_older_than_history_drops_removed_entries():
+    store = StateStore(history=5)
+    for i in range(10):
+        store.publish('protocol', i, {'progress': 0})
+    version, view = follow(store, dict(), 0)
+    store.remove('protocol', 0)
+    for i in range(30):
+        store.publish('protocol', 1, {'progress': i})  # the removal is no longer in the kept changes
+    version, changes, replace = store.changes_since(version)
+    assert replace
+    view = apply(view, changes, replace)
+    assert ('protocol', 0) not in view
+    assert view == store.snapshot()[1]
@@ -0,0 +1,80 @@
+import glob
+import json
+import threading
+
+from Chemingon import Apparatus, DummyComponent, Experiment, Protocol
+from Chemingon.core.tracing import Tracer
+
+
+class Worker(DummyComponent):
+    def work(self, t=0.1):
+        self._sleep(t)
+
+
+def test_chrome_trace_structure(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    apparatus = Apparatus('tracing test')
+    shared = Worker('shared', is_public=True)
+    apparatus.add_component(shared)
+    experiment = Experiment(apparatus, channels=2)
+    for channel in (1, 2):
+        protocol = Protocol(apparatus, f'p{channel}')
+        protocol.quick_add(shared, 'work', kwargs={'t': 0.2})
+        experiment.add_protocol(protocol, channel)
+    experiment.enable_tracing(max_events=1000)
+    experiment.start_master_operators()
+
+    trace = json.load(open(glob.glob(f'{experiment.directory}/*_trace.json')[0]))
+    events = trace['traceEvents']
+    names = {i['tid']: i['args']['name'] for i in events if i['ph'] == 'M'}
+    spans = [i for i in events if i['ph'] == 'X']
+    assert all(i['tid'] in names for i in spans)
+    for channel in (1, 2):
+        protocol = next(i for i in spans if i['name'] == f'protocol p{channel}')
+        assert names[protocol['tid']] == f'Channel {channel}'
+        # the operation is executed by the public operator thread, within the protocol and the wait of the channel
+        operation = next(i for i in spans if i['name'] == 'shared: work' and i['args']['protocol'] == f'p{channel}')
+        wait = next(i for i in spans if i['name'] == 'wait shared: work' and i['tid'] == protocol['tid'])
+        assert names[operation['tid']] == 'Public shared'
+        for inner, outer in ((wait, protocol), (operation, wait)):
+            assert outer['ts'] <= inner['ts'] and inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur']
+    # one operation waited for the other in the queue of the public device
+    begins = {i['id']: i for i in events if i['ph'] == 'b'}
+    ends = {i['id']: i for i in events if i['ph'] == 'e'}
+    assert len(begins) == 2 and begins.keys() == ends.keys()
+    assert all(i['name'] == 'queue shared' for i in begins.values())
+    assert max(ends[i]['ts'] - begins[i]['ts'] for i in begins) > 0.15e6
+
+
+def test_tracing_is_opt_in(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    apparatus = Apparatus('tracing test')
+    device = Worker('device')
+    apparatus.add_component(device)
+    experiment = Experiment(apparatus, channels=1)
+    protocol = Protocol(apparatus, 'p')
+    protocol.quick_add(device, 'work', kwargs={'t': 0})
+    experiment.add_protocol(protocol, 1)
+    experiment.start_master_operators()
+    assert len(experiment.tracer) == 0
+    assert not glob.glob(f'{experiment.directory}/*_trace.json')
+
+
+def test_max_events_and_thread_names_are_bounded():
+    tracer = Tracer(max_events=10, max_threads=4)
+    for i in range(50):
+        tracer.complete(f'span {i}', 'test', tracer.now(), tracer.now())
+    assert len(tracer) == 10
+    assert [i['name'] for i in tracer.to_chrome_trace()['traceEvents'] if i['ph'] == 'X'][0] == 'span 40'
+
+    def record(i):
+        tracer.complete(f'thread {i}', 'test', tracer.now(), tracer.now())
+
+    for i in range(20):
+        thread = threading.Thread(target=record, args=(i,), name=f'Thread {i}')
+        thread.start()
+        thread.join()
+    assert len(tracer._thread_names) <= 11  # the threads of the 10 spans kept, and the last one before its span
+    trace = tracer.to_chrome_trace()['traceEvents']
+    names = {i['tid']: i['args']['name'] for i in trace if i['ph'] == 'M'}
+    assert all(names[i['tid']] == f"Thread {i['name'].split()[1]}" for i in trace if i['ph'] == 'X')